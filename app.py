@@ -6,7 +6,7 @@ import os
 
 load_dotenv(dotenv_path=Path(__file__).parent / ".env")
 
-from core.database import init_db, run_query
+from core.database import init_db, get_user_cache
 from ui.styles import apply_styles
 from ui.components import render_sidebar, render_mentor_footer
 from ui.views.auth import render_login
@@ -39,12 +39,12 @@ def main():
     # --- AUTO LOGIN VIA URL ---
     if not st.session_state.auth and 'uid' in st.query_params:
         uid = st.query_params['uid']
-        res = run_query('SELECT * FROM users WHERE user_id=?', (uid,), fetch_one=True)
+        res = get_user_cache().user(uid)
         if not res:
             with st.spinner("Connexion au Cloud..."):
                 from core.database import pull_user_data_from_supabase
                 pull_user_data_from_supabase(uid)
-                res = run_query('SELECT * FROM users WHERE user_id=?', (uid,), fetch_one=True)
+                res = get_user_cache().user(uid)
 
         if res:
             st.session_state.update({
@@ -0,0 +1,109 @@
+# core/ai_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+AI_CACHE_SCHEMA = ('CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, prompt_class TEXT, response TEXT, engine TEXT, '
+                   'created_at REAL, expires_at REAL, last_used_at REAL, hits INTEGER DEFAULT 0)')
+
+def prompt_key(prompt_class: str, prompt: str) -> str:
+    """Adresse de contenu : la même demande dans la même classe donne toujours la même clé."""
+    return hashlib.blake2b(f"{prompt_class}\x00{prompt}".encode("utf-8"), digest_size=16).hexdigest()
+
+class ResponseCache:
+    """Cache des réponses IA : LRU en mémoire devant une table SQLite, TTL par classe de prompt.
+
+    Seules les classes déclarées dans `ttls` sont mises en cache (les prompts « créatifs » passent toujours par l'IA).
+    `clock` : horloge murale des expirations (persistées en base), injectable pour les tests.
+    """
+
+    def __init__(self, session_factory: Callable, ttls: Dict[str, float], memory_size: int = 512,
+                 max_rows: int = 20000, prune_every: int = 200, clock: Callable[[], float] = time.time):
+        self.session_factory = session_factory
+        self.clock = clock
+        self.ttls = ttls
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._memory: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+
+    def cacheable(self, prompt_class: Optional[str]) -> bool:
+        return bool(prompt_class) and prompt_class in self.ttls
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self.metrics["evicted"] += 1
+
+    def get(self, prompt_class: str, prompt: str) -> Optional[Tuple[str, str]]:
+        """Renvoie (réponse, moteur d'origine) ou None."""
+        if not self.cacheable(prompt_class): return None
+        key, now = prompt_key(prompt_class, prompt), self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[2] > now:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return entry[0], entry[1]
+            if entry:
+                del self._memory[key]
+                self.metrics["expired"] += 1
+        try:
+            with self.session_factory() as cursor:
+                cursor.execute("SELECT response, engine, expires_at FROM ai_cache WHERE key=?", (key,))
+                row = cursor.fetchone()
+                if row and row[2] > now:
+                    cursor.execute("UPDATE ai_cache SET hits=hits+1, last_used_at=? WHERE key=?", (now, key))
+        except Exception:
+            row = None  # Cache indisponible : on retombe sur l'IA
+        if not row or row[2] <= now:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["disk_hits"] += 1
+        self._remember(key, row)
+        return row[0], row[1]
+
+    def put(self, prompt_class: str, prompt: str, response: str, engine: str):
+        if not self.cacheable(prompt_class) or not response: return
+        key, now = prompt_key(prompt_class, prompt), self.clock()
+        expires_at = now + self.ttls[prompt_class]
+        self._remember(key, (response, engine, expires_at))
+        try:
+            with self.session_factory() as cursor:
+                cursor.execute("INSERT OR REPLACE INTO ai_cache (key, prompt_class, response, engine, created_at, expires_at, last_used_at) VALUES (?,?,?,?,?,?,?)",
+                               (key, prompt_class, response, engine, now, expires_at, now))
+                self._puts += 1
+                if self._puts % self.prune_every == 0: self._prune(cursor, now)
+        except Exception:
+            return
+        self.metrics["stores"] += 1
+
+    def invalidate(self, prompt_class: str, prompt: str):
+        """À appeler quand une réponse servie s'avère inexploitable (JSON invalide...)."""
+        key = prompt_key(prompt_class, prompt)
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            with self.session_factory() as cursor:
+                cursor.execute("DELETE FROM ai_cache WHERE key=?", (key,))
+        except Exception: pass
+
+    def _prune(self, cursor, now):
+        # Expirées d'abord, puis les moins récemment servies au-delà du plafond
+        cursor.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+        cursor.execute("DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+    def stats(self) -> dict:
+        data = dict(self.metrics)
+        lookups = data["memory_hits"] + data["disk_hits"] + data["misses"]
+        data["hit_ratio"] = round((data["memory_hits"] + data["disk_hits"]) / lookups, 3) if lookups else 0.0
+        data["memory_entries"] = len(self._memory)
+        return data
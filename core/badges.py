@@ -1,71 +1,123 @@
 # core/badges.py
 import datetime
 import streamlit as st
-from core.database import run_query
-
-def calculate_badges(uid):
-    """Calcule la liste des badges acquis selon les stats actuelles (DB + Session)."""
-    
-    # 1. Récupération des données fraîches
-    # On prend les valeurs de session qui sont plus à jour que la DB juste après une réponse
-    qc = st.session_state.get('q_count', 0)
-    lvl = st.session_state.get('level', 1)
-    wins = st.session_state.get('consecutive_wins', 0)
-    cw = st.session_state.get('crisis_wins', 0)
-    rd = st.session_state.get('redemptions', 0)
-    
-    # Pour les stats par catégorie, on doit interroger la DB car c'est là qu'elles sont stockées/cumulées
-    # Attention : la réponse courante vient peut-être d'être ajoutée dans quiz_engine, il faut que run_query ait accès aux dernières données.
-    # Dans quiz_engine, on fait INSERT INTO history mais on n'update pas forcément la table stats (à vérifier).
-    # Vérification faite : quiz_engine n'update PAS la table `stats` explicitement dans validate_answer ! 
-    # C'est un bug potentiel. On va corriger ça.
-    
-    d = dict(run_query('SELECT category, correct_count FROM stats WHERE user_id = ?', (uid,), fetch_all=True))
-    
-    # Glossaire
-    glossary_count_res = run_query('SELECT COUNT(*) FROM glossary WHERE user_id = ?', (uid,), fetch_one=True)
-    glossary_count = glossary_count_res[0] if glossary_count_res else 0
-    
-    # Heure
-    current_hour = datetime.datetime.now().hour
-    is_night_owl = current_hour >= 22 or current_hour <= 6
-
-    # 2. Définition des règles
-    badges_def = [
-        # Carrière
-        ("🔰", "Opérateur SC", qc >= 5, "A répondu à 5 questions."),
-        ("📦", "Resp. Exploitation", qc >= 120, "Expertise validée (Niveau 1 fini)."),
-        ("🚚", "Coordinateur Flux", lvl >= 2, "A atteint le Niveau 2."),
-        ("📊", "Planificateur Confirmé", qc >= 250, "Expertise validée (Niveau 2 fini)."),
-        ("⚙️", "Ingénieur SC", lvl >= 3, "A atteint le Niveau 3."),
-        ("🔮", "Data Strategist SC", qc >= 380, "Expertise validée (Niveau 3 fini)."),
-        ("🏭", "COO (Directeur Ops)", lvl >= 4, "A atteint le Niveau 4."),
-        ("👑", "Visionnaire SC", qc >= 500, "Le sommet de la Supply Chain."),
-        
-        # Spécialisations (Basé sur table stats)
-        ("💸", "Le Négociateur", d.get('Achats', 0) >= 10, "10 bonnes réponses en Achats."),
-        ("🧊", "Gardien du Stock", d.get('Stocks', 0) >= 20, "20 bonnes réponses en Stocks."),
-        ("🚢", "Globe-Trotter", d.get('Transport', 0) >= 15, "15 bonnes réponses en Transport."),
-        ("🤖", "Oracle Digital", d.get('IA & Data', 0) >= 15, "15 bonnes réponses en IA/Data."),
-        ("🥋", "Sensei Lean", d.get('Stratégie Lean', 0) >= 15, "15 bonnes réponses en Lean."),
-        
-        # Gameplay
-        ("🔥", "Maître du Chaos", cw >= 1, "A survécu à une crise."),
-        ("🔥", "On Fire", wins >= 10, "10 victoires consécutives."),
-        ("🧟", "Le Survivant", rd >= 1, "A utilisé une rédemption."),
-        ("📚", "L'Encyclopédie", glossary_count >= 50, "Glossaire riche de 50 termes."),
-        ("🦉", "Oiseau de Nuit", is_night_owl, "Travaille tard le soir.")
-    ]
-    
-    earned = []
-    metadata = {}
-    
-    for emoji, title, condition, desc in badges_def:
-        if condition:
-            earned.append(title)
-            metadata[title] = {"emoji": emoji, "desc": desc}
-            
-    return earned, metadata
+from core.database import DatabaseManager, get_user_cache
+from core.curriculum import level_start
+
+class BadgeRule:
+    """Règle de badge : un compteur et son seuil (ou un prédicat sur la valeur du compteur)."""
+
+    def __init__(self, emoji, title, desc, counter, threshold=1, predicate=None):
+        self.emoji, self.title, self.desc = emoji, title, desc
+        self.counter = counter
+        self.predicate = predicate or (lambda value: value >= threshold)
+
+BADGE_RULES = [
+    # Carrière
+    BadgeRule("🔰", "Opérateur SC", "A répondu à 5 questions.", "q_count", 5),
+    BadgeRule("📦", "Resp. Exploitation", "Expertise validée (Niveau 1 fini).", "q_count", level_start(2)),
+    BadgeRule("🚚", "Coordinateur Flux", "A atteint le Niveau 2.", "level", 2),
+    BadgeRule("📊", "Planificateur Confirmé", "Expertise validée (Niveau 2 fini).", "q_count", level_start(3)),
+    BadgeRule("⚙️", "Ingénieur SC", "A atteint le Niveau 3.", "level", 3),
+    BadgeRule("🔮", "Data Strategist SC", "Expertise validée (Niveau 3 fini).", "q_count", level_start(4)),
+    BadgeRule("🏭", "COO (Directeur Ops)", "A atteint le Niveau 4.", "level", 4),
+    BadgeRule("👑", "Visionnaire SC", "Le sommet de la Supply Chain.", "q_count", level_start(5)),
+
+    # Spécialisations (bonnes réponses par catégorie, table stats)
+    BadgeRule("💸", "Le Négociateur", "10 bonnes réponses en Achats.", "stat:Achats", 10),
+    BadgeRule("🧊", "Gardien du Stock", "20 bonnes réponses en Stocks.", "stat:Stocks", 20),
+    BadgeRule("🚢", "Globe-Trotter", "15 bonnes réponses en Transport.", "stat:Transport", 15),
+    BadgeRule("🤖", "Oracle Digital", "15 bonnes réponses en IA/Data.", "stat:IA & Data", 15),
+    BadgeRule("🥋", "Sensei Lean", "15 bonnes réponses en Lean.", "stat:Stratégie Lean", 15),
+
+    # Gameplay
+    BadgeRule("🔥", "Maître du Chaos", "A survécu à une crise.", "crisis_wins", 1),
+    BadgeRule("🔥", "On Fire", "10 victoires consécutives.", "consecutive_wins", 10),
+    BadgeRule("🧟", "Le Survivant", "A utilisé une rédemption.", "redemptions", 1),
+    BadgeRule("📚", "L'Encyclopédie", "Glossaire riche de 50 termes.", "glossary", 50),
+    BadgeRule("🦉", "Oiseau de Nuit", "Travaille tard le soir.", "hour", predicate=lambda h: h >= 22 or h <= 6),
+]
+
+# Index compteur -> règles : un événement ne réévalue que les règles qu'il peut débloquer
+RULES_BY_COUNTER = {}
+for _rule in BADGE_RULES:
+    RULES_BY_COUNTER.setdefault(_rule.counter, []).append(_rule)
+
+def _counter_value(uid, name, db):
+    """Valeur courante d'un compteur : lecture par clé (jamais de scan), ou session pour les compteurs de jeu."""
+    if name.startswith("stat:"):
+        row = db.fetch_one("SELECT correct_count FROM stats WHERE user_id=? AND category=?", (uid, name[5:]))
+        return row[0] if row else 0
+    if name == "glossary":
+        row = db.fetch_one("SELECT value FROM user_counters WHERE user_id=? AND name='glossary'", (uid,))
+        return row[0] if row else 0
+    if name == "hour":
+        return datetime.datetime.now().hour
+    # On prend les valeurs de session, plus à jour que la DB juste après une réponse
+    return st.session_state.get(name, 1 if name == "level" else 0) or 0
+
+EVALUATED = "__evaluated__"
+
+EARNED_TITLES_QUERY = """
+    SELECT title FROM user_badges WHERE user_id=?
+    UNION ALL SELECT ? FROM user_counters WHERE user_id=? AND name='badges_evaluated'
+"""
+
+def _earned_titles(uid, db):
+    """Titres acquis, plus le marqueur EVALUATED si l'utilisateur a déjà eu une évaluation complète (une seule requête)."""
+    return {r[0] for r in db.fetch_all(EARNED_TITLES_QUERY, (uid, EVALUATED, uid))}
+
+def _load_earned_titles(cursor, uid):
+    cursor.execute(EARNED_TITLES_QUERY, (uid, EVALUATED, uid))
+    return frozenset(r[0] for r in cursor.fetchall())
+
+# Badges acquis servis par le cache utilisateur (profil relu à chaque rerun)
+get_user_cache().register("badges", _load_earned_titles, ("user_badges", "user_counters"))
+
+def evaluate_badges(uid, event=None, db=None):
+    """Attribue les badges débloqués par un événement et renvoie les nouvelles règles satisfaites.
+
+    `event` : {compteur: valeur} des compteurs modifiés (valeur None = relue). Sans événement, ou au premier
+    passage d'un utilisateur, toutes les règles sont évaluées une fois. `db` : UnitOfWork de l'appelant.
+    """
+    if db is None:
+        with DatabaseManager.unit_of_work() as uow:
+            return evaluate_badges(uid, event, uow)
+
+    earned = _earned_titles(uid, db)
+    evaluated = EVALUATED in earned
+    rules = BADGE_RULES if event is None or not evaluated else \
+        [r for r in BADGE_RULES if r.counter in event]
+    values = dict(event or {})
+    new = []
+    for rule in rules:
+        if rule.title in earned: continue
+        if values.get(rule.counter) is None:
+            values[rule.counter] = _counter_value(uid, rule.counter, db)
+        if rule.predicate(values[rule.counter]):
+            earned.add(rule.title)
+            new.append(rule)
+    now = datetime.datetime.now().isoformat()
+    for rule in new:
+        db.execute("INSERT OR IGNORE INTO user_badges (user_id, title, earned_at) VALUES (?, ?, ?)", (uid, rule.title, now), sync=False)
+    if not evaluated:
+        db.execute("INSERT OR IGNORE INTO user_counters (user_id, name, value) VALUES (?, 'badges_evaluated', 1)", (uid,), sync=False)
+    return new
+
+def calculate_badges(uid, db=None):
+    """Badges acquis (table user_badges) : liste des titres et métadonnées d'affichage."""
+    if db is None:
+        earned = get_user_cache().get("badges", uid)
+        if EVALUATED not in earned:
+            with DatabaseManager.unit_of_work() as uow:
+                return calculate_badges(uid, uow)
+    else:
+        earned = _earned_titles(uid, db)
+    if EVALUATED not in earned:
+        evaluate_badges(uid, db=db)  # Premier passage (ex : compte antérieur au moteur de badges)
+        earned = _earned_titles(uid, db)
+    ordered = [r for r in BADGE_RULES if r.title in earned]
+    return [r.title for r in ordered], {r.title: {"emoji": r.emoji, "desc": r.desc} for r in ordered}
 
 def get_badge_groups():
     """Retourne la structure d'affichage des badges (Titre de section -> Liste de badges)."""
@@ -87,25 +139,10 @@ def get_badge_groups():
         ])
     ]
 
-def check_new_badge(uid):
-    """Vérifie si un nouveau badge vient d'être débloqué."""
-    current_earned, metadata = calculate_badges(uid)
-    
-    # On récupère les anciens (stockés en session)
-    previous_earned = st.session_state.get('earned_badges_cache', [])
-    
-    # Diff
-    new_badges = [b for b in current_earned if b not in previous_earned]
-    
-    # Mise à jour du cache
-    st.session_state.earned_badges_cache = current_earned
-    
-    # Si nouveau badge, on retourne le premier (pour affichage modal)
+def check_new_badge(uid, event=None, db=None):
+    """Vérifie si un événement vient de débloquer un badge ; renvoie le premier (pour affichage modal)."""
+    new_badges = evaluate_badges(uid, event, db)
     if new_badges:
-        title = new_badges[0]
-        return {
-            "title": title,
-            "emoji": metadata[title]["emoji"],
-            "desc": metadata[title]["desc"]
-        }
+        rule = new_badges[0]
+        return {"title": rule.title, "emoji": rule.emoji, "desc": rule.desc}
     return None
@@ -10,6 +10,68 @@ DB_FILE = str(ROOT_DIR / 'mentor_sc_v8.db')
 ADMIN_EMAILS = ["admin@mentor-sc.com", "test@test.com", "r.k.badibanga@gmail.com", "mentor.sc.app@gmail.com"]
 LEVEL_THRESHOLDS = {1: 0, 2: 120, 3: 250, 4: 380, 5: 500}
 
+# --- BANQUE DE QUESTIONS (éviction) ---
+QUESTION_BANK_POLICY = {
+    "high_watermark": 2000,       # Au-delà : éviction déclenchée
+    "low_watermark": 1800,        # Cible après éviction
+    "batch_size": 200,            # Lignes supprimées par lot
+    "maintenance_interval": 3600, # Passe de maintenance planifiée (secondes)
+    "evict_min_interval": 30,     # Délai minimal entre deux évictions déclenchées par insertion (secondes)
+    "min_votes": 3,               # Votes nécessaires pour juger une question
+}
+
+# --- STOCKAGE MASSIF DE QUESTIONS (services/stocker.py) ---
+STOCKER_POLICY = {
+    "triads_per_module": 5,   # Triades visées par module du curriculum
+    "triads_per_call": 2,     # Triades demandées par appel IA
+    "concurrency": 6,         # Appels IA simultanés
+    "max_attempts": 4,        # Tentatives par lot avant abandon
+    "call_timeout": 60,       # Secondes par appel (générations longues)
+    "rate_limits": {"Groq": 30, "Gemini": 15, "Mistral": 60},  # Requêtes / minute par provider
+}
+
+# --- CLASSEMENT (rafraîchissement depuis le Cloud) ---
+LEADERBOARD_POLICY = {
+    "refresh_interval": 300,  # Au plus un rafraîchissement par intervalle, toutes sessions confondues (secondes)
+    "page_size": 500,         # Lignes par page Supabase
+    "max_rows": 1000,         # Profondeur du classement rapatriée
+}
+
+# --- CORPUS DE FORMATION (documents pré-extraits, services/ingest.py) ---
+CORPUS_DIR = ROOT_DIR / "formation supply chain"
+CORPUS_POLICY = {
+    "extensions": (".pdf", ".docx"),
+    "chunk_chars": 1200,   # Taille visée d'un morceau de texte
+    "pdf_max_pages": 400,  # Garde-fou sur les PDF très longs
+}
+
+# --- MASTERCLASS COMPILÉE (arbre JSON versionné, construit par services/ingest.py) ---
+MASTERCLASS_DOCX = CORPUS_DIR / "🎓 MASTER CLASS - COMPLET.docx"
+MASTERCLASS_BUILD_DIR = ROOT_DIR / "build" / "masterclass"
+
+# --- RECHERCHE DANS LE COURS (index BM25 construit par services/ingest.py) ---
+RETRIEVAL_POLICY = {
+    "sources": ("MASTER CLASS", "BIBLE DES KPI"),  # Documents du corpus indexés (en plus de MASTERCLASS_DATA)
+    "k1": 1.2,
+    "b": 0.75,
+    "top_k": 4,          # Passages injectés dans un prompt
+    "max_chars": 2500,   # Budget de contexte par prompt
+}
+
+# --- RECHERCHE PLEIN TEXTE (FTS5 : glossaire, notes, banque de questions) ---
+SEARCH_POLICY = {
+    "rank_max_matches": 1000,  # Au-delà, classement titre puis récence au lieu de BM25 (mots présents presque partout)
+    "snippet_tokens": 16,      # Longueur des extraits surlignés
+    "page_size": 20,           # Résultats affichés par recherche
+}
+
+# --- CACHE DES RÉPONSES IA (TTL en secondes par classe de prompt) ---
+AI_CACHE_TTL = {
+    "hint": 30 * 86400,        # Indice joker d'une question
+    "enrichment": 90 * 86400,  # Fiche théorie / exemple / astuce
+    "glossary": 90 * 86400,    # Définition d'un terme du glossaire
+}
+
 # --- DESIGN SYSTEM ---
 COLORS = {
     "primary": "#00dfd8",
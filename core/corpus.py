@@ -0,0 +1,104 @@
+# core/corpus.py
+import hashlib
+import random
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Tuple
+
+CORPUS_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS corpus_files (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, sha256 TEXT, chunks INTEGER DEFAULT 0, indexed_at REAL)',
+    'CREATE TABLE IF NOT EXISTS corpus_chunks (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT, position INTEGER, section TEXT, text TEXT)',
+    'CREATE INDEX IF NOT EXISTS idx_corpus_chunks_path ON corpus_chunks(path, position)',
+)
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_sections(sections: Iterable[Tuple[str, str]], chunk_chars: int = 1200) -> List[Tuple[str, str]]:
+    """Découpe des sections (titre, texte) en morceaux d'environ `chunk_chars`, sur les frontières de paragraphes."""
+    chunks = []
+    for title, text in sections:
+        buf, size = [], 0
+        for para in (p.strip() for p in text.split("\n")):
+            if not para: continue
+            while len(para) > chunk_chars:
+                # Paragraphe géant (PDF sans retours ligne) : coupe sur le dernier espace
+                cut = para.rfind(" ", 0, chunk_chars)
+                cut = cut if cut > chunk_chars // 2 else chunk_chars
+                if buf: chunks.append((title, "\n".join(buf))); buf, size = [], 0
+                chunks.append((title, para[:cut].strip()))
+                para = para[cut:].strip()
+            if size + len(para) > chunk_chars and buf:
+                chunks.append((title, "\n".join(buf)))
+                buf, size = [], 0
+            buf.append(para)
+            size += len(para) + 1
+        if buf: chunks.append((title, "\n".join(buf)))
+    return chunks
+
+class CorpusStore:
+    """Texte pré-extrait des documents de formation, découpé en morceaux (tables corpus_files / corpus_chunks).
+
+    Un fichier n'est ré-extrait que si sa date de modification ou sa taille change ET que son contenu (sha256) diffère.
+    """
+
+    def __init__(self, session_factory: Callable, base_dir: Path):
+        self.session_factory = session_factory
+        self.base_dir = Path(base_dir)
+
+    def relpath(self, path: Path) -> str:
+        return Path(path).relative_to(self.base_dir).as_posix()
+
+    def known_files(self) -> dict:
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT path, mtime, size, sha256 FROM corpus_files")
+            return {r[0]: r[1:] for r in cursor.fetchall()}
+
+    def replace_file(self, rel: str, mtime: float, size: int, digest: str, chunks: List[Tuple[str, str]]):
+        with self.session_factory() as cursor:
+            cursor.execute("DELETE FROM corpus_chunks WHERE path=?", (rel,))
+            cursor.executemany("INSERT INTO corpus_chunks (path, position, section, text) VALUES (?,?,?,?)",
+                               [(rel, i, section, text) for i, (section, text) in enumerate(chunks)])
+            cursor.execute("INSERT OR REPLACE INTO corpus_files (path, mtime, size, sha256, chunks, indexed_at) VALUES (?,?,?,?,?,?)",
+                           (rel, mtime, size, digest, len(chunks), time.time()))
+
+    def touch_file(self, rel: str, mtime: float, size: int):
+        """Contenu identique (copie, restauration) : seule la date est mise à jour, sans ré-extraction."""
+        with self.session_factory() as cursor:
+            cursor.execute("UPDATE corpus_files SET mtime=?, size=? WHERE path=?", (mtime, size, rel))
+
+    def remove_files(self, rels: List[str]):
+        if not rels: return
+        with self.session_factory() as cursor:
+            cursor.executemany("DELETE FROM corpus_chunks WHERE path=?", [(r,) for r in rels])
+            cursor.executemany("DELETE FROM corpus_files WHERE path=?", [(r,) for r in rels])
+
+    def file_chunks(self, rel: str, limit: int = -1) -> List[Tuple[str, str]]:
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT section, text FROM corpus_chunks WHERE path=? ORDER BY position LIMIT ?", (rel, limit))
+            return cursor.fetchall()
+
+    def sample_context(self, n_files: int = 3, max_chars: int = 8000) -> str:
+        """Début de `n_files` documents tirés au hasard (équivalent pré-extrait de l'ancien scan pypdf/docx)."""
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT path FROM corpus_files WHERE chunks > 0")
+            paths = [r[0] for r in cursor.fetchall()]
+        if not paths: return ""
+        per_file, parts = max_chars // min(len(paths), n_files), []
+        for rel in random.sample(paths, min(len(paths), n_files)):
+            size = 0
+            for _, text in self.file_chunks(rel, limit=20):
+                if size >= per_file: break
+                parts.append(text)
+                size += len(text)
+        return "\n".join(parts)[:max_chars]
+
+    def stats(self) -> dict:
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(chunks), 0), MAX(indexed_at) FROM corpus_files")
+            files, chunks, last = cursor.fetchone()
+        return {"files": files, "chunks": chunks, "last_indexed_at": last}
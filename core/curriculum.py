@@ -0,0 +1,46 @@
+# core/curriculum.py
+from bisect import bisect_right
+from typing import Tuple
+from core.config import CURRICULUM, LEVEL_THRESHOLDS
+
+class CurriculumIndex:
+    """Parcours pédagogique compilé : q_count -> (module, position, total, niveau) par recherche dichotomique.
+
+    Chaque module devient un segment [début, début + taille) en q_count global. Un niveau dont les modules
+    ne couvrent pas toute la plage se termine par un segment de repli (dernier module, 1/1).
+    """
+
+    def __init__(self, curriculum=CURRICULUM, thresholds=LEVEL_THRESHOLDS):
+        self.level_starts = sorted(thresholds.values())
+        self.levels = [lvl for lvl, _ in sorted(thresholds.items(), key=lambda item: item[1])]
+        self.starts, self.segments = [], []  # segments : (module, taille, niveau, repli)
+        for i, (lvl, lstart) in enumerate(sorted(thresholds.items(), key=lambda item: item[1])):
+            lend = self.level_starts[i + 1] if i + 1 < len(self.level_starts) else float("inf")
+            modules = curriculum.get(lvl, curriculum[1])
+            cum = lstart
+            for name, size in modules:
+                if cum >= lend: break
+                self.starts.append(cum)
+                self.segments.append((name, size, lvl, False))
+                cum += size
+            if cum < lend:
+                self.starts.append(cum)
+                self.segments.append((modules[-1][0], 1, lvl, True))
+
+    def level_for(self, qc: int) -> int:
+        return self.levels[max(0, bisect_right(self.level_starts, qc) - 1)]
+
+    def level_start(self, lvl: int) -> int:
+        """Premier q_count du niveau `lvl` (fin du niveau précédent)."""
+        return self.level_starts[self.levels.index(lvl)]
+
+    def module_info(self, qc: int) -> Tuple[str, int, int, int]:
+        i = max(0, bisect_right(self.starts, qc) - 1)
+        name, size, lvl, fallback = self.segments[i]
+        if fallback: return name, 1, 1, lvl
+        return name, qc - self.starts[i] + 1, size, lvl
+
+CURRICULUM_INDEX = CurriculumIndex()
+module_info = CURRICULUM_INDEX.module_info
+level_for = CURRICULUM_INDEX.level_for
+level_start = CURRICULUM_INDEX.level_start
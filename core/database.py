@@ -2,11 +2,22 @@
 import sqlite3
 import os
 import json
+import hashlib
 import streamlit as st
 import threading
+import queue
+import time
+import re
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import contextmanager
-from core.config import DB_FILE, ROOT_DIR
+from core.config import DB_FILE, ROOT_DIR, LEADERBOARD_POLICY
+from core.sync import SyncService, SyncOp, OUTBOX_SCHEMA, DEAD_LETTER_SCHEMA
+from core.ai_cache import AI_CACHE_SCHEMA
+from core.corpus import CORPUS_SCHEMA
+from core.retrieval import RETRIEVAL_SCHEMA
+from core.search import SEARCH_SCHEMA, get_search_index
+from core.leaderboard import get_leaderboard_index
 from supabase import create_client, Client
 
 @st.cache_resource
@@ -20,28 +31,196 @@ def get_supabase_client():
     except:
         return None
 
+def _question_blake(text) -> bytes:
+    return hashlib.blake2b(str(text or "").strip().encode("utf-8"), digest_size=8).digest()
+
+def question_digest(text) -> int:
+    """Empreinte 64 bits (entier signé, compatible INTEGER SQLite) du texte d'une question."""
+    return int.from_bytes(_question_blake(text), "big", signed=True)
+
+def question_key(text) -> str:
+    """Forme hexadécimale de question_digest, stockée dans history.question_hash."""
+    return _question_blake(text).hex()
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite réutilisables (PRAGMA appliqués une seule fois par connexion)."""
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-16000",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    def __init__(self, db_file: str, max_size: int = 8, health_check_after: float = 30.0):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "closed": 0, "health_failures": 0,
+                       "in_use": 0, "peak_in_use": 0, "commits": 0, "rollbacks": 0}
+
+    def _bump(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+            if key == "in_use" and self._stats["in_use"] > self._stats["peak_in_use"]:
+                self._stats["peak_in_use"] = self._stats["in_use"]
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        # Utilisée par le trigger qui renseigne question_bank.qhash
+        conn.create_function("qdigest", 1, question_digest, deterministic=True)
+        self._bump("created")
+        return conn
+
+    def _close(self, conn):
+        try: conn.close()
+        except: pass
+        self._bump("closed")
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self._bump("health_failures")
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                break
+            # Health check uniquement sur les connexions restées longtemps inactives
+            if time.monotonic() - last_used > self.health_check_after and not self._is_healthy(conn):
+                self._close(conn)
+                continue
+            self._bump("reused")
+            break
+        self._bump("in_use")
+        return conn
+
+    def release(self, conn, broken=False):
+        self._bump("in_use", -1)
+        if broken or conn.in_transaction:
+            self._close(conn)
+            return
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            # Pool plein : la connexion excédentaire est fermée
+            self._close(conn)
+
+    def close_all(self):
+        while True:
+            try: conn, _ = self._idle.get_nowait()
+            except queue.Empty: return
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data["idle"] = self._idle.qsize()
+        data["max_size"] = self.max_size
+        opened = data["created"] + data["reused"]
+        data["reuse_ratio"] = round(data["reused"] / opened, 3) if opened else 0.0
+        return data
+
 class DatabaseManager:
+    _pool = ConnectionPool(DB_FILE)
+
     @staticmethod
     def get_supabase() -> Client:
         return get_supabase_client()
 
+    @classmethod
+    def pool_stats(cls) -> dict:
+        return cls._pool.stats()
+
+    @classmethod
+    @contextmanager
+    def unit_of_work(cls):
+        with cls.session() as cursor:
+            uow = UnitOfWork(cursor)
+            yield uow
+        # Commit réussi : on réveille le worker de synchro
+        for query, ops in uow.pending:
+            after_commit(query, ops)
+        for query, params in uow.writes:
+            _user_cache.invalidate_for(query, params)
+
     @classmethod
     @contextmanager
     def session(cls):
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False, timeout=30)
-        conn.execute("PRAGMA journal_mode=WAL")
+        pool = cls._pool
+        conn = pool.acquire()
         cursor = conn.cursor()
+        broken = False
         try:
             yield cursor
-            conn.commit()
+            if conn.in_transaction:
+                conn.commit()
+                pool._bump("commits")
         except:
-            conn.rollback()
+            try:
+                conn.rollback()
+                pool._bump("rollbacks")
+            except sqlite3.Error:
+                broken = True
             raise
         finally:
-            conn.close()
+            try: cursor.close()
+            except sqlite3.Error: broken = True
+            pool.release(conn, broken=broken)
+
+class UnitOfWork:
+    """Regroupe toutes les écritures d'une action (ex : une réponse) dans une seule transaction.
+
+    Les lectures passent par la même connexion et voient donc les écritures en attente.
+    La synchro Cloud de chaque écriture n'est déclenchée qu'après le commit.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.pending = []
+        self.writes = []  # Invalidation du cache utilisateur, appliquée après le commit
+
+    def execute(self, query: str, params: tuple = (), sync=True):
+        self.cursor.execute(query, params)
+        self.writes.append((query, params))
+        if sync:
+            # L'entrée d'outbox part dans la même transaction que la donnée
+            ops = sync_ops_for(query, params)
+            get_sync_service().record(self.cursor, ops)
+            self.pending.append((query, ops))
+
+    def execute_many(self, query: str, seq_params, ops=None):
+        """Écriture en lot ; `ops` remplace les opérations Cloud déduites ligne à ligne (payload déjà construit)."""
+        seq_params = list(seq_params)
+        self.cursor.executemany(query, seq_params)
+        self.writes.extend((query, params) for params in seq_params)
+        if ops is None:
+            ops = [op for params in seq_params for op in sync_ops_for(query, params)]
+        get_sync_service().record(self.cursor, ops)
+        self.pending.append((query, ops))
+
+    def fetch_one(self, query: str, params: tuple = ()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchone()
+
+    def fetch_all(self, query: str, params: tuple = ()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
 
 def run_query(query: str, params: tuple = (), fetch_one=False, fetch_all=False, commit=True):
     result = None
+    ops = sync_ops_for(query, params) if commit else []
     with DatabaseManager.session() as cursor:
         cursor.execute(query, params)
         if fetch_one:
@@ -50,95 +229,276 @@ def run_query(query: str, params: tuple = (), fetch_one=False, fetch_all=False,
             result = cursor.fetchall()
         else:
             result = True
+        get_sync_service().record(cursor, ops)
 
+    # commit=False ne fait que taire la synchro Cloud : la ligne est écrite en local, le cache doit l'oublier
+    _user_cache.invalidate_for(query, params)
     if commit:
-        q_up = query.upper()
-        uid = st.session_state.get('user_id')
-        if not uid and params:
-            uid = params[0]
-            
-        if uid:
-            if "UPDATE USERS" in q_up:
-                threading.Thread(target=sync_user_to_supabase, args=(uid,), daemon=True).start()
-            elif "INSERT" in q_up or "UPDATE" in q_up:
-                table = None
-                if "HISTORY" in q_up: table = "history"
-                elif "GLOSSARY" in q_up: table = "glossary"
-                elif "NOTES" in q_up: table = "notes"
-                elif "STATS" in q_up: table = "stats"
-                elif "QUESTION_BANK" in q_up: table = "question_bank"
-                if table:
-                    threading.Thread(target=sync_generic_table, args=(table, uid, params, q_up), daemon=True).start()
-                    if table == "question_bank":
-                        enforce_question_limit(2000)
-            elif "DELETE" in q_up:
-                table = None
-                if "GLOSSARY" in q_up: table = "glossary"
-                elif "NOTES" in q_up: table = "notes"
-                if table:
-                    threading.Thread(target=delete_from_supabase, args=(table, uid, params), daemon=True).start()
+        after_commit(query, ops)
     return result
 
-def delete_from_supabase(table, uid, params):
-    try:
-        sb = DatabaseManager.get_supabase()
-        if not sb: return
-        if table == "glossary" and params:
-            # Pour glossary, params[0] est le terme
-            sb.table(table).delete().eq("user_id", uid).eq("term", params[0]).execute()
-        elif table == "notes" and params:
-            # Pour notes, params[0] est le note_id
-            sb.table(table).delete().eq("note_id", params[0]).execute()
-    except:
-        pass
+_WRITE_TARGET = re.compile(r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE)
 
-def enforce_question_limit(limit=2000):
-    try:
-        with DatabaseManager.session() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM question_bank")
-            count = cursor.fetchone()[0]
-            if count > limit:
-                to_del = count - limit
-                cursor.execute(f"DELETE FROM question_bank WHERE id IN (SELECT id FROM question_bank ORDER BY id ASC LIMIT {to_del})")
-    except:
-        pass
+def _load_user_row(cursor, uid):
+    cursor.execute("SELECT * FROM users WHERE user_id=?", (uid,))
+    return cursor.fetchone()
 
-def sync_generic_table(table, uid, params, query_type):
-    try:
-        sb = DatabaseManager.get_supabase()
-        if not sb: return
-        data = {}
-        if table == "history" and len(params) > 1:
-            data = {"user_id": uid, "question_hash": params[1]}
-        elif table == "question_bank" and len(params) >= 6:
+def _load_user_stats(cursor, uid):
+    cursor.execute("SELECT category, correct_count FROM stats WHERE user_id=?", (uid,))
+    return dict(cursor.fetchall())
+
+def _load_glossary_count(cursor, uid):
+    cursor.execute("SELECT value FROM user_counters WHERE user_id=? AND name='glossary'", (uid,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+class UserCache:
+    """Cache lecture-traversante par utilisateur : ligne users, stats par catégorie, compteur de glossaire.
+
+    Une section est chargée au premier accès puis servie sans requête jusqu'à ce qu'une écriture passée par
+    run_query / unit_of_work touche une de ses tables pour cet utilisateur. D'autres modules peuvent
+    déclarer leurs sections via `register` (ex : badges).
+    """
+
+    def __init__(self, session_factory, max_users: int = 2000):
+        self.session_factory = session_factory
+        self.max_users = max_users
+        self.loaders = {}
+        self.sections_by_table = {}  # table écrite -> sections invalidées
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._generation = {}  # uid -> compteur d'invalidations (évite de remettre en cache une lecture périmée)
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "invalidations": 0, "evicted": 0}
+        self.register("user", _load_user_row, ("users",))
+        self.register("stats", _load_user_stats, ("stats",))
+        self.register("glossary", _load_glossary_count, ("glossary", "user_counters"))
+
+    def register(self, section, loader, tables):
+        """`loader(cursor, uid)` charge la section ; toute écriture sur `tables` l'invalide."""
+        self.loaders[section] = loader
+        for table in tables:
+            self.sections_by_table.setdefault(table, set()).add(section)
+
+    def _load(self, section, uid):
+        with self.session_factory() as cursor:
+            return self.loaders[section](cursor, uid)
+
+    def get(self, section, uid):
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None and section in entry:
+                self._entries.move_to_end(uid)
+                self.metrics["hits"] += 1
+                return entry[section]
+            self.metrics["misses"] += 1
+            generation = self._generation.setdefault(uid, 0)
+        value = self._load(section, uid)
+        with self._lock:
+            if self._generation.get(uid, 0) == generation and (section != "user" or value is not None):
+                self._entries.setdefault(uid, {})[section] = value
+                self._entries.move_to_end(uid)
+                while len(self._entries) > self.max_users:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._generation.pop(evicted, None)
+                    self.metrics["evicted"] += 1
+        return value
+
+    def user(self, uid):
+        return self.get("user", uid)
+
+    def stats_by_category(self, uid) -> dict:
+        return dict(self.get("stats", uid))
+
+    def glossary_count(self, uid) -> int:
+        return self.get("glossary", uid)
+
+    def invalidate(self, uid=None, sections=None):
+        """Oublie les sections (toutes par défaut) d'un utilisateur, ou de tout le monde si uid est None."""
+        with self._lock:
+            uids = list(self._entries) if uid is None else [uid]
+            for u in uids:
+                self._generation[u] = self._generation.get(u, 0) + 1
+                entry = self._entries.get(u)
+                if entry is None: continue
+                for section in (sections or list(entry)):
+                    entry.pop(section, None)
+                self.metrics["invalidations"] += 1
+
+    def invalidate_for(self, query, params=()):
+        """Invalidation déduite d'une écriture SQL : table visée et utilisateur(s) présents dans les paramètres."""
+        match = _WRITE_TARGET.search(query)
+        if not match: return
+        sections = self.sections_by_table.get(match.group(1).lower())
+        if not sections: return
+        if "USER_ID" not in query.upper():
+            self.invalidate(sections=sections)  # Écriture sans utilisateur identifiable : invalidation large
+            return
+        uids = {p for p in (params if isinstance(params, (tuple, list)) else ()) if isinstance(p, str)}
+        with self._lock:
+            targets = [u for u in uids if u in self._generation]
+        for uid in targets:
+            self.invalidate(uid, sections)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self.metrics)
+            data["users"] = len(self._entries)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 3) if lookups else 0.0
+        return data
+
+_user_cache = UserCache(DatabaseManager.session)
+
+def get_user_cache() -> UserCache:
+    return _user_cache
+
+@st.cache_resource
+def get_sync_service() -> SyncService:
+    # Sans SUPABASE_URL / SUPABASE_KEY (installation locale) : rien n'est journalisé
+    return SyncService(DatabaseManager.get_supabase, DatabaseManager.session,
+                       builders={"users": _user_payload, "glossary": _glossary_payload},
+                       configured=lambda: bool(os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY")))
+
+def after_commit(query: str, ops):
+    if ops:
+        get_sync_service().wake()
+    q_up = query.upper()
+    if "INSERT" in q_up and "QUESTION_BANK" in q_up:
+        from core.eviction import maybe_evict
+        maybe_evict()
+
+def sync_ops_for(query: str, params: tuple = ()):
+    """Traduit une écriture locale en opérations Cloud (journalisées dans l'outbox)."""
+    q_up = query.upper()
+    uid = st.session_state.get('user_id')
+    if not uid and params:
+        uid = params[0]
+    if not uid: return []
+        
+    if "UPDATE USERS" in q_up:
+        return [SyncOp("users", "upsert", ("users", uid))]
+    elif "INSERT" in q_up or "UPDATE" in q_up:
+        if "HISTORY" in q_up and len(params) > 1:
+            return [SyncOp("history", "upsert", ("history", uid, params[1]), payload={"user_id": uid, "question_hash": params[1]})]
+        elif "GLOSSARY" in q_up:
+            return [SyncOp("glossary", "upsert", ("glossary", uid, params[1] if len(params) > 1 else ""))]
+        elif "QUESTION_BANK" in q_up and len(params) >= 6:
             data = {
                 "category": params[0], "level": params[1], "question": params[2],
                 "options": params[3], "correct": params[4], "explanation": params[5]
             }
-        elif table == "glossary":
-            with DatabaseManager.session() as cursor:
-                cursor.execute("SELECT * FROM glossary WHERE user_id=? AND term=?", (uid, params[1] if len(params)>1 else ""))
-                r = cursor.fetchone()
-            if r:
-                data = {"user_id": r[0], "term": r[1], "definition": r[2], "category": r[3], "use_case": r[4], "business_impact": r[5], "short_definition": r[6]}
-        
-        if data:
-            sb.table(table).upsert(data).execute()
-    except:
-        pass
+            return [SyncOp("question_bank", "upsert", ("question_bank", params[2]), payload=data)]
+    elif "DELETE" in q_up and params:
+        if "GLOSSARY" in q_up:
+            # Pour glossary, params[0] est le terme
+            return [SyncOp("glossary", "delete", ("glossary", uid, params[0]), filters={"user_id": uid, "term": params[0]})]
+        elif "NOTES" in q_up:
+            # Pour notes, params[0] est le note_id
+            return [SyncOp("notes", "delete", ("notes", params[0]), filters={"note_id": params[0]})]
+    return []
+
+def _user_payload(user_id):
+    from datetime import datetime
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
+        ld = cursor.fetchone()
+    if not ld: return None
+    return {
+        "user_id": str(ld[0]), "name": str(ld[1]), "level": int(ld[2] or 1), 
+        "xp": int(ld[3] or 0), "total_score": int(ld[4] or 0), "mastery": int(ld[5] or 0), 
+        "q_count": int(ld[6] or 0), "hearts": int(ld[7] or 5), "email": str(ld[9] or ""), 
+        "city": str(ld[10] or ""), "crisis_wins": int(ld[13] or 0), "has_diploma": int(ld[15] or 0),
+        "joker_5050": int(ld[17] if len(ld)>17 else 3), "joker_hint": int(ld[18] if len(ld)>18 else 3),
+        "last_seen": datetime.now().isoformat()
+    }
+
+def _glossary_payload(uid, term):
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT * FROM glossary WHERE user_id=? AND term=?", (uid, term))
+        r = cursor.fetchone()
+    if not r: return None
+    return {"user_id": r[0], "term": r[1], "definition": r[2], "category": r[3], "use_case": r[4], "business_impact": r[5], "short_definition": r[6]}
+
+_delta_locks = {}
+
+def get_watermark(name: str):
+    """(valeur, clés déjà appliquées à cette valeur) ; les watermarks d'avant le départage par clé n'ont pas de clés."""
+    res = run_query("SELECT watermark FROM sync_state WHERE name=?", (name,), fetch_one=True, commit=False)
+    if not res or res[0] is None: return None, set()
+    raw = res[0]
+    if isinstance(raw, str) and raw.startswith("{"):
+        state = json.loads(raw)
+        return state["value"], set(state["keys"])
+    return raw, set()
+
+def pull_delta(name: str, table: str, column: str, apply_rows, key: str, columns: str = "*", page_size: int = 500):
+    """Pull incrémental : ne récupère que les lignes Cloud dont `column` atteint ou dépasse le watermark local.
+
+    Filtre `gte` + départage par clé primaire : les lignes arrivées à la valeur exacte du watermark après la
+    dernière lecture ne sont pas perdues, celles déjà appliquées sont écartées. Le premier passage (pas encore
+    de watermark) charge tout en une requête. Les lignes sans valeur dans `column` sont appliquées mais
+    n'avancent pas le watermark. Les pages sont appliquées (executemany) et le watermark avancé dans une
+    seule transaction. Renvoie le nombre de lignes appliquées.
+    """
+    sb = DatabaseManager.get_supabase()
+    if not sb: return 0
+    lock = _delta_locks.setdefault(name, threading.Lock())
+    if not lock.acquire(blocking=False): return 0  # Pull déjà en cours (autre session)
+    try:
+        wm, seen = get_watermark(name)
+        rows, offset = [], 0
+        if wm is None:
+            # Premier passage : chargement en un seul select trié (si le serveur plafonne la réponse,
+            # le watermark posé sur la dernière ligne reçue permet au passage suivant de reprendre)
+            rows = sb.table(table).select(columns).order(column).execute().data or []
+        while wm is not None:
+            page = sb.table(table).select(columns).gte(column, wm).order(column).range(offset, offset + page_size - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < page_size: break
+            offset += page_size
+        rows = [r for r in rows if not (wm is not None and r.get(column) == wm and str(r.get(key)) in seen)]
+        if not rows: return 0
+        new_wm = max((r[column] for r in rows if r.get(column) is not None), default=wm)
+        keys = {str(r.get(key)) for r in rows if new_wm is not None and r.get(column) == new_wm}
+        if new_wm == wm: keys |= seen
+        with DatabaseManager.session() as cursor:
+            apply_rows(cursor, rows)
+            if new_wm is not None:
+                cursor.execute("INSERT INTO sync_state (name, watermark, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP) ON CONFLICT(name) DO UPDATE SET watermark=excluded.watermark, updated_at=excluded.updated_at",
+                               (name, json.dumps({"value": new_wm, "keys": sorted(keys)})))
+        return len(rows)
+    finally:
+        lock.release()
+
+def _apply_shared_questions(cursor, rows):
+    # Dédoublonnage par empreinte : une question déjà présente localement n'est pas réinsérée
+    cursor.executemany("""
+        INSERT INTO question_bank (category, level, question, options, correct, explanation)
+        SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM question_bank WHERE qhash=qdigest(?))
+    """, [(q['category'], q['level'], q['question'], q['options'], q['correct'], q['explanation'], q['question']) for q in rows])
+
+def _apply_users(cursor, rows):
+    # email est UNIQUE : vide -> NULL, et un email repris par le Cloud est retiré de l'ancien compte local
+    cursor.executemany("UPDATE users SET email=NULL WHERE email=? AND user_id != ?",
+                       [(u['email'], u['user_id']) for u in rows if u.get('email')])
+    cursor.executemany("""
+        INSERT INTO users (user_id, name, level, xp, total_score, mastery, q_count, hearts, email, city, crisis_wins, has_diploma, joker_5050, joker_hint, last_seen)
+        VALUES (?,?,?,?,?,?,?,?,NULLIF(?, ''),?,?,?,?,?,?)
+        ON CONFLICT(user_id) DO UPDATE SET name=excluded.name, level=excluded.level, xp=excluded.xp, total_score=excluded.total_score,
+            mastery=excluded.mastery, q_count=excluded.q_count, hearts=excluded.hearts, email=excluded.email, city=excluded.city,
+            crisis_wins=excluded.crisis_wins, has_diploma=excluded.has_diploma, joker_5050=excluded.joker_5050,
+            joker_hint=excluded.joker_hint, last_seen=excluded.last_seen
+    """, [(u['user_id'], u['name'], u.get('level', 1), u.get('xp', 0), u.get('total_score', 0), u.get('mastery', 0), u.get('q_count', 0), u.get('hearts', 5), u.get('email'), u.get('city', ''), u.get('crisis_wins', 0), u.get('has_diploma', 0), u.get('joker_5050', 3), u.get('joker_hint', 3), u.get('last_seen')) for u in rows])
 
 def pull_shared_questions():
-    import time
-    time.sleep(15)
     try:
-        sb = DatabaseManager.get_supabase()
-        if not sb: return
-        res = sb.table("question_bank").select("*").order("id", desc=True).limit(50).execute()
-        if res.data:
-            with DatabaseManager.session() as cursor:
-                for q in res.data:
-                    cursor.execute("INSERT OR IGNORE INTO question_bank (category, level, question, options, correct, explanation) VALUES (?,?,?,?,?,?)",
-                                 (q['category'], q['level'], q['question'], q['options'], q['correct'], q['explanation']))
+        pull_delta("question_bank", "question_bank", "id", _apply_shared_questions, key="id",
+                   columns="id, category, level, question, options, correct, explanation")
     except:
         pass
 
@@ -156,42 +516,13 @@ def pull_user_data_from_supabase(user_id):
             for g in res_g.data:
                 run_query("INSERT OR REPLACE INTO glossary (user_id, term, definition, category, use_case, business_impact, short_definition) VALUES (?,?,?,?,?,?,?)",
                          (g['user_id'], g['term'], g['definition'], g['category'], g.get('use_case'), g.get('business_impact'), g.get('short_definition')), commit=False)
+            _user_cache.invalidate(user_id)
+            get_leaderboard_index().update(u['user_id'], u.get('level', 1), u.get('total_score', 0), u['name'], u.get('city', ''))
             return True
     except:
         pass
     return False
 
-def sync_user_to_supabase(user_id):
-    sb = DatabaseManager.get_supabase()
-    if not sb: return
-    
-    import time
-    from datetime import datetime
-    
-    # Retry logic (3 attempts)
-    for attempt in range(3):
-        try:
-            with DatabaseManager.session() as cursor:
-                cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
-                ld = cursor.fetchone()
-            
-            if ld:
-                data = {
-                    "user_id": str(ld[0]), "name": str(ld[1]), "level": int(ld[2] or 1), 
-                    "xp": int(ld[3] or 0), "total_score": int(ld[4] or 0), "mastery": int(ld[5] or 0), 
-                    "q_count": int(ld[6] or 0), "hearts": int(ld[7] or 5), "email": str(ld[9] or ""), 
-                    "city": str(ld[10] or ""), "crisis_wins": int(ld[13] or 0), "has_diploma": int(ld[15] or 0),
-                    "joker_5050": int(ld[17] if len(ld)>17 else 3), "joker_hint": int(ld[18] if len(ld)>18 else 3),
-                    "last_seen": datetime.now().isoformat()
-                }
-                sb.table("users").upsert(data).execute()
-                break # Success
-        except Exception as e:
-            if attempt < 2:
-                time.sleep(1) # Wait before retry
-            else:
-                print(f"Sync failed for user {user_id}: {e}")
-
 def purge_user_data(user_id):
     """Supprime toutes les données d'un utilisateur en local et tente sur le Cloud."""
     # 1. Cloud (Async)
@@ -207,15 +538,16 @@ def purge_user_data(user_id):
     threading.Thread(target=_cloud_purge, args=(user_id,), daemon=True).start()
 
     # 2. Local
-    tables = ["users", "history", "stats", "glossary", "notes", "ai_queue"]
+    tables = ["users", "history", "stats", "glossary", "notes", "ai_queue", "user_counters", "user_badges"]
     with DatabaseManager.session() as cursor:
         for t in tables:
             cursor.execute(f"DELETE FROM {t} WHERE user_id=?", (user_id,))
+    get_leaderboard_index().remove(user_id)
+    _user_cache.invalidate(user_id)
     return True
 
 @st.cache_resource
 def init_db():
-    threading.Thread(target=pull_shared_questions, daemon=True).start()
     queries = [
         'CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, name TEXT, level INTEGER DEFAULT 1, xp INTEGER DEFAULT 0, total_score INTEGER DEFAULT 0, mastery INTEGER DEFAULT 0, q_count INTEGER DEFAULT 0, hearts INTEGER DEFAULT 5, last_seen TEXT, email TEXT UNIQUE, city TEXT, referred_by TEXT, xp_checkpoint INTEGER DEFAULT 0, crisis_wins INTEGER DEFAULT 0, redemptions INTEGER DEFAULT 0, has_diploma INTEGER DEFAULT 0, current_run_xp INTEGER DEFAULT 0, joker_5050 INTEGER DEFAULT 3, joker_hint INTEGER DEFAULT 3)',
         'CREATE TABLE IF NOT EXISTS history (user_id TEXT, question_hash TEXT, UNIQUE(user_id, question_hash))',
@@ -225,7 +557,18 @@ def init_db():
         'CREATE TABLE IF NOT EXISTS notes (user_id TEXT, note_id TEXT PRIMARY KEY, title TEXT, content TEXT, timestamp TEXT)',
         'CREATE TABLE IF NOT EXISTS difficulty_feedback (question_id INTEGER, hard_votes INTEGER DEFAULT 0, easy_votes INTEGER DEFAULT 0, PRIMARY KEY(question_id))',
         'CREATE TABLE IF NOT EXISTS user_feedback (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, user_name TEXT, user_email TEXT, message TEXT, context TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)',
-        'CREATE TABLE IF NOT EXISTS ai_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, question_json TEXT, category TEXT)'
+        'CREATE TABLE IF NOT EXISTS ai_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, question_json TEXT, category TEXT)',
+        OUTBOX_SCHEMA,
+        DEAD_LETTER_SCHEMA,
+        AI_CACHE_SCHEMA,
+        *CORPUS_SCHEMA,
+        *RETRIEVAL_SCHEMA,
+        *SEARCH_SCHEMA,
+        'CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, watermark, updated_at TEXT)',
+        'CREATE TABLE IF NOT EXISTS meta_counters (name TEXT PRIMARY KEY, value INTEGER DEFAULT 0)',
+        'CREATE TABLE IF NOT EXISTS user_counters (user_id TEXT, name TEXT, value INTEGER DEFAULT 0, PRIMARY KEY(user_id, name))',
+        'CREATE TABLE IF NOT EXISTS user_badges (user_id TEXT, title TEXT, earned_at TEXT, PRIMARY KEY(user_id, title))',
+        'CREATE TABLE IF NOT EXISTS stocker_checkpoint (run_id TEXT, level INTEGER, module TEXT, target INTEGER, triads_done INTEGER DEFAULT 0, updated_at REAL, PRIMARY KEY(run_id, level, module))'
     ]
     with DatabaseManager.session() as cursor:
         for q in queries:
@@ -239,12 +582,59 @@ def init_db():
         try: cursor.execute("ALTER TABLE user_feedback ADD COLUMN context TEXT")
         except: pass
 
+        # Migrations empreintes 64 bits (qhash)
+        try: cursor.execute("ALTER TABLE question_bank ADD COLUMN qhash INTEGER")
+        except: pass
+        try: cursor.execute("ALTER TABLE history ADD COLUMN qhash INTEGER")
+        except: pass
+        cursor.execute("UPDATE question_bank SET qhash=qdigest(question) WHERE qhash IS NULL")
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_qbank_qhash AFTER INSERT ON question_bank WHEN NEW.qhash IS NULL BEGIN UPDATE question_bank SET qhash=qdigest(NEW.question) WHERE id=NEW.id; END")
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_qbank_qhash_upd AFTER UPDATE OF question ON question_bank BEGIN UPDATE question_bank SET qhash=qdigest(NEW.question) WHERE id=NEW.id; END")
+        # Origine des questions (les questions seed sont protégées de l'éviction)
+        try:
+            cursor.execute("ALTER TABLE question_bank ADD COLUMN source TEXT")
+            seed_file = Path(ROOT_DIR) / "questions_seed.json"
+            if seed_file.exists():
+                with open(seed_file, "r", encoding="utf-8") as f:
+                    seed_hashes = [(question_digest(q.get('question')),) for q in json.load(f)]
+                cursor.executemany("UPDATE question_bank SET source='seed' WHERE qhash=?", seed_hashes)
+        except: pass
+
+        # Compteur de lignes maintenu par triggers (évite un COUNT(*) après chaque insertion)
+        cursor.execute("INSERT OR REPLACE INTO meta_counters (name, value) SELECT 'question_bank', COUNT(*) FROM question_bank")
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_qbank_count_ins AFTER INSERT ON question_bank BEGIN UPDATE meta_counters SET value=value+1 WHERE name='question_bank'; END")
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_qbank_count_del AFTER DELETE ON question_bank BEGIN UPDATE meta_counters SET value=value-1 WHERE name='question_bank'; END")
+
+        # Compteurs par utilisateur pour les badges (termes du glossaire) ; un REPLACE sur un terme existant ne compte pas
+        cursor.execute("DELETE FROM user_counters WHERE name='glossary'")
+        cursor.execute("INSERT INTO user_counters (user_id, name, value) SELECT user_id, 'glossary', COUNT(*) FROM glossary GROUP BY user_id")
+        cursor.execute("""CREATE TRIGGER IF NOT EXISTS trg_glossary_count_ins BEFORE INSERT ON glossary
+            WHEN NOT EXISTS (SELECT 1 FROM glossary WHERE user_id=NEW.user_id AND term=NEW.term)
+            BEGIN INSERT INTO user_counters (user_id, name, value) VALUES (NEW.user_id, 'glossary', 1) ON CONFLICT(user_id, name) DO UPDATE SET value=value+1; END""")
+        cursor.execute("CREATE TRIGGER IF NOT EXISTS trg_glossary_count_del AFTER DELETE ON glossary BEGIN UPDATE user_counters SET value=value-1 WHERE user_id=OLD.user_id AND name='glossary'; END")
+
+        # Index plein texte : (re)construit si la base est antérieure aux triggers FTS5
+        get_search_index().ensure(cursor)
+
+        # Historique legacy : le texte complet de la question est remplacé par son empreinte
+        cursor.execute("SELECT rowid, question_hash FROM history WHERE qhash IS NULL")
+        legacy = cursor.fetchall()
+        if legacy:
+            cursor.executemany("UPDATE OR IGNORE history SET qhash=?, question_hash=? WHERE rowid=?",
+                               [(question_digest(t), question_key(t), rid) for rid, t in legacy])
+            cursor.execute("DELETE FROM history WHERE qhash IS NULL")
+
         # Indexation
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user ON history(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_qhash ON history(question_hash)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_composite ON history(user_id, question_hash)")
+        cursor.execute("DROP INDEX IF EXISTS idx_history_qhash")
+        cursor.execute("DROP INDEX IF EXISTS idx_history_composite")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_user_qhash ON history(user_id, qhash)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qbank_qhash ON question_bank(qhash)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_qbank_lvl_cat ON question_bank(level, category)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qbank_level ON question_bank(level)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_qbank_triad ON question_bank(triad_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_stats_user ON stats(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_rank ON users(level DESC, total_score DESC)")
         
         cursor.execute("SELECT COUNT(*) FROM question_bank")
         if cursor.fetchone()[0] == 0:
@@ -259,35 +649,117 @@ def init_db():
                             q.get('correct'), q.get('explanation'), 
                             q.get('triad_id'), q.get('triad_position')
                         )
-                        cursor.execute("INSERT INTO question_bank (category, concept, level, question, options, correct, explanation, triad_id, triad_position) VALUES (?,?,?,?,?,?,?,?,?)", q_vals)
+                        cursor.execute("INSERT INTO question_bank (category, concept, level, question, options, correct, explanation, triad_id, triad_position, source) VALUES (?,?,?,?,?,?,?,?,?,'seed')", q_vals)
+
+    # Rejoue les synchros Cloud restées en attente (crash entre commit local et envoi)
+    get_sync_service().replay()
+    threading.Thread(target=pull_shared_questions, daemon=True).start()
+    from core.eviction import start_maintenance_scheduler
+    start_maintenance_scheduler()
+    start_leaderboard_refresher()
     return True
 
-def sync_leaderboard_from_supabase(limit=20):
+def _apply_leaderboard(cursor, rows):
+    """Applique les lignes (user_id, nom, niveau, score, ville) ; renvoie les user_id dont la ligne locale a changé."""
+    local = {}
+    for i in range(0, len(rows), 500):
+        chunk = [r[0] for r in rows[i:i + 500]]
+        cursor.execute(f"SELECT user_id, name, level, total_score, city FROM users WHERE user_id IN ({','.join('?' * len(chunk))})", chunk)
+        local.update((r[0], tuple(r)) for r in cursor.fetchall())
+    rows = [r for r in rows if local.get(r[0]) != tuple(r)]
+    # UPSERT limité aux colonnes du classement : xp, cœurs, email... locaux restent intacts
+    cursor.executemany("""
+        INSERT INTO users (user_id, name, level, total_score, city) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET name=excluded.name, level=excluded.level, total_score=excluded.total_score, city=excluded.city
+        WHERE users.name IS NOT excluded.name OR users.level IS NOT excluded.level
+           OR users.total_score IS NOT excluded.total_score OR users.city IS NOT excluded.city
+    """, rows)
+    return [r[0] for r in rows]
+
+_leaderboard_refresh = {"lock": threading.Lock(), "last": 0.0, "thread": None, "stop": threading.Event(),
+                        "stats": {"refreshes": 0, "changed_rows": 0, "failures": 0, "last_error": None}}
+_leaderboard_refresher_lock = threading.Lock()
+
+def sync_leaderboard_from_supabase(limit=None, policy=None, force=False):
+    """Rapatrie le haut du classement Cloud par pages et l'applique en un lot.
+
+    Au plus un passage par `refresh_interval` pour tout le process (sauf `force`). Renvoie True si le
+    classement en mémoire a changé (sa version est alors incrémentée).
+    """
+    policy = {**LEADERBOARD_POLICY, **(policy or {})}
     sb = DatabaseManager.get_supabase()
-    if not sb: return
+    if not sb: return False
+    state = _leaderboard_refresh
+    if not force and time.monotonic() - state["last"] < policy["refresh_interval"]: return False
+    if not state["lock"].acquire(blocking=False): return False  # Rafraîchissement déjà en cours
     try:
-        res = sb.table("users").select("user_id, name, level, total_score, city").order("level", desc=True).limit(limit).execute()
-        if res.data:
-            with DatabaseManager.session() as cursor:
-                for u in res.data:
-                    cursor.execute("INSERT OR REPLACE INTO users (user_id, name, level, total_score, city) VALUES (?, ?, ?, ?, ?)", (u['user_id'], u['name'], u.get('level', 1), u.get('total_score', 0), u.get('city', '')))
-    except:
-        pass
+        limit, page_size = limit or policy["max_rows"], policy["page_size"]
+        rows, offset = [], 0
+        while offset < limit:
+            page = (sb.table("users").select("user_id, name, level, total_score, city")
+                    .order("level", desc=True).order("total_score", desc=True)
+                    .range(offset, min(offset + page_size, limit) - 1).execute().data or [])
+            rows.extend((u['user_id'], u['name'], u.get('level') or 1, u.get('total_score') or 0, u.get('city') or '') for u in page)
+            if len(page) < page_size: break
+            offset += page_size
+        state["stats"]["refreshes"] += 1
+        if not rows: return False
+        with DatabaseManager.session() as cursor:
+            changed = _apply_leaderboard(cursor, rows)
+        state["stats"]["changed_rows"] += len(changed)
+        # Seuls les utilisateurs dont la ligne a bougé perdent leur cache
+        for uid in changed:
+            _user_cache.invalidate(uid, sections=("user",))
+        return get_leaderboard_index().update_many(rows)
+    except Exception as e:
+        state["stats"]["failures"] += 1
+        state["stats"]["last_error"] = str(e)
+        return False
+    finally:
+        state["last"] = time.monotonic()  # Un échec compte comme un passage : pas de relance en boucle
+        state["lock"].release()
+
+def leaderboard_refresh_stats() -> dict:
+    return dict(_leaderboard_refresh["stats"])
+
+def start_leaderboard_refresher(policy=None):
+    """Rafraîchissement périodique du classement en tâche de fond (un seul thread par process)."""
+    policy = {**LEADERBOARD_POLICY, **(policy or {})}
+    state = _leaderboard_refresh
+    if state["thread"] and state["thread"].is_alive(): return
+
+    def _loop():
+        while not state["stop"].is_set():
+            # Chemin à intervalle : un rafraîchissement récent (autre page, admin) repousse le suivant
+            sync_leaderboard_from_supabase(policy=policy)
+            wait = policy["refresh_interval"] - (time.monotonic() - state["last"])
+            state["stop"].wait(wait if wait > 0 else policy["refresh_interval"])
+
+    with _leaderboard_refresher_lock:
+        if state["thread"] and state["thread"].is_alive(): return
+        state["stop"].clear()
+        state["thread"] = threading.Thread(target=_loop, name="leaderboard-refresh", daemon=True)
+        state["thread"].start()
+
+def stop_leaderboard_refresher(timeout: float = 5.0):
+    """Arrête le rafraîchissement périodique (tests, arrêt propre) et attend la fin du thread."""
+    state = _leaderboard_refresh
+    state["stop"].set()
+    with _leaderboard_refresher_lock:
+        thread, state["thread"] = state["thread"], None
+    if thread: thread.join(timeout)
 
 def sync_all_users_for_admin():
     try:
-        sb = DatabaseManager.get_supabase()
-        if not sb: return
-        res = sb.table("users").select("*").execute()
-        if res.data:
-            with DatabaseManager.session() as cursor:
-                for u in res.data:
-                    cursor.execute("INSERT OR REPLACE INTO users (user_id, name, level, xp, total_score, mastery, q_count, hearts, email, city, crisis_wins, has_diploma, joker_5050, joker_hint) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", 
-                                 (u['user_id'], u['name'], u.get('level', 1), u.get('xp', 0), u.get('total_score', 0), u.get('mastery', 0), u.get('q_count', 0), u.get('hearts', 5), u.get('email'), u.get('city', ''), u.get('crisis_wins', 0), u.get('has_diploma', 0), u.get('joker_5050', 3), u.get('joker_hint', 3)))
+        applied = pull_delta("users", "users", "last_seen", _apply_users, key="user_id")
+        if applied:
+            get_leaderboard_index().invalidate()
+            _user_cache.invalidate(sections=("user",))
+        return applied
     except:
-        pass
+        return 0
 
 def get_leaderboard(sync=False):
-    if sync:
-        threading.Thread(target=sync_leaderboard_from_supabase, daemon=True).start()
-    return run_query('SELECT name, total_score, level FROM users ORDER BY level DESC, total_score DESC LIMIT 10', fetch_all=True)
\ No newline at end of file
+    if sync: start_leaderboard_refresher()
+    # Classement matérialisé en mémoire : plus de tri de la table users à chaque rendu
+    return [(name, score, level) for _, _, name, level, score, _, _ in get_leaderboard_index().top(10)]
\ No newline at end of file
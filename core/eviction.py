@@ -0,0 +1,121 @@
+# core/eviction.py
+import threading
+import time
+from core.config import QUESTION_BANK_POLICY
+from core.database import DatabaseManager
+
+_evict_lock = threading.Lock()
+_scheduler = None
+# Dernier déclenchement, et taille de banque à laquelle la dernière passe n'a plus rien trouvé d'évictable
+_trigger = {"at": float("-inf"), "stuck_at": None}
+_trigger_lock = threading.Lock()
+_maintenance = {"runs": 0, "removed": 0, "failures": 0, "last_error": None, "last_run": None}
+
+def bank_size() -> int:
+    """Taille de la banque lue sur le compteur maintenu par triggers (pas de COUNT(*))."""
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT value FROM meta_counters WHERE name='question_bank'")
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+def select_victims(cursor, limit: int, policy=None):
+    """Candidats à l'éviction, du moins utile au plus utile.
+
+    Protégées : questions seed, triades complètes, questions au feedback équilibré.
+    Évincées en premier : questions jugées nettement trop dures ou trop faciles, puis les plus anciennes.
+    """
+    policy = policy or QUESTION_BANK_POLICY
+    cursor.execute("""
+        SELECT q.id FROM question_bank q
+        LEFT JOIN difficulty_feedback f ON f.question_id = q.id
+        WHERE COALESCE(q.source, '') != 'seed'
+          AND (q.triad_id IS NULL OR (SELECT COUNT(*) FROM question_bank t WHERE t.triad_id = q.triad_id) < 3)
+          AND NOT (COALESCE(f.hard_votes, 0) + COALESCE(f.easy_votes, 0) >= :min_votes
+                   AND MAX(f.hard_votes, f.easy_votes) * 3 <= (f.hard_votes + f.easy_votes) * 2)
+        ORDER BY CASE WHEN COALESCE(f.hard_votes, 0) + COALESCE(f.easy_votes, 0) >= :min_votes THEN 0 ELSE 1 END, q.id ASC
+        LIMIT :limit
+    """, {"min_votes": policy["min_votes"], "limit": limit})
+    return [r[0] for r in cursor.fetchall()]
+
+def evict_questions(policy=None) -> int:
+    """Ramène la banque sous le low watermark par lots. Renvoie le nombre de questions supprimées."""
+    policy = policy or QUESTION_BANK_POLICY
+    if not _evict_lock.acquire(blocking=False): return 0  # Éviction déjà en cours
+    removed, stuck_at = 0, None
+    try:
+        while True:
+            size = bank_size()
+            excess = size - policy["low_watermark"]
+            if excess <= 0: break
+            with DatabaseManager.session() as cursor:
+                victims = select_victims(cursor, min(excess, policy["batch_size"]), policy)
+                if not victims:
+                    stuck_at = size  # Tout le reste est protégé
+                    break
+                marks = ",".join("?" * len(victims))
+                cursor.execute(f"DELETE FROM question_bank WHERE id IN ({marks})", victims)
+                cursor.execute(f"DELETE FROM difficulty_feedback WHERE question_id IN ({marks})", victims)
+            removed += len(victims)
+    finally:
+        with _trigger_lock:
+            _trigger["stuck_at"] = stuck_at
+        _evict_lock.release()
+    return removed
+
+def maybe_evict(policy=None) -> bool:
+    """Appelé après une insertion : simple lecture du compteur, éviction en tâche de fond si nécessaire.
+
+    Au plus un déclenchement par `evict_min_interval`, et aucun tant que la banque n'a pas grossi d'un lot
+    depuis la dernière passe restée sans victime (sinon chaque insertion relancerait un parcours complet).
+    Renvoie True si une éviction a été lancée.
+    """
+    policy = policy or QUESTION_BANK_POLICY
+    size = bank_size()
+    if size <= policy["high_watermark"] or _evict_lock.locked(): return False
+    now = time.monotonic()
+    with _trigger_lock:
+        stuck_at = _trigger["stuck_at"]
+        if stuck_at is not None and size < stuck_at + policy["batch_size"]: return False
+        if now - _trigger["at"] < policy.get("evict_min_interval", 0): return False
+        _trigger["at"] = now
+    threading.Thread(target=evict_questions, args=(policy,), daemon=True).start()
+    return True
+
+def run_maintenance(policy=None) -> int:
+    """Une passe de maintenance ; un échec est consigné dans eviction_stats() au lieu d'interrompre le scheduler."""
+    try:
+        removed = evict_questions(policy)
+    except Exception as e:
+        _maintenance["failures"] += 1
+        _maintenance["last_error"] = str(e)
+        return 0
+    _maintenance["runs"] += 1
+    _maintenance["removed"] += removed
+    _maintenance["last_run"] = time.time()
+    return removed
+
+def eviction_stats() -> dict:
+    """Taille de la banque, état du déclenchement et des passes de maintenance (affiché dans l'admin)."""
+    with _trigger_lock:
+        stuck_at = _trigger["stuck_at"]
+    return {"bank_size": bank_size(), "stuck_at": stuck_at, **_maintenance}
+
+def start_maintenance_scheduler(interval=None):
+    """Passe de maintenance périodique (une seule par process)."""
+    global _scheduler
+    if _scheduler and _scheduler.is_alive(): return
+    interval = interval or QUESTION_BANK_POLICY["maintenance_interval"]
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            run_maintenance()
+
+    _scheduler = threading.Thread(target=_loop, name="bank-maintenance", daemon=True)
+    _scheduler.start()
+
+if __name__ == "__main__":
+    from core.database import init_db
+    init_db()
+    print(f"Banque : {bank_size()} questions")
+    print(f"Éviction : {evict_questions()} questions supprimées")
@@ -0,0 +1,148 @@
+# core/leaderboard.py
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, List, Optional, Tuple
+
+LEADERBOARD_QUERY = 'SELECT user_id, name, level, total_score, city, last_seen FROM users ORDER BY level DESC, total_score DESC'
+
+class Leaderboard:
+    """Classement matérialisé en mémoire : liste triée de clés (-niveau, -score, user_id) + fiche par utilisateur.
+
+    Chargé une fois depuis SQLite (index idx_users_rank), puis tenu à jour à chaque changement de score.
+    Rang et voisinage d'un utilisateur : une recherche dichotomique, quelle que soit la population.
+    `version` n'augmente que si l'ordre ou un nom/ville affiché change : les vues s'en servent de clé de cache.
+    `lookup(uid)` -> (nom, ville, dernière activité) complète une entrée nouvelle reçue sans nom.
+    """
+
+    def __init__(self, loader: Callable[[], list], lookup: Optional[Callable[[str], Optional[tuple]]] = None):
+        self.loader = loader
+        self.lookup = lookup
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[int, int, str]] = []
+        self._entries = {}  # uid -> (clé, nom, ville, dernière activité)
+        self._loaded = False
+        self.version = 0
+
+    @staticmethod
+    def _key(uid, level, score):
+        return -int(level or 1), -int(score or 0), str(uid)
+
+    def reload(self):
+        rows = self.loader()
+        keys, entries = [], {}
+        for uid, name, level, score, city, last_seen in rows:
+            key = self._key(uid, level, score)
+            keys.append(key)
+            entries[uid] = (key, name, city, last_seen)
+        keys.sort()  # Déjà presque trié par l'index : tri linéaire en pratique
+        with self._lock:
+            if keys != self._keys or any(self._entries.get(uid, (None,))[1:3] != e[1:3] for uid, e in entries.items()):
+                self.version += 1
+            self._keys, self._entries, self._loaded = keys, entries, True
+
+    def invalidate(self):
+        """Après une écriture en masse (synchro Cloud) : rechargement complet à la prochaine lecture."""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure(self):
+        if not self._loaded: self.reload()
+
+    def update(self, uid, level, score, name=None, city=None, last_seen=None):
+        """Déplace (ou insère) un utilisateur après un changement de niveau ou de score."""
+        known = None
+        if name is None and self.lookup:
+            with self._lock:
+                missing = self._loaded and uid not in self._entries
+            # Lecture en base hors verrou : top / rank / around ne l'attendent pas
+            if missing: known = self.lookup(uid)
+        with self._lock:
+            if not self._loaded: return  # Le prochain chargement lira la valeur en base
+            key = self._key(uid, level, score)
+            old = self._entries.get(uid)
+            if old:
+                name, city, last_seen = name or old[1], city if city is not None else old[2], last_seen or old[3]
+                if old[0] != key:
+                    del self._keys[bisect_left(self._keys, old[0])]
+                    insort(self._keys, key)
+                    self.version += 1
+                elif (name, city) != old[1:3]:
+                    self.version += 1
+            else:
+                if name is None and known:
+                    name, city, last_seen = known
+                insort(self._keys, key)
+                self.version += 1
+            self._entries[uid] = (key, name, city, last_seen)
+
+    def update_many(self, rows):
+        """Applique un lot (user_id, nom, niveau, score, ville) ; renvoie True si le classement a changé."""
+        with self._lock:
+            before = self.version
+            for uid, name, level, score, city in rows:
+                self.update(uid, level, score, name, city)
+            return self.version != before
+
+    def remove(self, uid):
+        with self._lock:
+            old = self._entries.pop(uid, None)
+            if old:
+                del self._keys[bisect_left(self._keys, old[0])]
+                self.version += 1
+
+    def _row(self, i):
+        level, score, uid = self._keys[i]
+        _, name, city, last_seen = self._entries[uid]
+        return i + 1, uid, name, -level, -score, city, last_seen
+
+    def top(self, n=10, offset=0) -> list:
+        """Lignes (rang, user_id, nom, niveau, score, ville, dernière activité) du classement."""
+        with self._lock:
+            self._ensure()
+            return [self._row(i) for i in range(offset, min(offset + n, len(self._keys)))]
+
+    def rank(self, uid) -> Optional[int]:
+        with self._lock:
+            self._ensure()
+            entry = self._entries.get(uid)
+            return bisect_left(self._keys, entry[0]) + 1 if entry else None
+
+    def around(self, uid, radius=2) -> list:
+        """L'utilisateur et ses `radius` voisins de part et d'autre dans le classement."""
+        with self._lock:
+            rank = self.rank(uid)
+            if rank is None: return []
+            start = max(0, rank - 1 - radius)
+            return [self._row(i) for i in range(start, min(rank + radius, len(self._keys)))]
+
+    def current_version(self) -> int:
+        with self._lock:
+            self._ensure()
+            return self.version
+
+    def __len__(self):
+        with self._lock:
+            self._ensure()
+            return len(self._keys)
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+def get_leaderboard_index():
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                from core.database import DatabaseManager
+
+                def load():
+                    with DatabaseManager.session() as cursor:
+                        cursor.execute(LEADERBOARD_QUERY)
+                        return cursor.fetchall()
+
+                def lookup(uid):
+                    with DatabaseManager.session() as cursor:
+                        cursor.execute("SELECT name, city, last_seen FROM users WHERE user_id=?", (uid,))
+                        return cursor.fetchone()
+                _leaderboard = Leaderboard(load, lookup)
+    return _leaderboard
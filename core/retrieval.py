@@ -0,0 +1,171 @@
+# core/retrieval.py
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+RETRIEVAL_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS retrieval_docs (id INTEGER PRIMARY KEY, source TEXT, section TEXT, text TEXT, length INTEGER)',
+    'CREATE TABLE IF NOT EXISTS retrieval_postings (term TEXT PRIMARY KEY, df INTEGER, postings BLOB)',
+    'CREATE TABLE IF NOT EXISTS retrieval_meta (name TEXT PRIMARY KEY, value)',
+)
+
+STOPWORDS = frozenset("""
+au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur leurs lui ma mais me meme mes moi mon ne
+nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous est sont ete etre
+avoir ont a plus moins tres tout tous toute toutes comme si sans sous entre aussi donc ainsi alors car cela ceci dont quand
+the of and to in for on with is are be by or an it as at this that from
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Mots normalisés : minuscules sans accents, mots vides retirés, pluriel en -s/-x ramené au singulier."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    tokens = []
+    for tok in _TOKEN.findall(text):
+        if len(tok) < 2 or tok in STOPWORDS: continue
+        if len(tok) > 3 and tok[-1] in "sx": tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+class BM25Index:
+    """Index inversé BM25 persistant (tables retrieval_*), interrogé en quelques millisecondes.
+
+    Les listes de postings (doc_id, tf entrelacés) sont stockées en BLOB par terme et gardées dans un LRU
+    mémoire ; seules les lignes des termes de la requête sont lues.
+    """
+
+    def __init__(self, session_factory: Callable, k1: float = 1.2, b: float = 0.75, cache_terms: int = 4096):
+        self.session_factory = session_factory
+        self.k1, self.b = k1, b
+        self.cache_terms = cache_terms
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings: "OrderedDict[str, Tuple[int, array]]" = OrderedDict()
+        self._lengths = None  # doc_id -> longueur (tokens), chargé au premier search
+        self._n_docs, self._avgdl = 0, 0.0
+
+    def build(self, docs: Iterable[Tuple[str, str, str]], fingerprint: str) -> int:
+        """Reconstruit l'index depuis des documents (source, section, texte). Renvoie le nombre de documents indexés."""
+        rows, index = [], {}
+        for doc_id, (source, section, text) in enumerate(docs, 1):
+            counts = Counter(tokenize(f"{section}\n{text}"))
+            rows.append((doc_id, source, section, text, sum(counts.values())))
+            for term, tf in counts.items():
+                index.setdefault(term, array("I")).extend((doc_id, tf))
+        avgdl = sum(r[4] for r in rows) / len(rows) if rows else 0.0
+        with self.session_factory() as cursor:
+            cursor.execute("DELETE FROM retrieval_docs")
+            cursor.execute("DELETE FROM retrieval_postings")
+            cursor.executemany("INSERT INTO retrieval_docs (id, source, section, text, length) VALUES (?,?,?,?,?)", rows)
+            cursor.executemany("INSERT INTO retrieval_postings (term, df, postings) VALUES (?,?,?)",
+                               [(term, len(p) // 2, p.tobytes()) for term, p in index.items()])
+            cursor.executemany("INSERT OR REPLACE INTO retrieval_meta (name, value) VALUES (?, ?)",
+                               [("n_docs", len(rows)), ("avgdl", avgdl), ("fingerprint", fingerprint), ("built_at", time.time())])
+        with self._lock:
+            self._reset()
+        return len(rows)
+
+    def meta(self, name):
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT value FROM retrieval_meta WHERE name=?", (name,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _ensure_loaded(self, cursor):
+        if self._lengths is not None: return
+        cursor.execute("SELECT id, length FROM retrieval_docs")
+        self._lengths = dict(cursor.fetchall())
+        self._n_docs = len(self._lengths)
+        self._avgdl = sum(self._lengths.values()) / self._n_docs if self._n_docs else 0.0
+
+    def _load_postings(self, cursor, terms):
+        found, missing = {}, []
+        with self._lock:
+            for term in terms:
+                if term in self._postings:
+                    self._postings.move_to_end(term)
+                    found[term] = self._postings[term]
+                else:
+                    missing.append(term)
+        if missing:
+            cursor.execute(f"SELECT term, df, postings FROM retrieval_postings WHERE term IN ({','.join('?' * len(missing))})", missing)
+            loaded = {}
+            for term, df, blob in cursor.fetchall():
+                postings = array("I")
+                postings.frombytes(blob)
+                loaded[term] = (df, postings)
+            # Terme absent de l'index : mémorisé comme vide pour ne pas le relire
+            loaded.update({term: (0, array("I")) for term in missing if term not in loaded})
+            with self._lock:
+                for term, value in loaded.items():
+                    self._postings[term] = value
+                while len(self._postings) > self.cache_terms:
+                    self._postings.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[float, str, str, str]]:
+        """Top-k (score, source, section, texte) pour une requête en texte libre."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms: return []
+        with self.session_factory() as cursor:
+            self._ensure_loaded(cursor)
+            if not self._n_docs: return []
+            postings = self._load_postings(cursor, terms)
+            scores = {}
+            k1, b, n, avgdl, lengths = self.k1, self.b, self._n_docs, self._avgdl, self._lengths
+            for term in terms:
+                df, plist = postings[term]
+                if not df: continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for i in range(0, len(plist), 2):
+                    doc_id, tf = plist[i], plist[i + 1]
+                    norm = k1 * (1 - b + b * lengths.get(doc_id, avgdl) / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not best: return []
+            cursor.execute(f"SELECT id, source, section, text FROM retrieval_docs WHERE id IN ({','.join('?' * len(best))})", [d for d, _ in best])
+            docs = {r[0]: r[1:] for r in cursor.fetchall()}
+        return [(score, *docs[doc_id]) for doc_id, score in best if doc_id in docs]
+
+    def context(self, query: str, k: int = 4, max_chars: int = 2500) -> str:
+        """Passages les plus pertinents, mis en forme pour être injectés dans un prompt (chaîne vide si index vide)."""
+        parts, size = [], 0
+        for _, source, section, text in self.search(query, k):
+            block = f"[{source} — {section}]\n{text}"
+            if size + len(block) > max_chars:
+                block = block[:max(0, max_chars - size)]
+            if not block: break
+            parts.append(block)
+            size += len(block)
+        return "\n\n".join(parts)
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever() -> BM25Index:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                from core.config import RETRIEVAL_POLICY
+                from core.database import DatabaseManager
+                _retriever = BM25Index(DatabaseManager.session, RETRIEVAL_POLICY["k1"], RETRIEVAL_POLICY["b"])
+    return _retriever
+
+def course_context(query: str, k: Optional[int] = None, max_chars: Optional[int] = None) -> str:
+    """Extraits du cours (MasterClass, bible des KPI) pour ancrer un prompt ; jamais bloquant en cas d'erreur."""
+    from core.config import RETRIEVAL_POLICY
+    try:
+        return get_retriever().context(query, k or RETRIEVAL_POLICY["top_k"], max_chars or RETRIEVAL_POLICY["max_chars"])
+    except Exception:
+        return ""
@@ -0,0 +1,219 @@
+# core/search.py
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+class SearchSource:
+    """Table indexée en plein texte : une table FTS5 `<table>_fts` (même rowid) tenue à jour par triggers.
+
+    `owner` : colonne propriétaire (recherche restreinte à un utilisateur), stockée dans l'index sous forme
+    d'un jeton unique ('u' + hex) pour que le filtre soit résolu par FTS5 et non ligne à ligne.
+    `unique` : clé d'unicité de la table, utilisée pour désindexer la ligne écrasée par un INSERT OR REPLACE.
+    """
+
+    def __init__(self, table: str, key: str, columns: Tuple[str, ...], weights: Tuple[float, ...], title: str, body: str,
+                 unique: Tuple[str, ...], fields: Tuple[str, ...] = (), owner: Optional[str] = None):
+        self.table = table
+        self.fts = f"{table}_fts"
+        self.key = key
+        self.columns = columns
+        self.weights = weights
+        self.title = title
+        self.body = body
+        self.unique = unique
+        self.fields = fields
+        self.owner = owner
+
+    @property
+    def fts_columns(self) -> Tuple[str, ...]:
+        return (("owner",) if self.owner else ()) + self.columns
+
+    def _values(self, ref: str) -> str:
+        owner = (f"'u' || hex({ref}.{self.owner})",) if self.owner else ()
+        return ", ".join(owner + tuple(f"{ref}.{c}" for c in self.columns))
+
+    def schema(self) -> Tuple[str, ...]:
+        cols = ", ".join(self.fts_columns)
+        insert = f"INSERT INTO {self.fts} (rowid, {cols}) VALUES (NEW.rowid, {self._values('NEW')});"
+        same_key = " AND ".join(f"{c}=NEW.{c}" for c in self.unique)
+        return (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts} USING fts5({cols}, prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{self.fts}_replace BEFORE INSERT ON {self.table} BEGIN "
+            f"DELETE FROM {self.fts} WHERE rowid IN (SELECT rowid FROM {self.table} WHERE {same_key}); END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{self.fts}_ins AFTER INSERT ON {self.table} BEGIN {insert} END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{self.fts}_del AFTER DELETE ON {self.table} BEGIN DELETE FROM {self.fts} WHERE rowid=OLD.rowid; END",
+            # Seules les colonnes indexées déclenchent une réindexation (pas qhash, timestamp...)
+            f"CREATE TRIGGER IF NOT EXISTS trg_{self.fts}_upd AFTER UPDATE OF {', '.join(((self.owner,) if self.owner else ()) + self.columns)} "
+            f"ON {self.table} BEGIN DELETE FROM {self.fts} WHERE rowid=OLD.rowid; {insert} END",
+        )
+
+    def rebuild(self, cursor):
+        cols = ", ".join(self.fts_columns)
+        cursor.execute(f"DELETE FROM {self.fts}")
+        cursor.execute(f"INSERT INTO {self.fts} (rowid, {cols}) SELECT rowid, {self._values(self.table)} FROM {self.table}")
+
+SEARCH_SOURCES: Dict[str, SearchSource] = {
+    "glossary": SearchSource("glossary", key="term", owner="user_id", unique=("user_id", "term"),
+                             columns=("term", "short_definition", "definition", "use_case", "business_impact"),
+                             weights=(10.0, 4.0, 2.0, 1.0, 1.0), title="term", body="definition", fields=("category", "short_definition")),
+    "notes": SearchSource("notes", key="note_id", owner="user_id", unique=("note_id",),
+                          columns=("title", "content"), weights=(5.0, 1.0), title="title", body="content", fields=("timestamp",)),
+    "question_bank": SearchSource("question_bank", key="id", unique=("id",),
+                                  columns=("concept", "question", "explanation"), weights=(6.0, 3.0, 1.0),
+                                  title="question", body="explanation", fields=("level", "category", "concept")),
+}
+
+SEARCH_SCHEMA = tuple(stmt for source in SEARCH_SOURCES.values() for stmt in source.schema())
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def owner_token(uid: str) -> str:
+    """Jeton propriétaire tel qu'écrit par les triggers ('u' || hex(user_id), minuscules côté FTS5)."""
+    return "u" + str(uid).encode("utf-8").hex()
+
+def match_expression(query: str, columns: Iterable[str], owner: Optional[str] = None, prefix: bool = False) -> Optional[str]:
+    """Requête utilisateur -> expression MATCH sûre : mots entre guillemets (ET implicite), dernier mot en préfixe si `prefix`."""
+    words = _WORD.findall(query or "")
+    # Élisions et lettres isolées (d', l'...) ignorées dès qu'il reste un vrai mot
+    words = [w for w in words if len(w) > 1] or words
+    if not words or (prefix and len(words[-1]) < 2): return None
+    terms = [f'"{w}"' for w in words]
+    if prefix: terms[-1] += "*"
+    expr = f"{{{' '.join(columns)}}} : ({' '.join(terms)})"
+    return f"owner : {owner} AND {expr}" if owner else expr
+
+class SearchHit:
+    """Un résultat : clé de la ligne source, titre et extrait surlignés, score BM25 (plus haut = plus pertinent)."""
+
+    __slots__ = ("source", "key", "title", "snippet", "score", "fields")
+
+    def __init__(self, source: str, key, title: str, snippet: str, score: float, fields: dict):
+        self.source = source
+        self.key = key
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+        self.fields = fields
+
+    def __repr__(self):
+        return f"SearchHit({self.source}, {self.key!r}, score={self.score:.2f})"
+
+class SearchIndex:
+    """Recherche plein texte unifiée (glossaire, notes, banque de questions) sur les tables FTS5.
+
+    bm25() relit toutes les postings des mots cherchés pour calculer leur IDF : au-delà de `rank_max_matches`
+    correspondances, un mot présent presque partout n'apporte plus rien au classement, qui devient « titre
+    d'abord, puis les plus récents » (parcours par rowid, sans IDF). Le mot en cours de saisie n'est cherché
+    en préfixe (doclists fusionnées, plus coûteux) que si les mots exacts ne remplissent pas la page.
+    """
+
+    def __init__(self, session_factory: Callable, sources: Dict[str, SearchSource] = SEARCH_SOURCES,
+                 rank_max_matches: int = 1000, snippet_tokens: int = 16, mark: Tuple[str, str] = ("**", "**")):
+        self.session_factory = session_factory
+        self.sources = sources
+        self.rank_max_matches = rank_max_matches
+        self.snippet_tokens = snippet_tokens
+        self.mark = mark
+
+    def ensure(self, cursor, force: bool = False) -> List[str]:
+        """Réindexe les tables dont l'index diverge (base antérieure aux triggers) ; renvoie les sources reconstruites."""
+        rebuilt = []
+        for name, source in self.sources.items():
+            cursor.execute(f"SELECT (SELECT COUNT(*) FROM {source.fts}) = (SELECT COUNT(*) FROM {source.table})")
+            if force or not cursor.fetchone()[0]:
+                source.rebuild(cursor)
+                rebuilt.append(name)
+        return rebuilt
+
+    def _rank(self, cursor, source: SearchSource, match: str, title_match: str, limit: int,
+              where: str = "", args: tuple = ()) -> List[Tuple[int, float]]:
+        """(rowid, score) des meilleurs résultats d'une expression MATCH (restreints par `where` sur la table source)."""
+        fts = source.fts
+        # Jointure sur la table source seulement si un filtre la demande
+        tables = f"{fts} JOIN {source.table} s ON s.rowid = {fts}.rowid" if where else fts
+        cursor.execute(f"SELECT {fts}.rowid FROM {tables} WHERE {fts} MATCH ?{where} ORDER BY {fts}.rowid DESC LIMIT 1 OFFSET ?",
+                       (match, *args, self.rank_max_matches - 1))
+        if cursor.fetchone() is None:
+            weights = ", ".join(str(w) for w in ((0.0,) if source.owner else ()) + source.weights)
+            cursor.execute(f"SELECT {fts}.rowid, -bm25({fts}, {weights}) AS score FROM {tables} WHERE {fts} MATCH ?{where} ORDER BY score DESC LIMIT ?",
+                           (match, *args, limit))
+            return cursor.fetchall()
+        ranked = {}
+        for expr in (title_match, match):
+            cursor.execute(f"SELECT {fts}.rowid FROM {tables} WHERE {fts} MATCH ?{where} ORDER BY {fts}.rowid DESC LIMIT ?", (expr, *args, limit))
+            for (rowid,) in cursor.fetchall():
+                ranked.setdefault(rowid, 0.0)
+        return list(ranked.items())[:limit]
+
+    def _search_source(self, cursor, name: str, query: str, uid: Optional[str], limit: int,
+                       filters: Optional[Dict[str, object]] = None) -> List[SearchHit]:
+        source = self.sources[name]
+        if source.owner and uid is None: return []
+        owner = owner_token(uid) if source.owner else None
+        # Filtres d'égalité sur les champs exposés de la source, appliqués avant la limite (pas après coup)
+        filters = filters or {}
+        if any(f not in source.fields for f in filters): return []
+        where = "".join(f" AND s.{f} = ?" for f in filters)
+        args = tuple(filters.values())
+        ranked, seen, match = [], set(), None
+        # Mots exacts, puis (saisie en cours, page incomplète) dernier mot en préfixe
+        for prefix in ((False, True) if query == query.rstrip() else (False,)):
+            expr = match_expression(query, source.columns, owner, prefix)
+            if not expr or len(ranked) >= limit: break
+            match = expr
+            for rowid, score in self._rank(cursor, source, expr, match_expression(query, (source.title,), owner, prefix),
+                                           limit - len(ranked), where, args):
+                if rowid not in seen:
+                    seen.add(rowid)
+                    ranked.append((rowid, score))
+        if not ranked: return []
+        # Surlignage calculé pour les seules lignes retenues (l'expression préfixe couvre aussi les mots exacts)
+        cols = source.fts_columns
+        open_, close = self.mark
+        fields = "".join(f", s.{f}" for f in source.fields)
+        guard = f" AND s.{source.owner} = ?" if source.owner else ""
+        cursor.execute(f"""
+            SELECT {source.fts}.rowid, highlight({source.fts}, {cols.index(source.title)}, ?, ?),
+                   snippet({source.fts}, {cols.index(source.body)}, ?, ?, '…', ?), s.{source.key}{fields}
+            FROM {source.fts} JOIN {source.table} s ON s.rowid = {source.fts}.rowid
+            WHERE {source.fts} MATCH ? AND {source.fts}.rowid IN ({','.join('?' * len(ranked))}){guard}
+        """, (open_, close, open_, close, self.snippet_tokens, match, *(r for r, _ in ranked), *((uid,) if source.owner else ())))
+        rows = {r[0]: r[1:] for r in cursor.fetchall()}
+        return [SearchHit(name, rows[rowid][2], rows[rowid][0], rows[rowid][1], score, dict(zip(source.fields, rows[rowid][3:])))
+                for rowid, score in ranked if rowid in rows]
+
+    def search(self, query: str, uid: Optional[str] = None, sources: Optional[Iterable[str]] = None, limit: int = 20,
+               filters: Optional[Dict[str, object]] = None) -> List[SearchHit]:
+        """Meilleurs résultats toutes sources confondues, du plus pertinent au moins pertinent.
+
+        Glossaire et notes ne sont cherchés que pour `uid` ; la banque de questions est commune. `filters`
+        (ex : {"category": ...}) restreint les résultats ; une source qui n'expose pas ces champs est écartée. Les scores
+        BM25 de sources de tailles différentes ne sont pas comparables : la fusion se fait sur le score
+        relatif au meilleur résultat de chaque source (à égalité, l'ordre de `sources` l'emporte).
+        """
+        ranked = []
+        with self.session_factory() as cursor:
+            for name in sources or self.sources:
+                hits = self._search_source(cursor, name, query, uid, limit, filters)
+                best = hits[0].score if hits else 0.0
+                ranked.extend((h.score / best if best > 0 else 1.0, h) for h in hits)
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [h for _, h in ranked[:limit]]
+
+_search_index = None
+_search_lock = threading.Lock()
+
+def get_search_index() -> SearchIndex:
+    global _search_index
+    if _search_index is None:
+        with _search_lock:
+            if _search_index is None:
+                from core.config import SEARCH_POLICY
+                from core.database import DatabaseManager
+                _search_index = SearchIndex(DatabaseManager.session, rank_max_matches=SEARCH_POLICY["rank_max_matches"],
+                                            snippet_tokens=SEARCH_POLICY["snippet_tokens"])
+    return _search_index
+
+def search(query: str, uid: Optional[str] = None, sources: Optional[Iterable[str]] = None, limit: int = 20,
+           filters: Optional[Dict[str, object]] = None) -> List[SearchHit]:
+    return get_search_index().search(query, uid, sources, limit, filters)
@@ -0,0 +1,254 @@
+# core/sync.py
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+OUTBOX_SCHEMA = ('CREATE TABLE IF NOT EXISTS sync_outbox (idem_key TEXT PRIMARY KEY, tbl TEXT, op TEXT, key TEXT, '
+                 'payload TEXT, filters TEXT, attempts INTEGER DEFAULT 0, created_at REAL, next_attempt_at REAL DEFAULT 0, last_error TEXT)')
+# Entrées rejetées `max_attempts` fois (contrainte Cloud, payload invalide...) : mises de côté pour ne plus bloquer leur table
+DEAD_LETTER_SCHEMA = ('CREATE TABLE IF NOT EXISTS sync_dead_letter (idem_key TEXT PRIMARY KEY, tbl TEXT, op TEXT, key TEXT, '
+                      'payload TEXT, filters TEXT, attempts INTEGER, created_at REAL, failed_at REAL, last_error TEXT)')
+
+class SyncOp:
+    """Une opération Cloud en attente. Sans payload, la ligne est relue en local au moment de l'envoi (dernière écriture gagnante)."""
+
+    def __init__(self, table: str, op: str, key: Tuple, payload: Optional[Dict[str, Any]] = None,
+                 filters: Optional[Dict[str, Any]] = None):
+        self.table = table
+        self.op = op  # "upsert" | "delete"
+        self.key = key
+        self.payload = payload
+        self.filters = filters or {}
+
+    @property
+    def idem_key(self) -> str:
+        # Clé d'idempotence : une seule entrée d'outbox par ligne Cloud
+        return json.dumps(list(self.key), ensure_ascii=False)
+
+class SyncService:
+    """Synchro Supabase via une outbox SQLite durable.
+
+    Les écritures de l'outbox sont faites dans la même transaction que la donnée (`record`), y compris
+    quand le client Cloud est momentanément indisponible : le worker attend qu'il revienne pour les envoyer.
+    Une installation sans Cloud (`configured()` faux) ne journalise rien. En cas de crash, `replay` relance
+    l'envoi au démarrage.
+
+    L'outbox est bornée à `max_depth` entrées (une par ligne Cloud, coalescée par `idem_key`) : vérifiée
+    toutes les `check_every` écritures, les plus anciennes au-delà sont abandonnées (compteur `dropped`).
+    Au-delà de `warn_depth`, `stats()` lève un avertissement affiché dans l'admin. Un lot rejeté est renvoyé
+    ligne à ligne ; une ligne rejetée `max_attempts` fois part en lettre morte (table sync_dead_letter).
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], session_factory: Callable, builders: Optional[Dict[str, Callable]] = None,
+                 batch_size: int = 100, flush_interval: float = 0.5, max_backoff: float = 60.0,
+                 max_attempts: int = 8, warn_depth: int = 5000, max_depth: int = 50000, check_every: int = 200,
+                 configured: Callable[[], bool] = lambda: True):
+        self.client_factory = client_factory
+        self.configured = configured
+        self.session_factory = session_factory
+        self.builders = builders or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.warn_depth = warn_depth
+        self.max_depth = max_depth
+        self.check_every = check_every
+        self._since_check = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = False
+        self._busy = False
+        self.metrics = {"recorded": 0, "coalesced": 0, "sent_rows": 0, "batches": 0,
+                        "failures": 0, "retried_rows": 0, "dead_lettered": 0, "dropped": 0, "replays": 0,
+                        "last_error": None, "last_flush": None}
+
+    def _bump(self, key, delta=1):
+        with self._lock:
+            self.metrics[key] += delta
+
+
+    # --- Producteurs (dans la transaction de l'appelant) ---
+    def record(self, cursor, ops):
+        if not ops or not self.configured(): return
+        now, coalesced = time.time(), 0
+        for op in ops:
+            cursor.execute("SELECT 1 FROM sync_outbox WHERE idem_key=?", (op.idem_key,))
+            if cursor.fetchone(): coalesced += 1
+            # REPLACE attribue un nouveau rowid : un envoi déjà en vol ne supprimera pas cette version
+            cursor.execute("INSERT OR REPLACE INTO sync_outbox (idem_key, tbl, op, key, payload, filters, created_at) VALUES (?,?,?,?,?,?,?)",
+                           (op.idem_key, op.table, op.op, json.dumps(list(op.key), ensure_ascii=False),
+                            json.dumps(op.payload, ensure_ascii=False) if op.payload is not None else None,
+                            json.dumps(op.filters, ensure_ascii=False), now))
+        with self._lock:
+            self.metrics["recorded"] += len(ops)
+            self.metrics["coalesced"] += coalesced
+            self._since_check += len(ops)
+            check = self._since_check >= self.check_every
+            if check: self._since_check = 0
+        if check: self._enforce_cap(cursor)
+
+    def _enforce_cap(self, cursor):
+        # Les plus anciennes au-delà du plafond sont abandonnées (Cloud injoignable trop longtemps)
+        cursor.execute("DELETE FROM sync_outbox WHERE rowid IN (SELECT rowid FROM sync_outbox ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                       (self.max_depth,))
+        if cursor.rowcount > 0: self._bump("dropped", cursor.rowcount)
+
+    def wake(self):
+        self._ensure_worker()
+        self._wake.set()
+
+    def replay(self):
+        """Au démarrage : relance l'envoi de tout ce qui est resté dans l'outbox."""
+        self._bump("replays")
+        with self.session_factory() as cursor:
+            cursor.execute("UPDATE sync_outbox SET next_attempt_at=0")
+        self.wake()
+
+    def queue_depth(self) -> int:
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sync_outbox")
+            return cursor.fetchone()[0]
+
+    def dead_letters(self, limit: int = 100) -> list:
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT tbl, op, key, attempts, failed_at, last_error FROM sync_dead_letter ORDER BY failed_at DESC LIMIT ?", (limit,))
+            return cursor.fetchall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self.metrics)
+        data["depth"] = self.queue_depth()
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sync_dead_letter")
+            data["dead"] = cursor.fetchone()[0]
+        data["warning"] = f"Outbox au-delà de {self.warn_depth} entrées" if data["depth"] > self.warn_depth else None
+        return data
+
+    # --- Worker ---
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive(): return
+        with self._lock:
+            if self._thread and self._thread.is_alive(): return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="supabase-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        delay = None
+        while not self._stop:
+            self._wake.wait(timeout=delay if delay is not None else self.max_backoff)
+            self._wake.clear()
+            # Petite fenêtre d'accumulation pour grouper et coalescer les écritures rapprochées
+            time.sleep(self.flush_interval)
+            if not self.client_factory():
+                delay = self.max_backoff
+                continue
+            try:
+                while self.drain_once(): pass
+                # Des entrées en backoff restent à rejouer : on se réveille à leur échéance
+                delay = self._next_due_in()
+            except Exception as e:
+                with self._lock:
+                    self.metrics["failures"] += 1
+                    self.metrics["last_error"] = str(e)
+                delay = self.max_backoff
+
+    def _next_due_in(self):
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT MIN(next_attempt_at) FROM sync_outbox")
+            due = cursor.fetchone()[0]
+        if due is None: return None
+        return max(self.flush_interval, due - time.time())
+
+    def drain_once(self) -> int:
+        """Envoie un lot d'entrées échues. Renvoie le nombre d'entrées envoyées avec succès."""
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT rowid, idem_key, tbl, op, key, payload, filters, attempts FROM sync_outbox WHERE next_attempt_at <= ? ORDER BY rowid LIMIT ?",
+                           (time.time(), self.batch_size))
+            rows = cursor.fetchall()
+        if not rows: return 0
+        sb = self.client_factory()
+        if not sb: return 0  # Pas de Cloud configuré : l'outbox attend
+        self._busy = True
+        try:
+            done, failed = self.flush(sb, rows)
+        finally:
+            self._busy = False
+        with self.session_factory() as cursor:
+            cursor.executemany("DELETE FROM sync_outbox WHERE idem_key=? AND rowid=?", [(r[1], r[0]) for r in done])
+            now = time.time()
+            dead = [(r, err) for r, err in failed if r[7] + 1 >= self.max_attempts]
+            retry = [(r, err) for r, err in failed if r[7] + 1 < self.max_attempts]
+            cursor.executemany("UPDATE sync_outbox SET attempts=attempts+1, next_attempt_at=?, last_error=? WHERE idem_key=? AND rowid=?",
+                               [(now + min(self.max_backoff, 0.5 * 2 ** (r[7] + 1)), err, r[1], r[0]) for r, err in retry])
+            cursor.executemany("""INSERT OR REPLACE INTO sync_dead_letter (idem_key, tbl, op, key, payload, filters, attempts, created_at, failed_at, last_error)
+                                  SELECT idem_key, tbl, op, key, payload, filters, attempts + 1, created_at, ?, ? FROM sync_outbox WHERE idem_key=? AND rowid=?""",
+                               [(now, err, r[1], r[0]) for r, err in dead])
+            cursor.executemany("DELETE FROM sync_outbox WHERE idem_key=? AND rowid=?", [(r[1], r[0]) for r, _ in dead])
+        with self._lock:
+            self.metrics["dead_lettered"] += len(dead)
+            self.metrics["last_flush"] = time.time()
+        return len(done)
+
+    def flush(self, sb, rows):
+        done, failed = [], []
+        upserts: Dict[str, list] = {}
+        for row in rows:
+            _, _, table, op, key, payload, filters, _ = row
+            try:
+                if op == "delete":
+                    q = sb.table(table).delete()
+                    for col, val in json.loads(filters or "{}").items():
+                        q = q.eq(col, val)
+                    q.execute()
+                    self._bump("sent_rows")
+                    done.append(row)
+                    continue
+                if payload is not None:
+                    data = json.loads(payload)
+                else:
+                    builder = self.builders.get(table)
+                    data = builder(*json.loads(key)[1:]) if builder else None
+                if data: upserts.setdefault(table, []).append((row, data))
+                else: done.append(row)  # Ligne disparue en local : rien à envoyer
+            except Exception as e:
+                self._fail(failed, [row], e)
+        for table, items in upserts.items():
+            try:
+                sb.table(table).upsert([data for _, data in items]).execute()
+                with self._lock:
+                    self.metrics["sent_rows"] += len(items)
+                    self.metrics["batches"] += 1
+                done.extend(row for row, _ in items)
+            except Exception:
+                # Lot rejeté : renvoi ligne à ligne, une ligne invalide ne bloque plus les autres
+                self._bump("retried_rows", len(items))
+                for row, data in items:
+                    try:
+                        sb.table(table).upsert(data).execute()
+                        self._bump("sent_rows")
+                        done.append(row)
+                    except Exception as e:
+                        self._fail(failed, [row], e)
+        return done, failed
+
+    def _fail(self, failed, rows, error):
+        with self._lock:
+            self.metrics["failures"] += 1
+            self.metrics["last_error"] = str(error)
+        failed.extend((row, str(error)) for row in rows)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Attend que l'outbox soit vide (tests, arrêt propre)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self._busy and not self.queue_depth(): return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
@@ -1,76 +1,440 @@
 # services/ai_engine.py
 import os
-from typing import Optional, Tuple
+import asyncio
+from abc import ABC, abstractmethod
+import queue
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
 
-class AIService:
-    """Service IA optimisé pour la vitesse et la fiabilité séquentielle."""
-    
-    def _try_groq(self, prompt: str) -> Optional[str]:
-        key = os.getenv("GROQ_API_KEY")
-        if not key: return None
-        try:
-            import groq
-            client = groq.Groq(api_key=key)
-            # Timeout réduit pour éviter de bloquer l'UI trop longtemps
-            res = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": prompt}],
-                timeout=5
-            )
-            return res.choices[0].message.content
-        except Exception as e:
-            return None
+class LatencyStats:
+    """Latences récentes (succès) et taux d'échec d'un provider, fenêtre glissante."""
 
-    def _try_mistral(self, prompt: str) -> Optional[str]:
-        key = os.getenv("MISTRAL_API_KEY")
-        if not key: return None
-        try:
-            from mistralai import Mistral
-            client = Mistral(api_key=key)
-            res = client.chat.complete(
-                model="mistral-large-latest", 
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return res.choices[0].message.content
-        except Exception as e:
-            return None
+    def __init__(self, window: int = 50):
+        self.samples = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
 
-    def _try_gemini(self, prompt: str) -> Optional[str]:
-        key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-        if not key: return None
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            return None
+    def record(self, seconds: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok: self.samples.append(seconds)
+
+    def quantile(self, q: float, default: float) -> float:
+        if len(self.samples) < 5: return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert sur une fenêtre glissante d'appels.
+
+    Ouvert si le taux d'erreur dépasse `error_threshold` (après `min_calls` appels) ou sur un rate-limit :
+    le backend est alors ignoré pendant `cooldown` (doublé à chaque rechute), puis un seul appel test passe.
+    `clock` : horloge monotone (injectable pour les tests).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, window: float = 60.0, min_calls: int = 4, error_threshold: float = 0.5,
+                 cooldown: float = 30.0, max_cooldown: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.events = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self.events and now - self.events[0][0] > self.window:
+            self.events.popleft()
+
+    def error_rate(self) -> float:
+        with self._lock:
+            self._prune(self.clock())
+            return (sum(1 for _, ok in self.events if not ok) / len(self.events)) if self.events else 0.0
+
+    def allow(self) -> bool:
+        """Réserve un appel. En semi-ouvert, un seul appel test à la fois."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.cooldown: return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self.probe_in_flight: return False
+                self.probe_in_flight = True
+            return True
+
+    def release(self):
+        """Appel annulé (requête hedgée perdante) : libère l'éventuel appel test sans le juger."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record(self, ok: bool, rate_limited: bool = False):
+        now = self.clock()
+        with self._lock:
+            self.events.append((now, ok))
+            self._prune(now)
+            if self.state == self.HALF_OPEN:
+                self.probe_in_flight = False
+                if ok:
+                    self.state, self.cooldown = self.CLOSED, self.base_cooldown
+                    self.events.clear()
+                else:
+                    self._open(now, escalate=True)
+                return
+            errors = sum(1 for _, good in self.events if not good)
+            if rate_limited or (len(self.events) >= self.min_calls and errors / len(self.events) >= self.error_threshold):
+                self._open(now, escalate=False)
+
+    def _open(self, now, escalate):
+        if escalate: self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+        self.state, self.opened_at = self.OPEN, now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self.cooldown - (self.clock() - self.opened_at)) if self.state == self.OPEN else 0.0
+            return {"state": self.state, "calls": len(self.events), "retry_in": round(retry_in, 1)}
+
+def is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status == 429 or "429" in str(error) or "rate limit" in str(error).lower()
+
+class Provider(ABC):
+    """Adaptateur asynchrone d'un fournisseur LLM. Le client SDK est créé une fois pour la durée du process."""
+
+    name = "base"
+    env_keys: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self._client = None
+        self.breaker = CircuitBreaker(self.name)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        for k in self.env_keys:
+            if os.getenv(k): return os.getenv(k)
+        return None
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def client(self):
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    @abstractmethod
+    def _build_client(self):
+        """Client SDK du fournisseur (import paresseux : la dépendance n'est requise que si la clé est configurée)."""
+
+    @abstractmethod
+    async def complete(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        """`timeout` : délai propre à l'appel (générations longues), sinon celui du client."""
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Fragments de texte au fil de la génération. Par défaut : la réponse complète en un seul fragment."""
+        content = await self.complete(prompt)
+        if content: yield content
+
+class GroqProvider(Provider):
+    name = "Groq"
+    env_keys = ("GROQ_API_KEY",)
+    model = "llama-3.3-70b-versatile"
+
+    def _build_client(self):
+        import groq
+        return groq.AsyncGroq(api_key=self.api_key, timeout=5, max_retries=0)
+
+    async def complete(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        extra = {"timeout": timeout} if timeout else {}
+        res = await self.client().chat.completions.create(model=self.model, messages=[{"role": "user", "content": prompt}], **extra)
+        return res.choices[0].message.content
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        res = await self.client().chat.completions.create(model=self.model, messages=[{"role": "user", "content": prompt}], stream=True)
+        async for chunk in res:
+            if chunk.choices and chunk.choices[0].delta.content: yield chunk.choices[0].delta.content
+
+class GeminiProvider(Provider):
+    name = "Gemini"
+    env_keys = ("GOOGLE_API_KEY", "GEMINI_API_KEY")
+    # On tente plusieurs variantes de noms de modèles
+    models = ('gemini-1.5-flash', 'gemini-2.0-flash-exp', 'gemini-pro')
 
-        # On tente plusieurs variantes de noms de modèles
-        for model_name in ['gemini-1.5-flash', 'gemini-2.0-flash-exp', 'gemini-pro']:
+    def __init__(self):
+        super().__init__()
+        self.model_breakers = {m: CircuitBreaker(f"{self.name}/{m}") for m in self.models}
+
+    def _build_client(self):
+        import google.generativeai as genai
+        genai.configure(api_key=self.api_key)
+        return {m: genai.GenerativeModel(m) for m in self.models}
+
+    async def complete(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        extra = {"request_options": {"timeout": timeout}} if timeout else {}
+        for model_name in self.models:
+            breaker = self.model_breakers[model_name]
+            # Modèle en échec répété (404, 429...) : ignoré sans payer l'appel
+            if not breaker.allow(): continue
             try:
-                genai.configure(api_key=key)
-                model = genai.GenerativeModel(model_name)
-                res = model.generate_content(prompt)
+                res = await self.client()[model_name].generate_content_async(prompt, **extra)
                 if res and res.text:
+                    breaker.record(True)
                     return res.text
+                breaker.record(False)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except ImportError:
+                breaker.release()
+                return None
             except Exception as e:
-                continue # On tente le modèle suivant en cas d'erreur (404, 429, etc.)
+                breaker.record(False, rate_limited=is_rate_limited(e))
+                continue # On tente le modèle suivant
         return None
 
-    def get_response(self, prompt: str, preferred: str = "groq") -> Tuple[Optional[str], str]:
-        """Tente les providers avec priorité absolue à Groq pour la vitesse."""
-        
-        # 1. Priorité Vitesse : Groq
-        content = self._try_groq(prompt)
-        if content: return content, "Groq"
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        for model_name in self.models:
+            breaker = self.model_breakers[model_name]
+            if not breaker.allow(): continue
+            started = False
+            try:
+                res = await self.client()[model_name].generate_content_async(prompt, stream=True)
+                async for chunk in res:
+                    text = chunk.text if chunk.parts else ""
+                    if not text: continue
+                    if not started:
+                        started = True
+                        breaker.record(True)
+                    yield text
+                if started: return
+                breaker.record(False)
+            except (asyncio.CancelledError, GeneratorExit):
+                if not started: breaker.release()
+                raise
+            except ImportError:
+                breaker.release()
+                return
+            except Exception as e:
+                # Coupure en cours de flux : on ne rejoue pas sur un autre modèle (texte déjà affiché)
+                if started: raise
+                breaker.record(False, rate_limited=is_rate_limited(e))
+
+class MistralProvider(Provider):
+    name = "Mistral"
+    env_keys = ("MISTRAL_API_KEY",)
+    model = "mistral-large-latest"
 
-        # 2. Fallback 1 : Gemini (souvent plus fiable que Mistral en gratuit)
-        content = self._try_gemini(prompt)
-        if content: return content, "Gemini"
+    def _build_client(self):
+        from mistralai import Mistral
+        return Mistral(api_key=self.api_key)
+
+    async def complete(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        extra = {"timeout_ms": int(timeout * 1000)} if timeout else {}
+        res = await self.client().chat.complete_async(model=self.model, messages=[{"role": "user", "content": prompt}], **extra)
+        return res.choices[0].message.content
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        res = await self.client().chat.stream_async(model=self.model, messages=[{"role": "user", "content": prompt}])
+        async for event in res:
+            delta = event.data.choices[0].delta.content if event.data.choices else None
+            if delta: yield delta
+
+class AIService:
+    """Service IA asynchrone : requêtes « hedgées » entre providers.
 
-        # 3. Fallback 2 : Mistral
-        content = self._try_mistral(prompt)
-        if content: return content, "Mistral"
+    Le meilleur provider (selon les latences mesurées) part seul ; s'il n'a pas répondu dans son p95,
+    le suivant est lancé en parallèle. La première réponse gagne, les autres requêtes sont annulées.
+    """
 
+    def __init__(self, providers: Optional[List[Provider]] = None, default_budget: float = 3.0,
+                 min_budget: float = 0.2, total_timeout: float = 60.0, cache=None):
+        self.cache = cache
+        self.providers = providers if providers is not None else [GroqProvider(), GeminiProvider(), MistralProvider()]
+        self.stats = {p.name: LatencyStats() for p in self.providers}
+        self.first_token = {p.name: LatencyStats() for p in self.providers}
+        self.default_budget = default_budget
+        self.min_budget = min_budget
+        self.total_timeout = total_timeout
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="ai-engine-loop", daemon=True).start()
+
+    def hedge_budget(self, provider: Provider) -> float:
+        return max(self.min_budget, self.stats[provider.name].quantile(0.95, self.default_budget))
+
+    def ranked(self, preferred: str = "groq") -> List[Provider]:
+        """Ordre d'essai : latence médiane pénalisée par le taux d'échec ; `preferred` départage à froid."""
+        def score(item):
+            idx, p = item
+            st = self.stats[p.name]
+            expected = st.quantile(0.5, self.default_budget) / max(0.05, 1 - st.error_rate())
+            return (expected, p.name.lower() != preferred.lower(), idx)
+        live = [(i, p) for i, p in enumerate(self.providers) if p.available()]
+        return [p for _, p in sorted(live, key=score)]
+
+    async def _timed(self, provider: Provider, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        t0 = time.perf_counter()
+        rate_limited = False
+        try:
+            content = await (provider.complete(prompt, timeout=timeout) if timeout else provider.complete(prompt))
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception as e:
+            content, rate_limited = None, is_rate_limited(e)
+        self.stats[provider.name].record(time.perf_counter() - t0, bool(content))
+        provider.breaker.record(bool(content), rate_limited=rate_limited)
+        return content
+
+    async def race(self, prompt: str, preferred: str = "groq") -> Tuple[Optional[str], str]:
+        queue = self.ranked(preferred)
+        running = {}
+        try:
+            while queue or running:
+                # Budget du précédent dépassé (ou échec) : on lance le provider suivant en parallèle
+                while queue:
+                    p = queue.pop(0)
+                    # Disjoncteur ouvert : provider ignoré immédiatement, sans attendre son timeout
+                    if not p.breaker.allow(): continue
+                    running[asyncio.ensure_future(self._timed(p, prompt))] = p
+                    budget = self.hedge_budget(p)
+                    break
+                if not running: break
+                # Attente bornée par le budget du dernier lancé, illimitée s'il n'y a plus personne en réserve
+                done, _ = await asyncio.wait(running, timeout=budget if queue else None, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = running.pop(task)
+                    if task.result(): return task.result(), provider.name
+        finally:
+            for task in running:
+                task.cancel()
         return None, "offline"
 
+    def get_response(self, prompt: str, preferred: str = "groq", cache_class: Optional[str] = None) -> Tuple[Optional[str], str]:
+        """Interface synchrone (threads Streamlit) au-dessus de la boucle asyncio du service.
+
+        Avec `cache_class` (ex. "hint", "enrichment"), la réponse est servie depuis le cache tant que son TTL court.
+        """
+        if self.cache and cache_class:
+            cached = self.cache.get(cache_class, prompt)
+            if cached: return cached[0], "cache"
+        future = asyncio.run_coroutine_threadsafe(self.race(prompt, preferred), self._loop)
+        try:
+            content, engine = future.result(timeout=self.total_timeout)
+        except Exception:
+            future.cancel()
+            return None, "offline"
+        if content and self.cache and cache_class:
+            self.cache.put(cache_class, prompt, content, engine)
+        return content, engine
+
+    async def complete_on(self, provider: Provider, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Appel direct à un provider choisi par l'appelant (traitements par lots), mesuré et compté par son disjoncteur.
+
+        L'appelant doit avoir obtenu `provider.breaker.allow()`.
+        """
+        return await self._timed(provider, prompt, timeout)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Exécute une coroutine sur la boucle du service (clients SDK partagés) et attend son résultat."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def stream_budget(self, provider: Provider) -> float:
+        """Délai max avant le premier fragment ; au-delà, le provider suivant prend le relais."""
+        return max(self.default_budget, 2 * self.first_token[provider.name].quantile(0.95, self.default_budget))
+
+    async def _stream(self, prompt: str, preferred: str) -> AsyncIterator[str]:
+        # Pas de hedging en streaming : on bascule tant que rien n'a été émis, jamais après
+        for p in self.ranked(preferred):
+            if not p.breaker.allow(): continue
+            chunks, t0 = p.stream(prompt), time.perf_counter()
+            try:
+                try:
+                    first = await asyncio.wait_for(chunks.__anext__(), timeout=self.stream_budget(p))
+                except asyncio.CancelledError:
+                    p.breaker.release()
+                    raise
+                except Exception as e:
+                    self.first_token[p.name].record(time.perf_counter() - t0, False)
+                    p.breaker.record(False, rate_limited=is_rate_limited(e))
+                    continue
+                self.first_token[p.name].record(time.perf_counter() - t0, True)
+                p.breaker.record(True)
+                yield first
+                try:
+                    async for chunk in chunks:
+                        yield chunk
+                except Exception:
+                    p.breaker.record(False)
+                    yield "\n\n*(réponse interrompue)*"
+                return
+            finally:
+                await chunks.aclose()
+
+    def stream_response(self, prompt: str, preferred: str = "groq") -> Iterator[str]:
+        """Générateur synchrone de fragments (compatible `st.write_stream`). Vide si aucun provider ne répond."""
+        chunks, done = queue.Queue(), object()
+
+        async def pump():
+            try:
+                async for chunk in self._stream(prompt, preferred):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                chunk = chunks.get(timeout=self.total_timeout)
+                if chunk is done: break
+                yield chunk
+        except queue.Empty:
+            pass
+        finally:
+            # Consommateur parti (rerun Streamlit) ou timeout : on coupe la génération
+            future.cancel()
+
+    def forget(self, prompt: str, cache_class: str):
+        """Retire une réponse du cache (contenu inexploitable)."""
+        if self.cache: self.cache.invalidate(cache_class, prompt)
+
+    def health(self) -> List[dict]:
+        """État des providers configurés (disjoncteurs + latences), pour la sidebar et l'admin."""
+        report = []
+        for p in self.providers:
+            if not p.available(): continue
+            entry = {"name": p.name, **p.breaker.snapshot(), "error_rate": round(p.breaker.error_rate(), 2),
+                     "p50": round(self.stats[p.name].quantile(0.5, 0), 3)}
+            if hasattr(p, "model_breakers"):
+                entry["models"] = {m: b.snapshot()["state"] for m, b in p.model_breakers.items()}
+            report.append(entry)
+        return report
+
+    def latency_report(self) -> dict:
+        return {name: {"p50": round(st.quantile(0.5, 0), 3), "p95": round(st.quantile(0.95, 0), 3),
+                       "error_rate": round(st.error_rate(), 3), "samples": len(st.outcomes),
+                       "first_token_p50": round(self.first_token[name].quantile(0.5, 0), 3)}
+                for name, st in self.stats.items()}
+
+_service = None
+_service_lock = threading.Lock()
+
 def get_ai_service():
-    return AIService()
\ No newline at end of file
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                from core.config import AI_CACHE_TTL
+                from core.database import DatabaseManager
+                from core.ai_cache import ResponseCache
+                _service = AIService(cache=ResponseCache(DatabaseManager.session, AI_CACHE_TTL))
+    return _service
@@ -6,6 +6,7 @@ from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
 from google.oauth2 import id_token
 from core.database import run_query, pull_user_data_from_supabase
+from core.leaderboard import get_leaderboard_index
 
 # Config
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -65,6 +66,7 @@ def handle_google_callback():
                     user_id = str(uuid.uuid4())
                     run_query('INSERT INTO users (user_id, name, email, hearts, joker_5050, joker_hint) VALUES (?,?,?,3,3,3)', 
                              (user_id, name, email), commit=True)
+                    get_leaderboard_index().update(user_id, 1, 0, name, "")
                     res = run_query('SELECT * FROM users WHERE user_id=?', (user_id,), fetch_one=True)
 
                 # Set Session
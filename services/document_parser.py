@@ -1,63 +1,216 @@
 # services/document_parser.py
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
 import docx
-import streamlit as st
-from typing import Optional, Dict
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
 
-@st.cache_data(ttl=3600)
-def load_master_class(file_path: str, version: float = 1.0) -> Optional[Dict[str, Dict[str, str]]]:
-    """Charge et parse le document Word avec filtrage strict 3.0 (Handling buffer_text)."""
-    if not os.path.exists(file_path): return None
+def parse_master_class(file_path) -> Dict[str, Dict[str, str]]:
+    """Parse le document Word avec filtrage strict 3.0 (Handling buffer_text). Lève une exception si illisible."""
+    doc = docx.Document(str(file_path))
+    tree = {}
+    cur_sess = "🚀 Introduction"
+    cur_chap = "Sommaire"
+    buffer_text = [] 
     
-    try:
-        doc = docx.Document(file_path)
-        tree = {}
-        cur_sess = "🚀 Introduction"
-        cur_chap = "Sommaire"
-        buffer_text = [] 
+    for p in doc.paragraphs:
+        text = p.text.strip()
+        if not text: continue
         
-        for p in doc.paragraphs:
-            text = p.text.strip()
-            if not text: continue
-            
-            style = p.style.name
-            upper = text.upper()
+        style = p.style.name
+        upper = text.upper()
+        
+        # 1. DÉTECTION SESSION
+        if style == "Heading 1" or "MASTER CLASS - SESSION" in upper:
+            cur_sess = f"🎓 {text.replace('🎓', '').strip()}"
+            cur_chap = "" 
+            if cur_sess not in tree: tree[cur_sess] = {}
+            continue
+
+        # 2. DÉTECTION CHAPITRE (STRICT 3.0)
+        elif upper.startswith("CHAPITRE"):
+            is_pure_chapter = not any(word in upper for word in ["SOMMAIRE", "INTRODUCTION", "EXERCICE", "OBJECTIF", "CORRECTION", "PRÉSENTATION"])
             
-            # 1. DÉTECTION SESSION
-            if style == "Heading 1" or "MASTER CLASS - SESSION" in upper:
-                cur_sess = f"🎓 {text.replace('🎓', '').strip()}"
-                cur_chap = "" 
+            if is_pure_chapter:
+                cur_chap = text.replace(" :", " -").replace(":", " -").strip()
                 if cur_sess not in tree: tree[cur_sess] = {}
-                continue
-
-            # 2. DÉTECTION CHAPITRE (STRICT 3.0)
-            elif upper.startswith("CHAPITRE"):
-                is_pure_chapter = not any(word in upper for word in ["SOMMAIRE", "INTRODUCTION", "EXERCICE", "OBJECTIF", "CORRECTION", "PRÉSENTATION"])
+                tree[cur_sess][cur_chap] = ""
                 
-                if is_pure_chapter:
-                    cur_chap = text.replace(" :", " -").replace(":", " -").strip()
-                    if cur_sess not in tree: tree[cur_sess] = {}
-                    tree[cur_sess][cur_chap] = ""
-                    
-                    if buffer_text:
-                        tree[cur_sess][cur_chap] += "\n\n".join(buffer_text) + "\n\n"
-                        buffer_text = []
-                else:
-                    buffer_text.append(f"#### {text}")
-
-            # 3. CONTENU
+                if buffer_text:
+                    tree[cur_sess][cur_chap] += "\n\n".join(buffer_text) + "\n\n"
+                    buffer_text = []
             else:
-                if cur_sess and cur_chap:
-                    prefix = "#### " if style.startswith("Heading") else ""
-                    tree[cur_sess][cur_chap] += f"{prefix}{text}\n\n"
-                else:
-                    buffer_text.append(text)
-        
-        # Cleanup
-        final_tree = {}
-        for s, chaps in tree.items():
-            valid = {k: v.strip() for k, v in chaps.items() if v.strip()}
-            if valid: final_tree[s] = valid
-        return final_tree
-    except Exception as e:
-        return ""
\ No newline at end of file
+                buffer_text.append(f"#### {text}")
+
+        # 3. CONTENU
+        else:
+            if cur_sess and cur_chap:
+                prefix = "#### " if style.startswith("Heading") else ""
+                tree[cur_sess][cur_chap] += f"{prefix}{text}\n\n"
+            else:
+                buffer_text.append(text)
+    
+    # Cleanup
+    final_tree = {}
+    for s, chaps in tree.items():
+        valid = {k: v.strip() for k, v in chaps.items() if v.strip()}
+        if valid: final_tree[s] = valid
+    return final_tree
+
+MASTERCLASS_FORMAT = 1  # À incrémenter si la structure compilée change
+
+def _masterclass_key(docx_path) -> str:
+    """Clé de build : format + contenu de MASTERCLASS_DATA + empreinte du DOCX (absent = "")."""
+    from core.corpus import file_digest
+    from core.masterclass_content import MASTERCLASS_DATA
+    docx_hash = file_digest(Path(docx_path)) if docx_path and Path(docx_path).exists() else ""
+    payload = json.dumps([MASTERCLASS_FORMAT, MASTERCLASS_DATA, docx_hash], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def compile_master_class(docx_path=None):
+    """Arbre MasterClass unifié : sessions de MASTERCLASS_DATA puis du DOCX. Renvoie (table des matières, chapitres)."""
+    from core.masterclass_content import MASTERCLASS_DATA
+    sources = [(data["title"], "data", data["modules"]) for data in MASTERCLASS_DATA.values()]
+    if docx_path and Path(docx_path).exists():
+        sources += [(title, "docx", chapters) for title, chapters in parse_master_class(docx_path).items()]
+    sessions, chapters = [], {}
+    for i, (title, source, modules) in enumerate(sources):
+        entries = []
+        for j, (chap_title, markdown) in enumerate(modules.items()):
+            chap_id = f"s{i}c{j}"
+            chapters[chap_id] = markdown.strip()
+            entries.append({"id": chap_id, "title": chap_title, "chars": len(chapters[chap_id])})
+        sessions.append({"id": f"s{i}", "title": title, "source": source, "chapters": entries})
+    return {"format": MASTERCLASS_FORMAT, "sessions": sessions}, chapters
+
+def build_master_class(build_dir=None, docx_path=None, force=False, log=print) -> bool:
+    """Compile la MasterClass vers build_dir/<clé>/ (index.json + un fichier par chapitre) si les sources ont changé.
+
+    Le build est écrit à côté puis publié par renommage atomique du pointeur `current`. Renvoie True si un build a été écrit.
+    """
+    from core.config import MASTERCLASS_BUILD_DIR, MASTERCLASS_DOCX
+    build_dir, docx_path = Path(build_dir or MASTERCLASS_BUILD_DIR), docx_path or MASTERCLASS_DOCX
+    key = _masterclass_key(docx_path)
+    target = build_dir / key[:16]
+    if not force and (target / "index.json").exists() and _current_build(build_dir) == target:
+        log("MasterClass compilée à jour.")
+        return False
+    toc, chapters = compile_master_class(docx_path)
+    toc.update(key=key, built_at=time.time())
+    build_dir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=build_dir))
+    (tmp / "chapters").mkdir()
+    for chap_id, markdown in chapters.items():
+        (tmp / "chapters" / f"{chap_id}.json").write_text(json.dumps({"markdown": markdown}, ensure_ascii=False), encoding="utf-8")
+    (tmp / "index.json").write_text(json.dumps(toc, ensure_ascii=False), encoding="utf-8")
+    if target.exists(): shutil.rmtree(target)
+    os.replace(tmp, target)
+    pointer = build_dir / ".current.tmp"
+    pointer.write_text(target.name, encoding="utf-8")
+    os.replace(pointer, build_dir / "current")
+    # Anciens builds : supprimés une fois le pointeur basculé
+    for old in build_dir.iterdir():
+        if old.is_dir() and old != target: shutil.rmtree(old, ignore_errors=True)
+    log(f"📚 MasterClass compilée : {sum(len(s['chapters']) for s in toc['sessions'])} chapitre(s) -> {target}")
+    return True
+
+def _current_build(build_dir) -> Optional[Path]:
+    try:
+        name = (Path(build_dir) / "current").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    path = Path(build_dir) / name
+    return path if (path / "index.json").exists() else None
+
+class MasterClassLibrary:
+    """Lecture paresseuse de la MasterClass compilée : table des matières d'abord, chaque chapitre à la demande.
+
+    Sans build disponible, l'arbre est compilé en mémoire depuis MASTERCLASS_DATA seul (jamais de parsing DOCX en ligne).
+    """
+
+    def __init__(self, build_dir):
+        self.build_dir = Path(build_dir)
+        self._lock = threading.Lock()
+        self._build, self._toc, self._memory = None, None, None
+        self._chapters = {}
+
+    def _refresh(self):
+        build = _current_build(self.build_dir)
+        if build is not None and build == self._build: return
+        with self._lock:
+            self._chapters = {}
+            if build is not None:
+                self._toc = json.loads((build / "index.json").read_text(encoding="utf-8"))
+                self._memory = None
+            else:
+                self._toc, self._memory = compile_master_class(None)
+            self._build = build
+
+    def toc(self) -> dict:
+        self._refresh()
+        return self._toc
+
+    def version(self) -> str:
+        return self.toc().get("key") or "memory"
+
+    def chapter(self, chap_id: str) -> Optional[str]:
+        self._refresh()
+        if self._memory is not None: return self._memory.get(chap_id)
+        if chap_id not in self._chapters:
+            try:
+                data = json.loads((self._build / "chapters" / f"{chap_id}.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return None
+            with self._lock:
+                self._chapters[chap_id] = data["markdown"]
+        return self._chapters[chap_id]
+
+_library = None
+
+def get_masterclass_library() -> MasterClassLibrary:
+    global _library
+    if _library is None:
+        from core.config import MASTERCLASS_BUILD_DIR
+        _library = MasterClassLibrary(MASTERCLASS_BUILD_DIR)
+    return _library
+
+def load_master_class(file_path: str, version: float = 1.0) -> Optional[Dict[str, Dict[str, str]]]:
+    """Arbre {session: {chapitre: texte}} du document Word : lu depuis le build compilé s'il correspond, sinon parsé.
+
+    Renvoie None si le fichier est absent ou illisible.
+    """
+    if not os.path.exists(file_path): return None
+    try:
+        library = get_masterclass_library()
+        toc = library.toc()
+        if toc.get("key") == _masterclass_key(file_path):
+            return {s["title"]: {c["title"]: library.chapter(c["id"]) for c in s["chapters"]}
+                    for s in toc["sessions"] if s["source"] == "docx"}
+        return parse_master_class(file_path)
+    except Exception:
+        return None
+
+def extract_document(path: Path, pdf_max_pages: int = 400) -> List[Tuple[str, str]]:
+    """Texte d'un PDF ou d'un DOCX découpé en sections (titre, texte) : pages pour un PDF, titres pour un DOCX."""
+    path = Path(path)
+    if path.suffix.lower() == ".pdf":
+        import pypdf
+        reader = pypdf.PdfReader(str(path))
+        return [(f"p. {i}", page.extract_text() or "") for i, page in enumerate(reader.pages[:pdf_max_pages], 1)]
+
+    sections, title, lines = [], path.stem, []
+    for p in docx.Document(str(path)).paragraphs:
+        text = p.text.strip()
+        if not text: continue
+        if p.style.name.startswith("Heading") or text.upper().startswith(("CHAPITRE", "MASTER CLASS - SESSION")):
+            if lines: sections.append((title, "\n".join(lines)))
+            title, lines = text, []
+        else:
+            lines.append(text)
+    if lines: sections.append((title, "\n".join(lines)))
+    return sections
@@ -0,0 +1,116 @@
+# services/ingest.py
+import sys
+from pathlib import Path
+
+# Ajouter le chemin racine pour l'import des modules
+root_path = str(Path(__file__).parent.parent)
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import argparse
+import hashlib
+import json
+import time
+from core.config import CORPUS_DIR, CORPUS_POLICY, RETRIEVAL_POLICY
+from core.corpus import CorpusStore, chunk_sections, file_digest
+from core.masterclass_content import MASTERCLASS_DATA
+from core.retrieval import get_retriever
+from core.database import DatabaseManager, init_db
+from services.document_parser import build_master_class, extract_document
+
+def get_corpus_store(base_dir=CORPUS_DIR) -> CorpusStore:
+    return CorpusStore(DatabaseManager.session, base_dir)
+
+def corpus_files(base_dir=CORPUS_DIR, extensions=CORPUS_POLICY["extensions"]):
+    base_dir = Path(base_dir)
+    if not base_dir.exists(): return []
+    return sorted(p for p in base_dir.rglob("*") if p.is_file() and p.suffix.lower() in extensions and not p.name.startswith("."))
+
+def ingest_corpus(base_dir=CORPUS_DIR, force=False, policy=None, log=print):
+    """Extrait une fois pour toutes les documents du corpus de formation vers la base (morceaux de texte).
+
+    Seuls les fichiers nouveaux ou modifiés (mtime/taille puis sha256) sont ré-extraits ; les fichiers
+    disparus sont retirés. Renvoie {"extracted", "unchanged", "touched", "removed", "failed"}.
+    """
+    policy = {**CORPUS_POLICY, **(policy or {})}
+    store = get_corpus_store(base_dir)
+    known = store.known_files()
+    totals = {"extracted": 0, "unchanged": 0, "touched": 0, "removed": 0, "failed": 0}
+    seen = set()
+    for path in corpus_files(base_dir, policy["extensions"]):
+        rel = store.relpath(path)
+        seen.add(rel)
+        stat = path.stat()
+        previous = known.get(rel)
+        if not force and previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+            totals["unchanged"] += 1
+            continue
+        digest = file_digest(path)
+        if not force and previous and previous[2] == digest:
+            store.touch_file(rel, stat.st_mtime, stat.st_size)
+            totals["touched"] += 1
+            continue
+        t0 = time.perf_counter()
+        try:
+            chunks = chunk_sections(extract_document(path, policy["pdf_max_pages"]), policy["chunk_chars"])
+        except Exception as e:
+            # Document illisible (PDF tronqué...) : enregistré sans morceau pour ne pas le reparser à chaque passage
+            log(f"  ❌ {rel} : {e}")
+            store.replace_file(rel, stat.st_mtime, stat.st_size, digest, [])
+            totals["failed"] += 1
+            continue
+        store.replace_file(rel, stat.st_mtime, stat.st_size, digest, chunks)
+        totals["extracted"] += 1
+        log(f"  ✅ {rel} : {len(chunks)} morceau(x) en {time.perf_counter() - t0:.1f}s")
+    gone = [rel for rel in known if rel not in seen]
+    store.remove_files(gone)
+    totals["removed"] = len(gone)
+    return totals
+
+def retrieval_documents(policy=None):
+    """Documents à indexer : morceaux des fichiers du corpus retenus (MasterClass, bible des KPI) + MASTERCLASS_DATA.
+
+    Renvoie (documents, empreinte des sources) ; les morceaux identiques (sessions dupliquées) ne sont gardés qu'une fois.
+    """
+    policy = {**RETRIEVAL_POLICY, **(policy or {})}
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT path, sha256 FROM corpus_files ORDER BY path")
+        files = [(path, digest) for path, digest in cursor.fetchall() if any(s in path.upper() for s in policy["sources"])]
+        cursor.execute(f"SELECT path, section, text FROM corpus_chunks WHERE path IN ({','.join('?' * len(files))}) ORDER BY path, position",
+                       [path for path, _ in files])
+        chunks = cursor.fetchall()
+    docs, seen = [], set()
+    for path, section, text in chunks:
+        if text in seen: continue
+        seen.add(text)
+        docs.append((Path(path).stem.lstrip("🎓📊📘 "), section, text))
+    for session in MASTERCLASS_DATA.values():
+        for module, content in session["modules"].items():
+            docs.extend(("MasterClass", f"{session['title']} — {module}", text)
+                        for _, text in chunk_sections([(module, content)], CORPUS_POLICY["chunk_chars"]))
+    fingerprint = hashlib.sha256(json.dumps([files, MASTERCLASS_DATA, policy["sources"]], sort_keys=True).encode("utf-8")).hexdigest()
+    return docs, fingerprint
+
+def build_retrieval_index(force=False, log=print):
+    """(Re)construit l'index BM25 si ses sources ont changé depuis la dernière construction."""
+    docs, fingerprint = retrieval_documents()
+    index = get_retriever()
+    if not force and index.meta("fingerprint") == fingerprint:
+        log("Index BM25 à jour.")
+        return 0
+    t0 = time.perf_counter()
+    n = index.build(docs, fingerprint)
+    log(f"🔎 Index BM25 : {n} passage(s) indexé(s) en {time.perf_counter() - t0:.1f}s")
+    return n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build du contenu de formation : corpus pré-extrait, index BM25, MasterClass compilée.")
+    parser.add_argument("--dir", default=str(CORPUS_DIR), help="Dossier du corpus")
+    parser.add_argument("--force", action="store_true", help="Ré-extraire tous les fichiers")
+    args = parser.parse_args()
+    init_db()
+    t0 = time.time()
+    totals = ingest_corpus(Path(args.dir), force=args.force)
+    print(f"🎯 Corpus à jour en {time.time() - t0:.1f}s : {totals}")
+    build_retrieval_index(force=args.force)
+    build_master_class(force=args.force)
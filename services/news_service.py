@@ -1,10 +1,7 @@
 # services/news_service.py
-import random
 import streamlit as st
 from duckduckgo_search import DDGS
-from pathlib import Path
 import pypdf
-import docx
 
 @st.cache_data(ttl=3600)
 def get_supply_chain_news():
@@ -34,17 +31,9 @@ def process_uploaded_file(uploaded_file) -> str:
 
 @st.cache_data(ttl=3600)
 def get_local_pedagogical_context():
-    """Scanne les fichiers PDF/Docx locaux pour nourrir l'IA."""
-    base_dir = Path("Formation Supply Chain")
-    if not base_dir.exists(): return ""
-    txt = ""; files = list(base_dir.rglob("*.pdf")) + list(base_dir.rglob("*.docx"))
-    if not files: return ""
-    # On prend un échantillon plus large pour plus de pertinence
-    for f in random.sample(files, min(len(files), 3)):
-        try:
-            if f.suffix == ".pdf": 
-                txt += "\n".join([p.extract_text() for p in pypdf.PdfReader(f).pages[:5]])
-            elif f.suffix == ".docx": 
-                txt += "\n".join([p.text for p in docx.Document(f).paragraphs[:30]])
-        except: pass
-    return txt[:8000]
+    """Extraits des documents de formation locaux pour nourrir l'IA (texte pré-extrait par services/ingest.py)."""
+    from services.ingest import get_corpus_store
+    try:
+        return get_corpus_store().sample_context(n_files=3, max_chars=8000)
+    except Exception:
+        return ""
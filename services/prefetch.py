@@ -0,0 +1,270 @@
+# services/prefetch.py
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from core.database import question_digest
+
+class ReadyBuffer:
+    """Tampons circulaires de questions prêtes, un par utilisateur, partagés par tout le process.
+
+    Tout reste en mémoire (plafond global en octets) ; le disque (table `ai_queue`) ne sert qu'à
+    délester les sessions inactives, rechargées d'un bloc à leur retour.
+    """
+
+    def __init__(self, capacity: int = 6, max_bytes: int = 8 * 1024 * 1024, idle_after: float = 600.0,
+                 session_factory: Optional[Callable] = None):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.idle_after = idle_after
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._rings = {}       # uid -> deque[(scope, question, taille)]
+        self._last_active = {}
+        self._spilled = set()  # uids dont le tampon est sur disque
+        self.bytes = 0
+        self.metrics = {"pushed": 0, "overwritten": 0, "evicted": 0, "spilled": 0, "restored": 0}
+
+    def _drop(self, ring, from_left=True):
+        _, _, size = ring.popleft() if from_left else ring.pop()
+        self.bytes -= size
+
+    def push(self, uid, scope, question):
+        size = len(json.dumps(question, ensure_ascii=False))
+        with self._lock:
+            ring = self._rings.setdefault(uid, deque())
+            if len(ring) >= self.capacity:
+                self._drop(ring)  # Anneau plein : la plus ancienne est écrasée
+                self.metrics["overwritten"] += 1
+            ring.append((scope, question, size))
+            self.bytes += size
+            self.metrics["pushed"] += 1
+            if self.bytes > self.max_bytes: self._enforce_cap()
+
+    def _enforce_cap(self):
+        # Plafond mémoire : on sacrifie d'abord les questions des utilisateurs les moins récemment actifs
+        for victim in sorted(self._rings, key=lambda u: self._last_active.get(u, 0)):
+            victim_ring = self._rings[victim]
+            while victim_ring and self.bytes > self.max_bytes:
+                self._drop(victim_ring, from_left=False)
+                self.metrics["evicted"] += 1
+            if self.bytes <= self.max_bytes: return
+
+    def pop(self, uid, scope):
+        """Première question prête pour `scope` ; renvoie (question ou None, nombre d'entrées périmées écartées)."""
+        with self._lock:
+            self._last_active[uid] = time.monotonic()
+            ring, stale = self._rings.get(uid), 0
+            while ring:
+                item_scope, question, size = ring.popleft()
+                self.bytes -= size
+                if item_scope == scope: return question, stale
+                stale += 1
+            return None, stale
+
+    def count(self, uid, scope) -> int:
+        with self._lock:
+            return sum(1 for s, _, _ in self._rings.get(uid, ()) if s == scope)
+
+    def ids(self, uid) -> set:
+        with self._lock:
+            return {q["id"] for _, q, _ in self._rings.get(uid, ()) if q.get("id")}
+
+    def digests(self, uid) -> set:
+        """Empreintes du texte des questions prêtes (les questions générées par l'IA n'ont pas d'id)."""
+        with self._lock:
+            questions = [q for _, q, _ in self._rings.get(uid, ())]
+        return {question_digest(q.get("question", "")) for q in questions}
+
+    def needs_restore(self, uid) -> bool:
+        return uid in self._spilled
+
+    def restore(self, uid):
+        """Recharge (puis efface du disque) le tampon d'un utilisateur revenu après une inactivité."""
+        with self._lock:
+            if uid not in self._spilled: return
+            self._spilled.discard(uid)
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT question_json FROM ai_queue WHERE user_id=? ORDER BY id", (uid,))
+            rows = cursor.fetchall()
+            cursor.execute("DELETE FROM ai_queue WHERE user_id=?", (uid,))
+        for (raw,) in rows:
+            try:
+                item = json.loads(raw)
+                self.push(uid, tuple(item["scope"]), item["question"])
+                self.metrics["restored"] += 1
+            except (ValueError, KeyError, TypeError):
+                continue  # Format antérieur : sans module associé, la question est abandonnée
+
+    def spill_idle(self):
+        """Écrit sur disque puis libère les tampons des sessions inactives depuis `idle_after` secondes."""
+        if not self.session_factory: return
+        now = time.monotonic()
+        with self._lock:
+            idle = {uid: self._rings.pop(uid) for uid, last in list(self._last_active.items())
+                    if now - last > self.idle_after and uid in self._rings}
+            for uid, ring in idle.items():
+                del self._last_active[uid]
+                self.bytes -= sum(size for _, _, size in ring)
+        rows = [(uid, json.dumps({"scope": list(scope), "question": q}, ensure_ascii=False), scope[1])
+                for uid, ring in idle.items() for scope, q, _ in ring]
+        if rows:
+            with self.session_factory() as cursor:
+                cursor.executemany("INSERT INTO ai_queue (user_id, question_json, category) VALUES (?, ?, ?)", rows)
+        with self._lock:
+            self._spilled.update(uid for uid, ring in idle.items() if ring)
+            self.metrics["spilled"] += len(rows)
+
+    def spilled_users(self):
+        """Au démarrage : utilisateurs ayant un tampon sur disque (laissé par un process précédent)."""
+        if not self.session_factory: return
+        with self.session_factory() as cursor:
+            cursor.execute("SELECT DISTINCT user_id FROM ai_queue")
+            users = [r[0] for r in cursor.fetchall()]
+        with self._lock:
+            self._spilled.update(users)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self.metrics)
+            data.update(users=len(self._rings), ready=sum(len(r) for r in self._rings.values()),
+                        bytes=self.bytes, max_bytes=self.max_bytes, spilled_users=len(self._spilled))
+        return data
+
+class QuestionPrefetcher:
+    """Questions prêtes en mémoire par utilisateur, remplies en tâche de fond par un pool de threads partagé.
+
+    La profondeur visée suit le rythme de réponse mesuré : plus l'utilisateur enchaîne vite
+    (ou plus une question est longue à préparer), plus on en garde d'avance. Une question sans id vient du
+    repli IA (banque épuisée) : un remplissage n'en demande qu'une, et les doublons sont repérés sur le texte.
+    """
+
+    def __init__(self, buffer: Optional[ReadyBuffer] = None, max_workers: int = 4, min_ready: int = 1,
+                 max_ready: int = 6, recent_size: int = 20, sweep_interval: float = 60.0):
+        self.buffer = buffer or ReadyBuffer(capacity=max_ready)
+        self.min_ready = min_ready
+        self.max_ready = max_ready
+        self.recent_size = recent_size
+        self.sweep_interval = sweep_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="question-prefetch")
+        self._lock = threading.Lock()
+        self._recent = {}     # uid -> (id, empreinte) des questions servies récemment (pas encore dans l'historique)
+        self._inflight = set()
+        self._last_served = {}
+        self._interval = {}   # uid -> intervalle moyen entre deux questions (EWMA, secondes)
+        self._last_sweep = time.monotonic()
+        self.fill_latency = 0.5
+        self.metrics = {"hits": 0, "misses": 0, "stale": 0, "filled": 0, "fill_errors": 0, "scheduled": 0, "deduped": 0,
+                        "duplicates": 0}
+
+    def target(self, uid) -> int:
+        interval = self._interval.get(uid)
+        if not interval: return self.min_ready
+        return max(self.min_ready, min(self.max_ready, math.ceil(self.fill_latency / interval) + 1))
+
+    def _record_rate(self, uid, now):
+        last = self._last_served.get(uid)
+        self._last_served[uid] = now
+        if last is None: return
+        # Une longue pause n'est pas un rythme de réponse
+        gap = min(now - last, 300.0)
+        prev = self._interval.get(uid)
+        self._interval[uid] = gap if prev is None else 0.7 * prev + 0.3 * gap
+
+    def next_question(self, uid, lvl, module, loader: Callable[[tuple], Optional[dict]]) -> Optional[dict]:
+        """Sert la prochaine question depuis la mémoire (ou `loader` si rien n'est prêt) et relance le remplissage.
+
+        `loader(exclude_ids)` doit être utilisable hors du thread Streamlit (pas de st.session_state).
+        """
+        scope, now = (lvl, module), time.monotonic()
+        if self.buffer.needs_restore(uid): self.buffer.restore(uid)
+        question, stale = self.buffer.pop(uid, scope)
+        with self._lock:
+            self._record_rate(uid, now)
+            self.metrics["stale"] += stale
+            self.metrics["hits" if question else "misses"] += 1
+        if question is None:
+            question = loader(self._excluded(uid))
+        if question:
+            with self._lock:
+                self._recent.setdefault(uid, deque(maxlen=self.recent_size)).append(
+                    (question.get("id"), question_digest(question.get("question", ""))))
+        self.schedule(uid, scope, loader)
+        if now - self._last_sweep > self.sweep_interval:
+            # Délestage des sessions inactives, hors du chemin de la requête
+            self._last_sweep = now
+            self._executor.submit(self.buffer.spill_idle)
+        return question
+
+    def _excluded(self, uid) -> tuple:
+        with self._lock:
+            ids = {qid for qid, _ in self._recent.get(uid, ()) if qid}
+        return tuple(ids | self.buffer.ids(uid))
+
+    def _seen_digests(self, uid) -> set:
+        with self._lock:
+            digests = {digest for _, digest in self._recent.get(uid, ())}
+        return digests | self.buffer.digests(uid)
+
+    def schedule(self, uid, scope, loader):
+        with self._lock:
+            if uid in self._inflight:
+                self.metrics["deduped"] += 1
+                return
+            self._inflight.add(uid)
+            self.metrics["scheduled"] += 1
+        self._executor.submit(self._fill, uid, scope, loader)
+
+    def _fill(self, uid, scope, loader):
+        skipped = set()  # ids écartés comme doublons pendant ce remplissage
+        try:
+            while self.buffer.count(uid, scope) < self.target(uid):
+                t0 = time.perf_counter()
+                question = loader(tuple(skipped.union(self._excluded(uid))))
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self.fill_latency = 0.8 * self.fill_latency + 0.2 * elapsed
+                if not question: return
+                generated = not question.get("id")
+                if question_digest(question.get("question", "")) in self._seen_digests(uid):
+                    with self._lock:
+                        self.metrics["duplicates"] += 1
+                    if generated or question["id"] in skipped: return
+                    skipped.add(question["id"])  # Même texte sous un autre id : on passe à la suivante
+                    continue
+                self.buffer.push(uid, scope, question)
+                with self._lock:
+                    self.metrics["filled"] += 1
+                if generated: return  # Repli IA : un seul appel par remplissage
+        except Exception:
+            with self._lock:
+                self.metrics["fill_errors"] += 1
+        finally:
+            with self._lock:
+                self._inflight.discard(uid)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self.metrics)
+            data["fill_latency"] = round(self.fill_latency, 3)
+        served = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / served, 3) if served else 0.0
+        data["buffer"] = self.buffer.stats()
+        return data
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                from core.database import DatabaseManager
+                buffer = ReadyBuffer(session_factory=DatabaseManager.session)
+                buffer.spilled_users()
+                _prefetcher = QuestionPrefetcher(buffer)
+    return _prefetcher
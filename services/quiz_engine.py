@@ -3,11 +3,14 @@ import random
 import json
 import hashlib
 import time
-import threading
 import streamlit as st
 from services.ai_engine import get_ai_service
-from core.database import run_query, DatabaseManager
-from core.config import CURRICULUM, MENTOR_REACTIONS, LEVEL_THRESHOLDS
+from services.prefetch import get_prefetcher
+from core.database import run_query, DatabaseManager, question_digest, question_key
+from core.config import MENTOR_REACTIONS
+from core.curriculum import module_info, level_for
+from core.leaderboard import get_leaderboard_index
+from core.retrieval import course_context
 from utils.assets import play_sfx
 from core.badges import check_new_badge
 
@@ -16,46 +19,46 @@ class QuizEngine:
         self.ai = get_ai_service()
 
     def get_current_module_info(self, qc: int):
-        lvl = 1
-        for l, thresh in sorted(LEVEL_THRESHOLDS.items(), reverse=True):
-            if qc >= thresh: lvl = l; break
-        lstart = LEVEL_THRESHOLDS.get(lvl, 0)
-        local_q = qc - lstart + 1
-        
-        cum = 0
-        for m_n, m_c in CURRICULUM.get(lvl, CURRICULUM[1]):
-            if local_q <= cum + m_c: return m_n, local_q - cum, m_c, lvl
-            cum += m_c
-        
-        # Fallback safe
-        safe_curr = CURRICULUM.get(lvl, CURRICULUM[1])
-        return safe_curr[-1][0], 1, 1, lvl
+        return module_info(qc)
 
-    def get_question_from_db(self, lvl):
-        uid = st.session_state.user_id
-        
-        # 1. Identifier le module en cours (Pédagogie)
-        current_module, _, _, _ = self.get_current_module_info(st.session_state.q_count)
-        
-        # 2. Chercher une question de ce module spécifique
-        query_module = """
-            SELECT id, question, options, correct, explanation, theory, example, tip, category, concept 
-            FROM question_bank 
-            WHERE level=? AND category=? AND question NOT IN (SELECT question_hash FROM history WHERE user_id=?)
-            ORDER BY RANDOM() LIMIT 1
+    QUESTION_COLUMNS = "id, question, options, correct, explanation, theory, example, tip, category, concept"
+
+    def pick_unseen_question(self, uid, lvl, category=None, exclude=()):
+        """Tirage indexé : saut à un id aléatoire puis anti-jointure sur l'historique (pas de ORDER BY RANDOM()).
+
+        `exclude` : ids déjà servis ou en attente dans le prefetch, pas encore présents dans l'historique.
         """
-        q_res = run_query(query_module, (lvl, current_module, uid), fetch_one=True)
-        
-        # 3. Si aucune question du module, fallback sur le niveau global (Révision)
+        scope = "level=?" + (" AND category=?" if category else "")
+        scope_params = (lvl, category) if category else (lvl,)
+        if exclude:
+            scope += f" AND id NOT IN ({','.join('?' * len(exclude))})"
+            scope_params += tuple(exclude)
+        unseen = "NOT EXISTS (SELECT 1 FROM history h WHERE h.user_id=? AND h.qhash=q.qhash)"
+
+        with DatabaseManager.session() as cursor:
+            cursor.execute(f"SELECT id FROM question_bank WHERE {scope} ORDER BY id ASC LIMIT 1", scope_params)
+            lo = cursor.fetchone()
+            if not lo: return None
+            cursor.execute(f"SELECT id FROM question_bank WHERE {scope} ORDER BY id DESC LIMIT 1", scope_params)
+            hi = cursor.fetchone()
+            pivot = random.randint(lo[0], hi[0])
+
+            # Premier non-vu à partir du pivot, puis bouclage sur le début de la plage
+            for cond, order in (("q.id >= ?", "ASC"), ("q.id < ?", "DESC")):
+                cursor.execute(f"""
+                    SELECT {self.QUESTION_COLUMNS} FROM question_bank q
+                    WHERE {scope} AND {cond} AND {unseen}
+                    ORDER BY q.id {order} LIMIT 1
+                """, scope_params + (pivot, uid))
+                row = cursor.fetchone()
+                if row: return row
+        return None
+
+    def load_question(self, uid, lvl, module, exclude=()):
+        """Question non vue du module (sinon du niveau, en révision). Sans st.session_state : utilisable par le prefetch."""
+        q_res = self.pick_unseen_question(uid, lvl, module, exclude)
         if not q_res:
-            query_global = """
-                SELECT id, question, options, correct, explanation, theory, example, tip, category, concept 
-                FROM question_bank 
-                WHERE level=? AND question NOT IN (SELECT question_hash FROM history WHERE user_id=?)
-                ORDER BY RANDOM() LIMIT 1
-            """
-            q_res = run_query(query_global, (lvl, uid), fetch_one=True)
-        
+            q_res = self.pick_unseen_question(uid, lvl, exclude=exclude)
         if q_res:
             return {
                 "id": q_res[0], "question": q_res[1], "options": json.loads(q_res[2]),
@@ -64,62 +67,27 @@ class QuizEngine:
             }
         return None
 
-    def manage_queue(self):
-        # 1. Vérifier la file d'attente (Buffer Rapide)
-        uid = st.session_state.user_id
-        buffered = run_query("SELECT id, question_json FROM ai_queue WHERE user_id=? LIMIT 1", (uid,), fetch_one=True)
-        
-        # On lance TOUJOURS le remplissage du buffer pour le futur
-        threading.Thread(target=self.prefetch_next_question, args=(uid,), daemon=True).start()
+    def get_question_from_db(self, lvl):
+        current_module, _, _, _ = self.get_current_module_info(st.session_state.q_count)
+        return self.load_question(st.session_state.user_id, lvl, current_module)
 
-        if buffered:
-            # Consommer le buffer
-            run_query("DELETE FROM ai_queue WHERE id=?", (buffered[0],), commit=True)
-            return json.loads(buffered[1])
+    def manage_queue(self):
+        """Prochaine question, servie depuis le prefetch mémoire ; le remplissage repart en tâche de fond."""
+        uid, lvl = st.session_state.user_id, st.session_state.level
+        module, _, _, _ = self.get_current_module_info(st.session_state.q_count)
 
-        # 2. Si buffer vide : PRIORITÉ VITESSE ABSOLUE
-        q_db = self.get_question_from_db(st.session_state.level)
-        if q_db: return q_db
-        
-        return self.generate_ai_question()
+        # Banque épuisée pour ce niveau : génération IA sur le module en cours
+        def loader(exclude):
+            return self.load_question(uid, lvl, module, exclude) or self.generate_ai_question(module, lvl)
 
-    def prefetch_next_question(self, uid):
-        """Tâche de fond : Prépare la prochaine question (IA ou DB)"""
-        count = run_query("SELECT COUNT(*) FROM ai_queue WHERE user_id=?", (uid,), fetch_one=True)[0]
-        if count >= 2: return
+        return get_prefetcher().next_question(uid, lvl, module, loader)
 
-        # LOGIQUE 80/20 (20% IA, 80% DB)
-        use_ai = random.random() < 0.20
-        q_data = None
-        
-        if not use_ai:
-            try:
-                query = "SELECT id, question, options, correct, explanation FROM question_bank ORDER BY RANDOM() LIMIT 1"
-                res = run_query(query, fetch_one=True)
-                if res:
-                    q_data = {
-                        "id": res[0], "question": res[1], "options": json.loads(res[2]),
-                        "correct": res[3], "explanation": res[4]
-                    }
-            except: pass
-        
-        if not q_data:
-            from services.ai_engine import get_ai_service
-            ai = get_ai_service()
-            prompt = "Génère 1 QCM Supply Chain expert. JSON: {'question':'...', 'options':{'A':'..'}, 'correct':'A', 'explanation':'...'}"
-            try:
-                raw, _ = ai.get_response(prompt)
-                if raw:
-                    raw = raw.replace("```json", "").replace("```", "").strip()
-                    q_data = json.loads(raw)
-            except: pass
-
-        if q_data:
-            run_query("INSERT INTO ai_queue (user_id, question_json) VALUES (?, ?)", (uid, json.dumps(q_data)), commit=True)
-
-    def generate_ai_question(self):
-        mn, _, _, lvl = self.get_current_module_info(st.session_state.q_count)
+    def generate_ai_question(self, mn=None, lvl=None):
+        if mn is None:
+            mn, _, _, lvl = self.get_current_module_info(st.session_state.q_count)
         prompt = f"Génère 1 QCM Supply Chain expert sur '{mn}' niveau {lvl}/4. JSON: {{'question':'...', 'options':{{'A':'..','B':'..','C':'..','D':'..'}}, 'correct':'A', 'explanation':'...', 'category':'{mn}'}}"
+        cours = course_context(mn, k=2, max_chars=1500)
+        if cours: prompt += f"\nAppuie-toi sur ces extraits du cours :\n{cours}"
         
         try:
             raw, _ = self.ai.get_response(prompt)
@@ -148,42 +116,51 @@ class QuizEngine:
 
         if is_correct:
             st.session_state.consecutive_wins = st.session_state.get('consecutive_wins', 0) + 1
-            run_query('INSERT OR IGNORE INTO history (user_id, question_hash) VALUES (?, ?)', (uid, q_data['question']), commit=True)
-            
-            # --- UPDATE CATEGORY STATS ---
-            cat = q_data.get('category', 'Général')
-            run_query('INSERT INTO stats (user_id, category, correct_count) VALUES (?, ?, 1) ON CONFLICT(user_id, category) DO UPDATE SET correct_count=correct_count+1', (uid, cat), commit=True)
-
-            # --- AUTO-POPULATE GLOSSARY ---
-            term = q_data.get('concept') or q_data.get('category') or "Concept SC"
-            definition = q_data.get('theory') or q_data.get('explanation') or ""
-            category = q_data.get('category') or "Général"
-            use_case = q_data.get('example') or ""
-            impact = q_data.get('tip') or ""
-            
-            if term and definition:
-                run_query("""
-                    INSERT OR REPLACE INTO glossary 
-                    (user_id, term, definition, category, use_case, business_impact, short_definition) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (uid, term, definition, category, use_case, impact, term), commit=True)
-
             st.session_state.xp += 20; st.session_state.total_score += 20; st.session_state.q_count += 1
             
-            new_lvl = 1
-            for l, thresh in sorted(LEVEL_THRESHOLDS.items(), reverse=True):
-                if st.session_state.q_count >= thresh: new_lvl = l; break
+            new_lvl = level_for(st.session_state.q_count)
             
             if new_lvl > st.session_state.level:
                 play_sfx("levelup")
 
             st.session_state.level = new_lvl
-            
-            run_query('UPDATE users SET xp=?, total_score=?, q_count=?, level=? WHERE user_id=?', 
-                     (st.session_state.xp, st.session_state.total_score, st.session_state.q_count, st.session_state.level, uid), commit=True)
 
-            # --- CHECK BADGES ---
-            new_badge = check_new_badge(uid)
+            # Une seule transaction pour toutes les écritures de la réponse
+            with DatabaseManager.unit_of_work() as uow:
+                uow.execute('INSERT OR IGNORE INTO history (user_id, question_hash, qhash) VALUES (?, ?, ?)',
+                            (uid, question_key(q_data['question']), question_digest(q_data['question'])))
+                
+                # --- UPDATE CATEGORY STATS ---
+                cat = q_data.get('category', 'Général')
+                uow.execute('INSERT INTO stats (user_id, category, correct_count) VALUES (?, ?, 1) ON CONFLICT(user_id, category) DO UPDATE SET correct_count=correct_count+1', (uid, cat))
+
+                # --- AUTO-POPULATE GLOSSARY ---
+                term = q_data.get('concept') or q_data.get('category') or "Concept SC"
+                definition = q_data.get('theory') or q_data.get('explanation') or ""
+                category = q_data.get('category') or "Général"
+                use_case = q_data.get('example') or ""
+                impact = q_data.get('tip') or ""
+                
+                if term and definition:
+                    uow.execute("""
+                        INSERT OR REPLACE INTO glossary 
+                        (user_id, term, definition, category, use_case, business_impact, short_definition) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (uid, term, definition, category, use_case, impact, term))
+
+                uow.execute('UPDATE users SET xp=?, total_score=?, q_count=?, level=? WHERE user_id=?', 
+                            (st.session_state.xp, st.session_state.total_score, st.session_state.q_count, st.session_state.level, uid))
+
+                # --- CHECK BADGES --- (seules les règles des compteurs touchés par la réponse ; None = relu dans la transaction)
+                event = {"q_count": st.session_state.q_count, "level": st.session_state.level,
+                         "consecutive_wins": st.session_state.consecutive_wins, f"stat:{cat}": None, "hour": None}
+                if term and definition: event["glossary"] = None
+                new_badge = check_new_badge(uid, event, db=uow)
+
+            # Classement matérialisé : l'utilisateur est replacé après le commit
+            get_leaderboard_index().update(uid, st.session_state.level, st.session_state.total_score,
+                                           st.session_state.get('user'), st.session_state.get('user_city'))
+
             if new_badge:
                 st.session_state.pending_badge = new_badge
                 play_sfx("trophy")
@@ -8,42 +8,197 @@ root_path = str(Path(__file__).parent.parent)
 if root_path not in sys.path:
     sys.path.append(root_path)
 
-import streamlit as st
+import argparse
+import asyncio
 import json
 import time
-from services.quiz_engine import QuizEngine
-from core.config import CURRICULUM
-from core.database import run_query
-
-def stock_database():
-    engine = QuizEngine()
-    print("🚀 Démarrage du stockage massif de questions (X3)...")
-    
-    # On boucle sur tous les niveaux et modules
-    for lvl, modules in CURRICULUM.items():
-        for mod_name, _ in modules:
-            print(f"📦 Module: {mod_name} (Niveau {lvl})")
-            
-            # On génère 5 triades (15 questions) par module pour commencer
-            for i in range(5):
-                print(f"  - Génération triade {i+1}/5...")
-                batch, status = engine._generate_single_batch(lvl, mod_name, "Admin", 0, 0)
-                
-                if batch and status != "error":
-                    triad_id = f"STOCK_{int(time.time())}_{i}"
-                    for pos, q in enumerate(batch):
-                        run_query(
-                            'INSERT INTO question_bank (category, concept, level, question, options, correct, explanation, triad_id, triad_position) VALUES (?,?,?,?,?,?,?,?,?)',
-                            (q.get('category', mod_name), q.get('concept_key',''), lvl, q['question'], json.dumps(q['options']), q['correct'], q['explanation'], triad_id, pos+1), 
-                            commit=True
-                        )
-                    print(f"  ✅ Triade insérée.")
-                else:
-                    print(f"  ❌ Erreur génération : {status}")
-                
-                time.sleep(1) # Sécurité API
-
-    print("🎯 Stockage terminé !")
+from core.config import CURRICULUM, STOCKER_POLICY
+from core.database import DatabaseManager, init_db, question_digest, question_key
+from core.retrieval import course_context
+from core.sync import SyncOp
+from services.ai_engine import get_ai_service
+
+TRIAD_PROMPT = """Tu es concepteur pédagogique Supply Chain.
+Génère {count} triades de QCM pour le module "{module}" (niveau {level}/5).
+Une triade = un concept, 3 questions de difficulté croissante : 1. Définition, 2. Compréhension, 3. Application (mise en situation).
+Chaque question a 4 options distinctes A, B, C, D et une seule bonne réponse.
+{grounding}{avoid}Réponds UNIQUEMENT en JSON :
+[{{"concept": "...", "questions": [{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "correct": "A", "explanation": "..."}}, ...]}}]"""
+
+class RateLimiter:
+    """Espacement minimal entre deux requêtes vers un même provider (requêtes / minute)."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / max(1, per_minute)
+        self.next_free = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self.next_free)
+        self.next_free = slot + self.interval
+        if slot > now: await asyncio.sleep(slot - now)
+
+def parse_triads(raw):
+    """Extrait la liste JSON de triades d'une réponse IA (balises ``` et texte parasite tolérés)."""
+    if not raw: return []
+    text = raw.replace("```json", "").replace("```", "").strip()
+    start, end = text.find("["), text.rfind("]")
+    try:
+        data = json.loads(text[start:end + 1] if start != -1 and end > start else text)
+    except ValueError:
+        return []
+    if isinstance(data, dict): data = data.get("triads") or [data]
+    return data if isinstance(data, list) else []
+
+def validate_triad(item):
+    """Normalise une triade ; None si elle est incomplète ou mal formée."""
+    if not isinstance(item, dict): return None
+    concept, questions = str(item.get("concept") or "").strip(), item.get("questions")
+    if not concept or not isinstance(questions, list) or len(questions) != 3: return None
+    clean = []
+    for q in questions:
+        if not isinstance(q, dict) or not isinstance(q.get("options"), dict): return None
+        text = str(q.get("question") or "").strip()
+        options = {str(k).strip().upper(): str(v).strip() for k, v in q["options"].items()}
+        correct = str(q.get("correct") or "").strip().upper()[:1]
+        if not text or sorted(options) != ["A", "B", "C", "D"] or len(set(options.values()) - {""}) != 4: return None
+        if correct not in options: return None
+        clean.append({"question": text, "options": options, "correct": correct, "explanation": str(q.get("explanation") or "").strip()})
+    if len({question_digest(q["question"]) for q in clean}) != 3: return None
+    return concept, clean
+
+def known_concepts(module, limit=40):
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT DISTINCT concept FROM question_bank WHERE category=? AND concept IS NOT NULL AND concept != '' ORDER BY id DESC LIMIT ?", (module, limit))
+        return [r[0] for r in cursor.fetchall()]
+
+def write_triads(run_id, lvl, module, triads):
+    """Insère les triades nouvelles en un lot (questions + outbox Cloud + checkpoint, même transaction).
+
+    Une triade dont une question existe déjà (qhash) est écartée en entier : les triades restent complètes.
+    Le lot passe par unit_of_work : réveil de la synchro et éviction éventuelle après le commit.
+    """
+    rows, ops, seen = [], [], set()
+    with DatabaseManager.unit_of_work() as uow:
+        for concept, questions in triads:
+            digests = [question_digest(q["question"]) for q in questions]
+            if seen.intersection(digests): continue
+            if uow.fetch_one("SELECT 1 FROM question_bank WHERE qhash IN (?,?,?) LIMIT 1", digests): continue
+            seen.update(digests)
+            triad_id = f"{run_id}_{question_key(questions[0]['question'])[:12]}"
+            for pos, (q, digest) in enumerate(zip(questions, digests), 1):
+                options = json.dumps(q["options"])
+                rows.append((module, concept, lvl, q["question"], options, q["correct"], q["explanation"], triad_id, pos, digest, "stock"))
+                ops.append(SyncOp("question_bank", "upsert", ("question_bank", q["question"]), payload={
+                    "category": module, "level": lvl, "question": q["question"],
+                    "options": options, "correct": q["correct"], "explanation": q["explanation"]}))
+        uow.execute_many('INSERT INTO question_bank (category, concept, level, question, options, correct, explanation, triad_id, triad_position, qhash, source) VALUES (?,?,?,?,?,?,?,?,?,?,?)', rows, ops=ops)
+        uow.execute("UPDATE stocker_checkpoint SET triads_done=triads_done+?, updated_at=? WHERE run_id=? AND level=? AND module=?",
+                    (len(rows) // 3, time.time(), run_id, lvl, module), sync=False)
+    return len(rows) // 3
+
+def plan_run(run_id, triads_per_module):
+    """Crée le checkpoint d'un nouveau run (une ligne par module) ; sans effet si le run existe déjà."""
+    now = time.time()
+    with DatabaseManager.session() as cursor:
+        cursor.executemany("INSERT OR IGNORE INTO stocker_checkpoint (run_id, level, module, target, triads_done, updated_at) VALUES (?,?,?,?,0,?)",
+                           [(run_id, lvl, mod_name, triads_per_module, now) for lvl, modules in CURRICULUM.items() for mod_name, _ in modules])
+
+def pending_jobs(run_id, per_call):
+    """Lots restant à produire pour un run, découpés en appels de `per_call` triades."""
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT level, module, target - triads_done FROM stocker_checkpoint WHERE run_id=? AND triads_done < target ORDER BY level, module", (run_id,))
+        remaining = cursor.fetchall()
+    jobs = []
+    for lvl, module, missing in remaining:
+        while missing > 0:
+            jobs.append({"level": lvl, "module": module, "count": min(per_call, missing), "attempts": 0})
+            missing -= per_call
+    return jobs
+
+def last_unfinished_run():
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT run_id FROM stocker_checkpoint GROUP BY run_id HAVING SUM(triads_done < target) > 0 ORDER BY MAX(updated_at) DESC LIMIT 1")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+async def run_pipeline(service, run_id, jobs, policy, log=print):
+    """Workers concurrents : chaque lot part vers le provider libre le plus tôt (rate limit + disjoncteur)."""
+    providers = [p for p in service.providers if p.available()]
+    if not providers:
+        log("❌ Aucun provider IA configuré.")
+        return None
+    limiters = {p.name: RateLimiter(policy["rate_limits"].get(p.name, 30)) for p in providers}
+    queue = asyncio.Queue()
+    for job in jobs: queue.put_nowait(job)
+    totals = {"triads": 0, "calls": 0, "rejected": 0, "abandoned": 0}
+
+    def retry(job, missing):
+        if job["attempts"] + 1 < policy["max_attempts"]:
+            queue.put_nowait({**job, "count": missing, "attempts": job["attempts"] + 1})
+        else:
+            totals["abandoned"] += missing
+            log(f"  ⚠️ {job['module']} (niveau {job['level']}) : {missing} triade(s) abandonnée(s)")
+
+    async def worker():
+        while not queue.empty():
+            job = queue.get_nowait()
+            provider = next((p for p in sorted(providers, key=lambda p: limiters[p.name].next_free) if p.breaker.allow()), None)
+            if not provider:
+                # Tous les disjoncteurs ouverts : on patiente avant de retenter
+                await asyncio.sleep(5)
+                retry(job, job["count"])
+                continue
+            try:
+                await limiters[provider.name].acquire()
+                concepts = await asyncio.to_thread(known_concepts, job["module"])
+                avoid = f"Concepts déjà couverts, à éviter : {', '.join(concepts)}.\n" if concepts else ""
+                cours = await asyncio.to_thread(course_context, job["module"], 3, 2000)
+                grounding = f"Appuie-toi sur ces extraits du cours :\n{cours}\n" if cours else ""
+                prompt = TRIAD_PROMPT.format(count=job["count"], module=job["module"], level=job["level"], avoid=avoid, grounding=grounding)
+                raw = await service.complete_on(provider, prompt, timeout=policy["call_timeout"])
+                totals["calls"] += 1
+                parsed = parse_triads(raw)
+                triads = [t for t in map(validate_triad, parsed) if t][:job["count"]]
+                totals["rejected"] += len(parsed) - len(triads)
+                written = await asyncio.to_thread(write_triads, run_id, job["level"], job["module"], triads) if triads else 0
+            except Exception as e:
+                log(f"  ❌ {job['module']} (niveau {job['level']}) : {e}")
+                written = 0
+            totals["triads"] += written
+            log(f"  ✅ {job['module']} (niveau {job['level']}) : {written}/{job['count']} triade(s) via {provider.name}")
+            if written < job["count"]: retry(job, job["count"] - written)
+
+    await asyncio.gather(*(worker() for _ in range(policy["concurrency"])))
+    return totals
+
+def stock_database(triads_per_module=None, resume=None, policy=None, log=print):
+    """Génère des triades pour tous les modules du curriculum. `resume` : id d'un run à reprendre (ou True pour le dernier)."""
+    policy = {**STOCKER_POLICY, **(policy or {})}
+    init_db()
+    run_id = last_unfinished_run() if resume is True else resume
+    if resume and not run_id:
+        log("Rien à reprendre : aucun run inachevé.")
+        return None
+    if not run_id:
+        run_id = f"STOCK_{int(time.time())}"
+        plan_run(run_id, triads_per_module or policy["triads_per_module"])
+    jobs = pending_jobs(run_id, policy["triads_per_call"])
+    log(f"🚀 Run {run_id} : {sum(j['count'] for j in jobs)} triade(s) à générer en {len(jobs)} lot(s)...")
+    t0 = time.time()
+    service = get_ai_service()
+    totals = service.run(run_pipeline(service, run_id, jobs, policy, log))
+    if totals:
+        log(f"🎯 Stockage terminé en {time.time() - t0:.0f}s : {totals['triads']} triade(s) ({totals['triads'] * 3} questions), "
+            f"{totals['calls']} appel(s) IA, {totals['rejected']} triade(s) invalide(s), {totals['abandoned']} abandonnée(s). "
+            f"Reprise possible : python services/stocker.py --resume {run_id}")
+    return totals
 
 if __name__ == "__main__":
-    stock_database()
+    parser = argparse.ArgumentParser(description="Pré-stockage massif de triades de questions par module du curriculum.")
+    parser.add_argument("--triads", type=int, default=None, help="Triades visées par module (nouveau run)")
+    parser.add_argument("--resume", nargs="?", const=True, default=None, help="Reprendre un run (le dernier inachevé si aucun id)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Appels IA simultanés")
+    args = parser.parse_args()
+    overrides = {"concurrency": args.concurrency} if args.concurrency else {}
+    stock_database(args.triads, resume=args.resume, policy=overrides)
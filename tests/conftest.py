@@ -0,0 +1,105 @@
+# tests/conftest.py
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+root_path = str(Path(__file__).parent.parent)
+if root_path not in sys.path:
+    sys.path.insert(0, root_path)
+
+from streamlit import logger as st_logger
+st_logger.set_log_level("error")  # Mode "bare" : pas d'avertissements ScriptRunContext
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    """Sous-ensemble du client Supabase utilisé par l'app (select/filtres/upsert/delete)."""
+
+    def __init__(self, client, table):
+        self.client, self.table = client, table
+        self.filters, self.action, self.payload = [], "select", None
+        self.order_col, self.bounds = None, None
+
+    def select(self, columns="*"): return self
+    def eq(self, col, val): self.filters.append(lambda r: r.get(col) == val); return self
+    def gt(self, col, val): self.filters.append(lambda r: r.get(col) is not None and r[col] > val); return self
+    def gte(self, col, val): self.filters.append(lambda r: r.get(col) is not None and r[col] >= val); return self
+    def order(self, *cols, **_): self.order_col = cols; return self
+    def range(self, start, end): self.bounds = (start, end); return self
+    def upsert(self, data): self.action, self.payload = "upsert", data; return self
+    def delete(self): self.action = "delete"; return self
+
+    def execute(self):
+        rows = self.client.tables.setdefault(self.table, [])
+        if self.action == "upsert":
+            batch = self.payload if isinstance(self.payload, list) else [self.payload]
+            self.client.calls.append((self.table, len(batch)))
+            if any(self.client.reject(row) for row in batch):
+                raise RuntimeError("violates constraint")
+            rows.extend(batch)
+            return FakeResult(batch)
+        if self.action == "delete":
+            self.client.tables[self.table] = [r for r in rows if not all(f(r) for f in self.filters)]
+            return FakeResult([])
+        data = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.order_col:
+            data.sort(key=lambda r: tuple((r.get(c) is None, r.get(c)) for c in self.order_col))
+        if self.bounds:
+            data = data[self.bounds[0]:self.bounds[1] + 1]
+        return FakeResult(data)
+
+class FakeSupabase:
+    def __init__(self, reject=lambda row: False):
+        self.tables, self.calls, self.reject = {}, [], reject
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+@pytest.fixture
+def fake_supabase():
+    return FakeSupabase()
+
+@pytest.fixture
+def sqlite_session(tmp_path):
+    """Fabrique de sessions sur une base SQLite jetable (même contrat que DatabaseManager.session)."""
+    path = tmp_path / "unit.db"
+
+    @contextmanager
+    def session():
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    return session
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """Pool de l'app basculé sur une base jetable initialisée avec le schéma complet, sans Cloud."""
+    from core import database
+    from core.database import ConnectionPool, DatabaseManager
+    monkeypatch.setattr(DatabaseManager, "get_supabase", staticmethod(lambda: None))
+    previous = DatabaseManager._pool
+    DatabaseManager._pool = ConnectionPool(os.path.join(tmp_path, "app.db"))
+    database.init_db.clear()
+    database.get_user_cache().clear()
+    database.init_db()
+    try:
+        yield DatabaseManager
+    finally:
+        database.stop_leaderboard_refresher()  # Lancé par init_db
+        DatabaseManager._pool.close_all()
+        DatabaseManager._pool = previous
+        database.init_db.clear()
+        database.get_user_cache().clear()
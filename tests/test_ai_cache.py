@@ -0,0 +1,89 @@
+# tests/test_ai_cache.py
+import pytest
+
+from core.ai_cache import AI_CACHE_SCHEMA, ResponseCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def make_cache(sqlite_session, clock):
+    with sqlite_session() as cursor:
+        cursor.execute(AI_CACHE_SCHEMA)
+
+    def make(**kwargs):
+        return ResponseCache(sqlite_session, {"hint": 100.0, "glossary": 1000.0}, clock=clock, **kwargs)
+    return make
+
+def rows(sqlite_session):
+    with sqlite_session() as cursor:
+        cursor.execute("SELECT prompt_class, response FROM ai_cache ORDER BY prompt_class")
+        return cursor.fetchall()
+
+def test_only_declared_classes_are_cached(make_cache, sqlite_session):
+    cache = make_cache()
+    cache.put("coach", "p", "réponse libre", "Groq")
+    assert cache.get("coach", "p") is None
+    assert rows(sqlite_session) == []
+
+def test_ttl_is_per_class(make_cache, clock):
+    cache = make_cache()
+    cache.put("hint", "p", "indice", "Groq")
+    cache.put("glossary", "p", "définition", "Gemini")
+    clock.now += 101
+    assert cache.get("hint", "p") is None
+    assert cache.get("glossary", "p") == ("définition", "Gemini")
+    assert cache.metrics["expired"] == 1
+    clock.now += 1000
+    assert cache.get("glossary", "p") is None
+
+def test_memory_is_lru_bounded(make_cache):
+    cache = make_cache(memory_size=2)
+    cache.put("hint", "a", "A", "Groq")
+    cache.put("hint", "b", "B", "Groq")
+    cache.get("hint", "a")  # a redevient la plus récente
+    cache.put("hint", "c", "C", "Groq")
+    assert cache.metrics["evicted"] == 1
+    hits = cache.metrics["memory_hits"]
+    assert cache.get("hint", "a") == ("A", "Groq") and cache.get("hint", "c") == ("C", "Groq")
+    assert cache.metrics["memory_hits"] == hits + 2
+    assert cache.get("hint", "b") == ("B", "Groq")  # Évincée de la mémoire, relue sur disque
+    assert cache.metrics["disk_hits"] == 1
+
+def test_entries_survive_a_restart(make_cache):
+    make_cache().put("hint", "p", "indice", "Groq")
+    fresh = make_cache()
+    assert fresh.get("hint", "p") == ("indice", "Groq")
+    assert fresh.metrics["disk_hits"] == 1
+
+def test_invalidate_removes_both_layers(make_cache, sqlite_session):
+    cache = make_cache()
+    cache.put("hint", "p", "{json cassé", "Groq")
+    cache.invalidate("hint", "p")
+    assert cache.get("hint", "p") is None
+    assert rows(sqlite_session) == []
+
+def test_prune_drops_expired_then_least_recently_used(make_cache, sqlite_session, clock):
+    cache = make_cache(max_rows=2, prune_every=4)
+    cache.put("hint", "old", "expirée", "Groq")
+    clock.now += 200
+    for prompt in ("a", "b", "c"):
+        clock.now += 1
+        cache.put("glossary", prompt, prompt.upper(), "Groq")
+    assert rows(sqlite_session) == [("glossary", "B"), ("glossary", "C")]
+
+def test_unavailable_database_falls_back_to_a_miss(clock):
+    def broken():
+        raise RuntimeError("base verrouillée")
+    cache = ResponseCache(broken, {"hint": 100.0}, clock=clock)
+    cache.put("hint", "p", "indice", "Groq")  # Mémoire seulement
+    assert cache.get("hint", "p") == ("indice", "Groq")
+    assert cache.get("hint", "autre") is None
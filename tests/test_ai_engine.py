@@ -0,0 +1,186 @@
+# tests/test_ai_engine.py
+import asyncio
+
+import pytest
+
+from services.ai_engine import AIService, CircuitBreaker, GeminiProvider, Provider
+
+class FakeProvider(Provider):
+    """Provider scripté : répond `content` après `delay` secondes (None = échec), note les annulations."""
+
+    def __init__(self, name, delay=0.0, content="ok", available=True):
+        self.name = name
+        super().__init__()
+        self.delay, self.content, self._available = delay, content, available
+        self.calls, self.cancelled = 0, 0
+
+    def available(self):
+        return self._available
+
+    def _build_client(self):
+        return None
+
+    async def complete(self, prompt, timeout=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(self.content, Exception): raise self.content
+        return self.content
+
+def service(*providers, budget=0.05):
+    return AIService(providers=list(providers), default_budget=budget, min_budget=0.01, total_timeout=5.0)
+
+def test_provider_must_implement_the_adapter():
+    class Incomplete(Provider):
+        name = "incomplet"
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_fast_primary_is_not_hedged():
+    groq, gemini = FakeProvider("Groq", 0.0, "groq"), FakeProvider("Gemini", 0.0, "gemini")
+    assert service(groq, gemini).get_response("p") == ("groq", "Groq")
+    assert gemini.calls == 0
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    groq, gemini = FakeProvider("Groq", 2.0, "groq"), FakeProvider("Gemini", 0.0, "gemini")
+    svc = service(groq, gemini)
+    assert svc.get_response("p") == ("gemini", "Gemini")
+    svc.run(asyncio.sleep(0.05))  # Laisse la boucle traiter l'annulation
+    assert groq.calls == 1 and groq.cancelled == 1
+
+def test_failed_provider_falls_through_to_the_next():
+    groq, gemini = FakeProvider("Groq", 0.0, None), FakeProvider("Gemini", 0.0, "gemini")
+    assert service(groq, gemini, budget=1.0).get_response("p") == ("gemini", "Gemini")
+
+def test_all_providers_failing_is_offline():
+    assert service(FakeProvider("Groq", 0.0, RuntimeError("boom"))).get_response("p") == (None, "offline")
+
+def test_ranking_follows_measured_latency():
+    groq, gemini, mistral = FakeProvider("Groq"), FakeProvider("Gemini"), FakeProvider("Mistral", available=False)
+    svc = service(groq, gemini, mistral)
+    assert [p.name for p in svc.ranked()] == ["Groq", "Gemini"]  # À froid : `preferred`
+    for _ in range(10):
+        svc.stats["Groq"].record(0.3, True)
+        svc.stats["Gemini"].record(0.1, True)
+    assert [p.name for p in svc.ranked()] == ["Gemini", "Groq"]
+    for _ in range(40):
+        svc.stats["Gemini"].record(0.1, False)  # Rapide mais en échec : pénalisé
+    assert [p.name for p in svc.ranked()] == ["Groq", "Gemini"]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def breaker(clock, **kwargs):
+    return CircuitBreaker("test", window=60.0, min_calls=4, error_threshold=0.5, cooldown=30.0, max_cooldown=100.0, clock=clock, **kwargs)
+
+def test_breaker_opens_on_error_rate_then_probes_and_closes():
+    clock = Clock()
+    b = breaker(clock)
+    for ok in (True, False, True):
+        assert b.allow()
+        b.record(ok)
+    assert b.state == CircuitBreaker.CLOSED  # Moins de min_calls appels
+    b.record(False)
+    assert b.state == CircuitBreaker.OPEN and not b.allow()
+    clock.now += 29.0
+    assert not b.allow()
+    clock.now += 1.0
+    assert b.allow() and b.state == CircuitBreaker.HALF_OPEN
+    assert not b.allow()  # Un seul appel test à la fois
+    b.record(True)
+    assert b.state == CircuitBreaker.CLOSED and b.allow()
+
+def test_failed_probe_reopens_with_a_longer_cooldown():
+    clock = Clock()
+    b = breaker(clock)
+    b.record(False, rate_limited=True)  # Rate-limit : ouverture immédiate
+    assert b.state == CircuitBreaker.OPEN
+    for expected in (60.0, 100.0):  # Doublé à chaque rechute, plafonné
+        clock.now += b.cooldown
+        assert b.allow()
+        b.record(False)
+        assert b.state == CircuitBreaker.OPEN and b.cooldown == expected
+    clock.now += 100.0
+    assert b.allow()
+    b.record(True)
+    assert b.cooldown == 30.0
+
+def test_released_probe_is_not_judged():
+    clock = Clock()
+    b = breaker(clock)
+    b.record(False, rate_limited=True)
+    clock.now += 30.0
+    assert b.allow()
+    b.release()  # Requête hedgée perdante
+    assert b.state == CircuitBreaker.HALF_OPEN and b.allow()
+
+def test_old_errors_leave_the_window():
+    clock = Clock()
+    b = breaker(clock)
+    for _ in range(3): b.record(False)
+    clock.now += 61.0
+    b.record(False)
+    assert b.state == CircuitBreaker.CLOSED and b.error_rate() == 1.0
+
+class FakeModel:
+    def __init__(self, text=None):
+        self.text, self.calls = text, 0
+
+    async def generate_content_async(self, prompt, **_):
+        self.calls += 1
+        if self.text is None: raise RuntimeError("404 model not found")
+        return self
+
+def test_gemini_skips_a_broken_model_once_its_breaker_opens():
+    gemini = GeminiProvider()
+    broken, working = FakeModel(), FakeModel("réponse")
+    gemini._client = {gemini.models[0]: broken, gemini.models[1]: working, gemini.models[2]: FakeModel("autre")}
+    svc = service(gemini)
+    for _ in range(6):
+        assert svc.run(gemini.complete("p")) == "réponse"
+    assert broken.calls == 4  # min_calls échecs, puis modèle ignoré
+    assert working.calls == 6
+    assert gemini.model_breakers[gemini.models[0]].state == CircuitBreaker.OPEN
+    assert gemini.model_breakers[gemini.models[1]].state == CircuitBreaker.CLOSED
+
+class FakeStreamingProvider(FakeProvider):
+    """Émet `chunks` après `delay` ; `fail_at` : index du fragment avant lequel le flux lève une erreur."""
+
+    def __init__(self, name, chunks, delay=0.0, fail_at=None):
+        super().__init__(name, delay, "".join(chunks))
+        self.chunks, self.fail_at = chunks, fail_at
+
+    async def stream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_at: raise RuntimeError("connexion coupée")
+            yield chunk
+
+def test_stream_falls_back_when_a_provider_fails_before_the_first_token():
+    groq = FakeStreamingProvider("Groq", ["a", "b"], fail_at=0)
+    gemini = FakeStreamingProvider("Gemini", ["Bon", "jour"])
+    assert list(service(groq, gemini).stream_response("p")) == ["Bon", "jour"]
+    assert groq.calls == 1 and groq.breaker.events[-1][1] is False
+
+def test_stream_falls_back_when_the_first_token_is_late():
+    groq = FakeStreamingProvider("Groq", ["lent"], delay=2.0)
+    gemini = FakeStreamingProvider("Gemini", ["vite"])
+    assert list(service(groq, gemini, budget=0.05).stream_response("p")) == ["vite"]
+
+def test_stream_never_switches_provider_after_the_first_token():
+    groq = FakeStreamingProvider("Groq", ["Bon", "jour"], fail_at=1)
+    gemini = FakeStreamingProvider("Gemini", ["autre"])
+    chunks = list(service(groq, gemini).stream_response("p"))
+    assert chunks[0] == "Bon" and "interrompue" in chunks[-1]
+    assert gemini.calls == 0
+
+def test_stream_is_empty_when_every_provider_fails():
+    assert list(service(FakeStreamingProvider("Groq", ["x"], fail_at=0)).stream_response("p")) == []
@@ -0,0 +1,43 @@
+# tests/test_badges.py
+import pytest
+import streamlit as st
+
+from core.badges import calculate_badges, check_new_badge, evaluate_badges
+from core.database import DatabaseManager
+
+@pytest.fixture
+def player(app_db):
+    with DatabaseManager.session() as cursor:
+        cursor.execute("INSERT INTO users (user_id, name) VALUES ('u1', 'Ada')")
+        cursor.execute("INSERT INTO stats (user_id, category, correct_count) VALUES ('u1', 'Achats', 10)")
+    st.session_state.update({"q_count": 0, "level": 1, "consecutive_wins": 0})
+    return "u1"
+
+def _set_stat(uid, category, count):
+    with DatabaseManager.session() as cursor:
+        cursor.execute("INSERT OR REPLACE INTO stats (user_id, category, correct_count) VALUES (?, ?, ?)", (uid, category, count))
+
+def test_first_evaluation_checks_every_rule(player):
+    assert "Le Négociateur" in {r.title for r in evaluate_badges(player, {"q_count": 1})}
+
+def test_event_only_checks_rules_of_touched_counters(player):
+    evaluate_badges(player)
+    _set_stat(player, "Stocks", 20)
+    assert evaluate_badges(player, {"q_count": 1}) == []
+    assert [r.title for r in evaluate_badges(player, {"stat:Stocks": None})] == ["Gardien du Stock"]
+
+def test_earned_badge_is_not_awarded_twice(player):
+    evaluate_badges(player)
+    assert evaluate_badges(player, {"stat:Achats": None}) == []
+
+def test_check_new_badge_returns_first_unlock_or_none(player):
+    evaluate_badges(player)
+    assert check_new_badge(player, {"q_count": 2}) is None
+    assert check_new_badge(player, {"q_count": 5}) == {"title": "Opérateur SC", "emoji": "🔰", "desc": "A répondu à 5 questions."}
+
+def test_calculate_badges_sees_new_unlocks(player):
+    titles, meta = calculate_badges(player)
+    assert "Le Négociateur" in titles and "Opérateur SC" not in titles
+    check_new_badge(player, {"q_count": 5})
+    titles, meta = calculate_badges(player)
+    assert "Opérateur SC" in titles and meta["Opérateur SC"]["emoji"] == "🔰"
@@ -0,0 +1,56 @@
+# tests/test_corpus.py
+import os
+
+import docx
+import pytest
+
+from core.corpus import chunk_sections
+from services.ingest import get_corpus_store, ingest_corpus
+
+def _write_docx(path, paragraphs):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    document.save(str(path))
+
+@pytest.fixture
+def corpus(app_db, tmp_path):
+    base = tmp_path / "corpus"
+    base.mkdir()
+    _write_docx(base / "stocks.docx", ["Le stock de sécurité couvre les aléas.", "Point de commande et EOQ."])
+    _write_docx(base / "transport.docx", ["Incoterms et fret maritime."])
+    return base
+
+def test_chunks_follow_paragraphs_and_split_giant_ones():
+    chunks = chunk_sections([("S", "a" * 30 + "\n" + "b" * 30), ("G", " ".join(["mot"] * 40))], chunk_chars=40)
+    assert chunks[:2] == [("S", "a" * 30), ("S", "b" * 30)]
+    assert all(title == "G" and len(text) <= 40 for title, text in chunks[2:])
+    assert " ".join(text for _, text in chunks[2:]) == " ".join(["mot"] * 40)
+
+def test_first_run_extracts_then_skips_unchanged_files(corpus):
+    assert ingest_corpus(corpus, log=lambda _: None)["extracted"] == 2
+    assert ingest_corpus(corpus, log=lambda _: None) == {"extracted": 0, "unchanged": 2, "touched": 0, "removed": 0, "failed": 0}
+    store = get_corpus_store(corpus)
+    assert "stock de sécurité" in store.file_chunks("stocks.docx")[0][1]
+    assert store.stats()["files"] == 2
+
+def test_same_content_with_new_mtime_is_only_touched(corpus):
+    ingest_corpus(corpus, log=lambda _: None)
+    path = corpus / "stocks.docx"
+    os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 60))
+    assert ingest_corpus(corpus, log=lambda _: None)["touched"] == 1
+
+def test_modified_and_removed_files(corpus):
+    ingest_corpus(corpus, log=lambda _: None)
+    _write_docx(corpus / "stocks.docx", ["Méthode ABC des stocks."])
+    (corpus / "transport.docx").unlink()
+    totals = ingest_corpus(corpus, log=lambda _: None)
+    assert (totals["extracted"], totals["removed"]) == (1, 1)
+    store = get_corpus_store(corpus)
+    assert store.file_chunks("transport.docx") == []
+    assert "ABC" in store.sample_context()
+
+def test_unreadable_file_is_recorded_without_chunks(corpus):
+    (corpus / "casse.pdf").write_bytes(b"pas un pdf")
+    assert ingest_corpus(corpus, log=lambda _: None)["failed"] == 1
+    assert ingest_corpus(corpus, log=lambda _: None)["unchanged"] == 3
@@ -0,0 +1,78 @@
+# tests/test_eviction.py
+import pytest
+
+from core import eviction
+from core.database import DatabaseManager, question_digest
+from core.eviction import bank_size, evict_questions, maybe_evict
+
+@pytest.fixture
+def policy(app_db):
+    """Seuils posés juste au-dessus des questions seed (protégées) chargées par init_db."""
+    seeded = bank_size()
+    return {"high_watermark": seeded + 5, "low_watermark": seeded + 3, "batch_size": 2, "min_votes": 3, "evict_min_interval": 0}
+
+@pytest.fixture
+def launched(policy, monkeypatch):
+    """Les évictions déclenchées par maybe_evict sont seulement enregistrées (pas de thread réel sur la base)."""
+    calls = []
+    monkeypatch.setattr(eviction, "_trigger", {"at": float("-inf"), "stuck_at": None})
+    monkeypatch.setattr(eviction, "evict_questions", lambda policy=None: calls.append(policy))
+    return calls
+
+def add_questions(count, source="stock", start=0):
+    with DatabaseManager.session() as cursor:
+        cursor.executemany("INSERT INTO question_bank (category, question, qhash, source) VALUES ('s1', ?, ?, ?)",
+                           [(f"Q{i}", question_digest(f"Q{i}"), source) for i in range(start, start + count)])
+
+def test_nothing_to_do_under_high_watermark(policy, launched):
+    add_questions(5)
+    assert not maybe_evict(policy)
+
+def test_evicts_down_to_low_watermark(policy, launched):
+    add_questions(8)
+    assert evict_questions(policy) == 5
+    assert bank_size() == policy["low_watermark"]
+    assert eviction._trigger["stuck_at"] is None
+
+def test_protected_bank_is_not_rescanned_on_each_insert(policy, launched):
+    add_questions(8, source="seed")
+    assert evict_questions(policy) == 0  # Tout est protégé
+    assert eviction._trigger["stuck_at"] == policy["high_watermark"] + 3
+    add_questions(1, start=8)
+    assert not maybe_evict(policy)
+    add_questions(1, start=9)  # Un lot de plus depuis la passe vaine : nouvel essai
+    assert maybe_evict(policy)
+
+def test_triggers_are_rate_limited(policy, launched):
+    add_questions(8)
+    policy["evict_min_interval"] = 60
+    assert maybe_evict(policy)
+    assert not maybe_evict(policy)
+
+def test_stocker_batch_triggers_eviction(app_db, monkeypatch):
+    from services import stocker
+    calls = []
+    monkeypatch.setattr(eviction, "maybe_evict", lambda: calls.append(1))  # Hook après commit de unit_of_work
+    monkeypatch.setenv("SUPABASE_URL", "https://cloud.test")  # Cloud configuré (client indisponible) : outbox tenue
+    monkeypatch.setenv("SUPABASE_KEY", "test")
+    questions = [{"question": f"Question {i} ?", "options": {"A": "a", "B": "b", "C": "c", "D": "d"}, "correct": "A", "explanation": ""}
+                 for i in range(3)]
+    assert stocker.write_triads("run", 1, "s1", [("Concept", questions)]) == 1
+    assert calls == [1]
+    with DatabaseManager.session() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM sync_outbox WHERE tbl='question_bank'")
+        assert cursor.fetchone()[0] == 3
+
+def test_maintenance_failure_is_recorded(policy, monkeypatch):
+    monkeypatch.setattr(eviction, "_maintenance", {"runs": 0, "removed": 0, "failures": 0, "last_error": None, "last_run": None})
+    monkeypatch.setattr(eviction, "evict_questions", lambda policy=None: 1 / 0)
+    assert eviction.run_maintenance(policy) == 0
+    stats = eviction.eviction_stats()
+    assert stats["failures"] == 1 and "division" in stats["last_error"]
+
+def test_maintenance_pass_is_counted(policy, monkeypatch):
+    monkeypatch.setattr(eviction, "_maintenance", {"runs": 0, "removed": 0, "failures": 0, "last_error": None, "last_run": None})
+    add_questions(8)
+    assert eviction.run_maintenance(policy) == 5
+    stats = eviction.eviction_stats()
+    assert (stats["runs"], stats["removed"], stats["bank_size"]) == (1, 5, policy["low_watermark"])
@@ -0,0 +1,115 @@
+# tests/test_leaderboard.py
+import threading
+import time
+
+import pytest
+
+from core import database
+from core.leaderboard import Leaderboard
+
+@pytest.fixture
+def refresher(monkeypatch):
+    """Rafraîchissements enregistrés au lieu d'interroger le Cloud ; thread arrêté en fin de test."""
+    calls = []
+    monkeypatch.setattr(database, "_leaderboard_refresh", {"lock": threading.Lock(), "last": time.monotonic(), "thread": None,
+                                                           "stop": threading.Event()})
+    monkeypatch.setattr(database, "sync_leaderboard_from_supabase", lambda **kwargs: calls.append(kwargs))
+    yield calls
+    database.stop_leaderboard_refresher()
+
+def refresher_threads():
+    return [t for t in threading.enumerate() if t.name == "leaderboard-refresh"]
+
+def test_concurrent_starts_create_one_thread(refresher):
+    barrier = threading.Barrier(8)
+
+    def start():
+        barrier.wait()
+        database.start_leaderboard_refresher({"refresh_interval": 3600})
+
+    before = len(refresher_threads())
+    workers = [threading.Thread(target=start) for _ in range(8)]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    assert len(refresher_threads()) == before + 1
+
+def test_stop_joins_the_thread(refresher):
+    database.start_leaderboard_refresher({"refresh_interval": 3600})
+    thread = database._leaderboard_refresh["thread"]
+    database.stop_leaderboard_refresher()
+    assert not thread.is_alive()
+
+def test_loop_uses_the_interval_checked_path(refresher):
+    database.start_leaderboard_refresher({"refresh_interval": 3600})
+    for _ in range(100):
+        if refresher: break
+        time.sleep(0.01)
+    assert refresher and "force" not in refresher[0]
+
+def board(lookup=None):
+    b = Leaderboard(lambda: [("u1", "Ada", 2, 50, "Lyon", None)], lookup)
+    b.reload()
+    return b
+
+def test_update_keeps_the_known_name():
+    b = board()
+    b.update("u1", 3, 80)
+    assert b.top(1)[0][2:5] == ("Ada", 3, 80)
+
+def test_new_entry_without_name_is_looked_up():
+    b = board(lambda uid: ("Grace", "Paris", None))
+    b.update("u2", 5, 10)
+    assert b.top(1)[0][1:6] == ("u2", "Grace", 5, 10, "Paris")
+
+def test_lookup_runs_outside_the_lock():
+    b = None
+
+    def lookup(uid):
+        reader = threading.Thread(target=lambda: b.top(1))
+        reader.start()
+        reader.join(timeout=1)
+        assert not reader.is_alive()  # Un lecteur n'attend pas la requête
+        return ("Grace", "", None)
+    b = board(lookup)
+    b.update("u2", 5, 10)
+    assert b.top(1)[0][2] == "Grace"
+
+def test_new_entry_keeps_the_given_name():
+    b = board(lambda uid: pytest.fail("lookup inutile"))
+    b.update("u2", 5, 10, "Linus", "")
+    assert b.top(1)[0][2] == "Linus"
+
+@pytest.fixture
+def cloud_board(app_db, fake_supabase, monkeypatch):
+    monkeypatch.setattr(database.DatabaseManager, "get_supabase", staticmethod(lambda: fake_supabase))
+    monkeypatch.setattr(database, "_leaderboard_refresh", {"lock": threading.Lock(), "last": 0.0, "thread": None, "stop": threading.Event(),
+                                                           "stats": {"refreshes": 0, "changed_rows": 0, "failures": 0, "last_error": None}})
+    for uid, score in (("u1", 10), ("u2", 20)):
+        database.run_query("INSERT INTO users (user_id, name, level, total_score, city, xp) VALUES (?, ?, 1, ?, '', 5)", (uid, uid, score), commit=False)
+        fake_supabase.tables.setdefault("users", []).append({"user_id": uid, "name": uid, "level": 1, "total_score": score, "city": ""})
+    return fake_supabase
+
+def test_refresh_keeps_the_cache_of_unchanged_users(cloud_board):
+    cache = database.get_user_cache()
+    cache.user("u1"), cache.user("u2")
+    assert not database.sync_leaderboard_from_supabase(force=True)
+    misses = cache.metrics["misses"]
+    cache.user("u1"), cache.user("u2")
+    assert cache.metrics["misses"] == misses
+
+def test_refresh_invalidates_only_changed_users(cloud_board):
+    cache = database.get_user_cache()
+    cache.user("u1"), cache.user("u2")
+    cloud_board.tables["users"][0]["total_score"] = 99
+    database.sync_leaderboard_from_supabase(force=True)
+    assert cache.user("u1")[4] == 99  # total_score relu en base
+    misses = cache.metrics["misses"]
+    cache.user("u2")
+    assert cache.metrics["misses"] == misses
+    assert database.leaderboard_refresh_stats()["changed_rows"] == 1
+
+def test_refresh_failure_is_recorded(cloud_board, monkeypatch):
+    monkeypatch.setattr(cloud_board, "table", lambda name: 1 / 0)
+    assert not database.sync_leaderboard_from_supabase(force=True)
+    stats = database.leaderboard_refresh_stats()
+    assert stats["failures"] == 1 and "division" in stats["last_error"]
@@ -0,0 +1,44 @@
+# tests/test_masterclass.py
+import docx
+
+from services.document_parser import MasterClassLibrary, build_master_class, compile_master_class
+
+def _build(build_dir, docx_path, **kwargs):
+    return build_master_class(build_dir, docx_path=docx_path, log=lambda _: None, **kwargs)
+
+def test_build_is_skipped_when_sources_are_unchanged(tmp_path):
+    assert _build(tmp_path / "build", tmp_path / "absent.docx")
+    assert not _build(tmp_path / "build", tmp_path / "absent.docx")
+    assert len([p for p in (tmp_path / "build").iterdir() if p.is_dir()]) == 1
+
+def test_library_reads_chapters_from_the_build(tmp_path):
+    _build(tmp_path, tmp_path / "absent.docx")
+    toc, chapters = compile_master_class(None)
+    library = MasterClassLibrary(tmp_path)
+    first = library.toc()["sessions"][0]["chapters"][0]["id"]
+    assert library.version() != "memory"
+    assert library.chapter(first) == chapters[first]
+    assert library.chapter("inconnu") is None
+
+def test_library_follows_a_new_build(tmp_path):
+    build_dir = tmp_path / "build"
+    _build(build_dir, tmp_path / "mc.docx")
+    library = MasterClassLibrary(build_dir)
+    sessions, version = len(library.toc()["sessions"]), library.version()
+    document = docx.Document()
+    document.add_paragraph("MASTER CLASS - SESSION 9")
+    document.add_paragraph("Chapitre 1 : Le kanban")
+    document.add_paragraph("Le kanban tire les flux.")
+    document.save(str(tmp_path / "mc.docx"))
+    assert _build(build_dir, tmp_path / "mc.docx")
+    session = library.toc()["sessions"][-1]
+    assert library.version() != version
+    assert len(library.toc()["sessions"]) == sessions + 1 and session["source"] == "docx"
+    assert library.chapter(session["chapters"][0]["id"]) == "Le kanban tire les flux."
+
+def test_library_without_build_compiles_in_memory(tmp_path):
+    library = MasterClassLibrary(tmp_path)
+    toc, chapters = compile_master_class(None)
+    assert library.version() == "memory"
+    assert library.toc()["sessions"] == toc["sessions"]
+    assert library.chapter("s0c0") == chapters["s0c0"]
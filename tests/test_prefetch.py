@@ -0,0 +1,45 @@
+# tests/test_prefetch.py
+from services.prefetch import QuestionPrefetcher, ReadyBuffer
+
+SCOPE = (1, "s1")
+
+def bank_loader(questions, calls):
+    """Loader de banque : première question dont l'id n'est pas exclu."""
+    def loader(exclude):
+        calls.append(set(exclude))
+        return next((q for q in questions if q["id"] not in exclude), None)
+    return loader
+
+def prefetcher(min_ready):
+    return QuestionPrefetcher(ReadyBuffer(capacity=6), max_workers=1, min_ready=min_ready)
+
+def test_fill_stops_after_one_ai_question():
+    p, calls = prefetcher(min_ready=4), []
+    p._fill("u1", SCOPE, lambda exclude: calls.append(exclude) or {"question": f"Générée {len(calls)} ?"})
+    assert len(calls) == 1
+    assert p.buffer.count("u1", SCOPE) == 1
+
+def test_same_text_under_another_id_is_skipped():
+    questions = [{"id": 1, "question": "Qu'est-ce que l'EOQ ?"}, {"id": 2, "question": "Qu'est-ce que l'EOQ ?"},
+                 {"id": 3, "question": "Qu'est-ce que le MRP ?"}]
+    p, calls = prefetcher(min_ready=2), []
+    p._fill("u1", SCOPE, bank_loader(questions, calls))
+    assert p.buffer.ids("u1") == {1, 3}
+    assert 2 in calls[-1]
+    assert p.metrics["duplicates"] == 1
+
+def test_ai_question_already_served_is_dropped():
+    p = prefetcher(min_ready=2)
+    p.next_question("u1", *SCOPE, lambda exclude: {"id": 7, "question": "Qu'est-ce que l'EOQ ?"})
+    p._executor.shutdown(wait=True)
+    p.buffer = ReadyBuffer(capacity=6)
+    p._fill("u1", SCOPE, lambda exclude: {"question": "Qu'est-ce que l'EOQ ?"})
+    assert p.buffer.count("u1", SCOPE) == 0
+    assert p.metrics["duplicates"] >= 1
+
+def test_fill_error_is_counted_and_releases_the_user():
+    p = prefetcher(min_ready=1)
+    p._inflight.add("u1")
+    p._fill("u1", SCOPE, lambda exclude: 1 / 0)
+    assert p.metrics["fill_errors"] == 1
+    assert "u1" not in p._inflight
@@ -0,0 +1,58 @@
+# tests/test_pull_delta.py
+import pytest
+
+from core import database
+from core.database import DatabaseManager, get_watermark, pull_delta, run_query
+
+def cloud_user(uid, last_seen, xp=0):
+    return {"user_id": uid, "name": uid, "level": 1, "xp": xp, "total_score": 0, "email": f"{uid}@test.local", "last_seen": last_seen}
+
+@pytest.fixture
+def cloud(app_db, fake_supabase, monkeypatch):
+    monkeypatch.setattr(DatabaseManager, "get_supabase", staticmethod(lambda: fake_supabase))
+    database._delta_locks.clear()
+    return fake_supabase
+
+def pull_users():
+    return pull_delta("users", "users", "last_seen", database._apply_users, key="user_id")
+
+def test_page_without_watermark_values(cloud):
+    cloud.tables["users"] = [cloud_user("u1", None), cloud_user("u2", None)]
+    assert pull_users() == 2
+    assert get_watermark("users") == (None, set())
+    assert run_query("SELECT COUNT(*) FROM users", fetch_one=True)[0] == 2
+
+def test_null_rows_do_not_hold_back_the_watermark(cloud):
+    cloud.tables["users"] = [cloud_user("u1", None), cloud_user("u2", "2026-01-02")]
+    assert pull_users() == 2
+    assert get_watermark("users")[0] == "2026-01-02"
+
+def test_row_arriving_at_the_watermark_is_not_lost(cloud):
+    cloud.tables["users"] = [cloud_user("u1", "2026-01-01"), cloud_user("u2", "2026-01-02")]
+    assert pull_users() == 2
+    # Arrivée après la lecture, à la même valeur que le watermark
+    cloud.tables["users"].append(cloud_user("u3", "2026-01-02"))
+    assert pull_users() == 1
+    assert run_query("SELECT user_id FROM users WHERE user_id='u3'", fetch_one=True)
+    assert pull_users() == 0  # Lignes de la frontière déjà appliquées : écartées
+    assert get_watermark("users") == ("2026-01-02", {"u2", "u3"})
+
+def test_changed_rows_are_pulled_incrementally(cloud):
+    cloud.tables["users"] = [cloud_user(f"u{i}", f"2026-01-01T00:00:{i:02d}") for i in range(10)]
+    assert pull_users() == 10
+    cloud.tables["users"][3] = cloud_user("u3", "2026-01-05", xp=42)
+    assert pull_users() == 1
+    assert run_query("SELECT xp FROM users WHERE user_id='u3'", fetch_one=True)[0] == 42
+
+def test_legacy_scalar_watermark_is_read(cloud):
+    run_query("INSERT INTO sync_state (name, watermark) VALUES ('question_bank', 7)", commit=False)
+    assert get_watermark("question_bank") == (7, set())
+
+def test_email_collisions_do_not_block_the_pull(cloud):
+    run_query("INSERT INTO users (user_id, name, email) VALUES ('local', 'Local', '')", commit=False)
+    run_query("INSERT INTO users (user_id, name, email) VALUES ('old', 'Ancien', 'ada@test.local')", commit=False)
+    cloud.tables["users"] = [{**cloud_user("u1", "2026-01-01"), "email": ""}, {**cloud_user("u2", "2026-01-01"), "email": ""},
+                             {**cloud_user("u3", "2026-01-02"), "email": "ada@test.local"}]
+    assert database.sync_all_users_for_admin() == 3
+    assert get_watermark("users")[0] == "2026-01-02"
+    assert run_query("SELECT user_id FROM users WHERE email='ada@test.local'", fetch_all=True) == [("u3",)]
@@ -0,0 +1,42 @@
+# tests/test_retrieval.py
+import pytest
+
+from core import retrieval
+from core.retrieval import BM25Index, course_context, tokenize
+
+DOCS = [
+    ("KPI", "Taux de service", "L'OTIF mesure les livraisons à l'heure et complètes."),
+    ("KPI", "Stocks", "Le stock de sécurité protège contre la variabilité de la demande."),
+    ("MasterClass", "Transport", "Les incoterms répartissent les frais de transport."),
+]
+
+@pytest.fixture
+def index(app_db):
+    index = BM25Index(app_db.session)
+    assert index.build(DOCS, "v1") == 3
+    return index
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize("Les Stocks de sécurité") == ["stock", "securite"]
+
+def test_best_passage_comes_first(index):
+    hits = index.search("calcul du stock de sécurité", k=2)
+    assert hits[0][2] == "Stocks"
+    assert index.search("otif", k=4)[0][2] == "Taux de service"
+    assert index.search("inconnu") == []
+
+def test_rebuild_replaces_documents_and_clears_cached_postings(index):
+    index.search("incoterms")
+    index.build([("KPI", "Lean", "Le kanban tire les flux.")], "v2")
+    assert index.search("incoterms") == []
+    assert index.meta("fingerprint") == "v2"
+
+def test_context_respects_the_character_budget(index):
+    context = index.context("stock otif incoterms", k=3, max_chars=120)
+    assert context.startswith("[") and len(context) <= 120 + 2 * len("\n\n")
+
+def test_course_context_never_raises(monkeypatch):
+    def broken():
+        raise RuntimeError("index illisible")
+    monkeypatch.setattr(retrieval, "get_retriever", broken)
+    assert course_context("stock") == ""
@@ -0,0 +1,36 @@
+# tests/test_search.py
+import pytest
+
+from core.database import DatabaseManager
+from core.search import SearchIndex, match_expression
+
+@pytest.fixture
+def index(app_db):
+    rows = [("u1", f"Stock tampon {i}", "Gestion du stock de sécurité", "Achats") for i in range(30)]
+    rows += [("u1", "Stock de transit", "Stock en cours de transport", "Transport"),
+             ("u1", "Stock consigné", "Stock chez le client", "Transport"),
+             ("u2", "Stock fantôme", "Stock d'un autre utilisateur", "Transport")]
+    with DatabaseManager.session() as cursor:
+        cursor.executemany("INSERT INTO glossary (user_id, term, definition, category) VALUES (?,?,?,?)", rows)
+    return SearchIndex(DatabaseManager.session)
+
+def test_match_expression_quotes_words():
+    assert match_expression("l'EOQ", ("term",)) == '{term} : ("EOQ")'
+    assert match_expression("sto", ("term",), prefix=True) == '{term} : ("sto"*)'
+
+def test_results_are_restricted_to_the_owner(index):
+    assert {h.key for h in index.search("fantôme", "u1", ["glossary"])} == set()
+    assert {h.key for h in index.search("fantôme", "u2", ["glossary"])} == {"Stock fantôme"}
+
+def test_category_filter_applies_before_the_limit(index):
+    hits = index.search("stock", "u1", ["glossary"], limit=5, filters={"category": "Transport"})
+    assert {h.key for h in hits} == {"Stock de transit", "Stock consigné"}
+
+def test_category_filter_on_ranked_by_recency_path(index):
+    index.rank_max_matches = 2  # Au-delà : classement titre puis récence, même filtre
+    hits = index.search("stock", "u1", ["glossary"], limit=5, filters={"category": "Transport"})
+    assert {h.key for h in hits} == {"Stock de transit", "Stock consigné"}
+
+def test_source_without_the_filtered_field_is_skipped(index):
+    assert index.search("stock", "u1", ["glossary", "notes"], filters={"category": "Transport"})
+    assert index.search("stock", "u1", ["notes"], filters={"category": "Transport"}) == []
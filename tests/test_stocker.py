@@ -0,0 +1,62 @@
+# tests/test_stocker.py
+import json
+
+import pytest
+
+from core.config import CURRICULUM
+from services.stocker import last_unfinished_run, parse_triads, pending_jobs, plan_run, validate_triad, write_triads
+
+def question(text, options=None, correct="A"):
+    return {"question": text, "options": options or {"A": "a", "B": "b", "C": "c", "D": "d"}, "correct": correct, "explanation": "..."}
+
+def triad(concept, tag):
+    return {"concept": concept, "questions": [question(f"{tag} question {i} ?") for i in range(3)]}
+
+def first_module():
+    lvl, modules = next(iter(CURRICULUM.items()))
+    return lvl, modules[0][0]
+
+def test_parse_tolerates_fences_and_chatter():
+    raw = "Voici les triades :\n```json\n" + json.dumps([triad("EOQ", "a")]) + "\n```\nBonne révision !"
+    assert parse_triads(raw)[0]["concept"] == "EOQ"
+    assert parse_triads(json.dumps({"triads": [triad("EOQ", "a")]}))[0]["concept"] == "EOQ"
+    assert parse_triads("pas de JSON ici") == [] and parse_triads(None) == []
+
+def test_valid_triad_is_normalized():
+    item = triad(" EOQ ", "a")
+    item["questions"][0] = question("Quelle formule ?", {"a": "x", "b": "y", "c": "z", "d": "w"}, correct="b) y")
+    concept, questions = validate_triad(item)
+    assert concept == "EOQ"
+    assert sorted(questions[0]["options"]) == ["A", "B", "C", "D"] and questions[0]["correct"] == "B"
+
+@pytest.mark.parametrize("broken", [
+    lambda t: t.update(concept=""),
+    lambda t: t["questions"].pop(),
+    lambda t: t["questions"][1].update(options={"A": "a", "B": "a", "C": "c", "D": "d"}),
+    lambda t: t["questions"][1].update(options={"A": "a", "B": "b", "C": "c"}),
+    lambda t: t["questions"][2].update(correct="E"),
+    lambda t: t["questions"][2].update(question=t["questions"][0]["question"]),
+    lambda t: t["questions"].__setitem__(0, "pas un dict"),
+])
+def test_malformed_triads_are_rejected(broken):
+    item = triad("EOQ", "a")
+    broken(item)
+    assert validate_triad(item) is None
+
+def test_resume_skips_what_was_already_written(app_db):
+    plan_run("run", 2)
+    lvl, module = first_module()
+    assert last_unfinished_run() == "run"
+    assert write_triads("run", lvl, module, [validate_triad(triad("A", "a")), validate_triad(triad("B", "b"))]) == 2
+    jobs = pending_jobs("run", per_call=2)
+    assert (lvl, module) not in {(j["level"], j["module"]) for j in jobs}
+    assert sum(j["count"] for j in jobs) == 2 * sum(len(m) for m in CURRICULUM.values()) - 2
+    plan_run("run", 2)  # Reprise : le checkpoint existant n'est pas remis à zéro
+    assert len(pending_jobs("run", per_call=2)) == len(jobs)
+
+def test_duplicate_triads_do_not_advance_the_checkpoint(app_db):
+    plan_run("run", 2)
+    lvl, module = first_module()
+    assert write_triads("run", lvl, module, [validate_triad(triad("A", "a"))]) == 1
+    assert write_triads("run", lvl, module, [validate_triad(triad("A", "a"))]) == 0  # Déjà en banque (qhash)
+    assert [j["count"] for j in pending_jobs("run", per_call=2) if j["module"] == module and j["level"] == lvl] == [1]
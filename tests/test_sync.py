@@ -0,0 +1,81 @@
+# tests/test_sync.py
+from conftest import FakeSupabase
+from core.sync import DEAD_LETTER_SCHEMA, OUTBOX_SCHEMA, SyncOp, SyncService
+
+def make_service(session, client=None, **kwargs):
+    with session() as cursor:
+        cursor.execute(OUTBOX_SCHEMA)
+        cursor.execute(DEAD_LETTER_SCHEMA)
+    return SyncService(lambda: client, session, flush_interval=0, **kwargs)
+
+def record(service, session, ops):
+    with session() as cursor:
+        service.record(cursor, ops)
+
+def test_record_journals_while_offline(sqlite_session):
+    service = make_service(sqlite_session, client=None)
+    record(service, sqlite_session, [SyncOp("history", "upsert", ("history", "u1", "q1"), payload={"user_id": "u1"})])
+    assert service.queue_depth() == 1
+    assert service.drain_once() == 0  # Hors ligne : l'entrée attend un client
+    assert service.queue_depth() == 1
+
+def test_offline_entries_are_sent_once_a_client_appears(sqlite_session, fake_supabase):
+    client = {"sb": None}
+    service = make_service(sqlite_session)
+    service.client_factory = lambda: client["sb"]
+    record(service, sqlite_session, [SyncOp("history", "upsert", ("history", "u1", "q1"), payload={"user_id": "u1"})])
+    client["sb"] = fake_supabase
+    assert service.drain_once() == 1
+    assert fake_supabase.tables["history"] == [{"user_id": "u1"}]
+    assert service.queue_depth() == 0
+
+def test_nothing_is_journaled_without_cloud_configured(sqlite_session):
+    service = make_service(sqlite_session, configured=lambda: False)
+    record(service, sqlite_session, [SyncOp("history", "upsert", ("history", "u1", "q1"), payload={"user_id": "u1"})])
+    assert service.queue_depth() == 0
+    assert service.stats()["recorded"] == 0
+
+def test_outbox_is_capped_oldest_first(sqlite_session):
+    service = make_service(sqlite_session, max_depth=3, check_every=2)
+    for i in range(6):
+        record(service, sqlite_session, [SyncOp("history", "upsert", ("history", "u1", f"q{i}"), payload={"q": i})])
+    with sqlite_session() as cursor:
+        cursor.execute("SELECT payload FROM sync_outbox ORDER BY rowid")
+        assert [r[0] for r in cursor.fetchall()] == ['{"q": 3}', '{"q": 4}', '{"q": 5}']
+    assert service.stats()["dropped"] == 3
+
+def test_depth_warning(sqlite_session):
+    service = make_service(sqlite_session, warn_depth=2)
+    record(service, sqlite_session, [SyncOp("history", "upsert", ("history", "u1", f"q{i}"), payload={}) for i in range(3)])
+    assert service.stats()["warning"]
+
+def test_same_row_is_coalesced(sqlite_session):
+    service = make_service(sqlite_session)
+    for _ in range(5):
+        record(service, sqlite_session, [SyncOp("users", "upsert", ("users", "u1"), payload={"user_id": "u1"})])
+    assert service.queue_depth() == 1
+
+def test_bad_row_does_not_block_its_table(sqlite_session):
+    sb = FakeSupabase(reject=lambda row: row.get("bad"))
+    service = make_service(sqlite_session, client=sb, max_attempts=3)
+    ops = [SyncOp("glossary", "upsert", ("glossary", "u1", f"t{i}"), payload={"term": f"t{i}", "bad": i == 2}) for i in range(5)]
+    record(service, sqlite_session, ops)
+
+    assert service.drain_once() == 4  # Lot rejeté, renvoyé ligne à ligne : seule la ligne invalide échoue
+    assert sorted(r["term"] for r in sb.tables["glossary"]) == ["t0", "t1", "t3", "t4"]
+    assert service.queue_depth() == 1
+
+def test_poison_row_goes_to_dead_letter(sqlite_session):
+    sb = FakeSupabase(reject=lambda row: True)
+    service = make_service(sqlite_session, client=sb, max_attempts=3)
+    record(service, sqlite_session, [SyncOp("users", "upsert", ("users", "u1"), payload={"user_id": "u1"})])
+    for _ in range(3):
+        with sqlite_session() as cursor:
+            cursor.execute("UPDATE sync_outbox SET next_attempt_at=0")  # Backoff écoulé
+        service.drain_once()
+
+    assert service.queue_depth() == 0
+    dead = service.dead_letters()
+    assert [(tbl, attempts) for tbl, _, _, attempts, _, _ in dead] == [("users", 3)]
+    assert "violates constraint" in dead[0][5]
+    assert service.stats()["dead"] == 1
@@ -0,0 +1,29 @@
+# tests/test_user_cache.py
+import pytest
+
+from core.database import DatabaseManager, get_user_cache, pull_user_data_from_supabase, run_query
+
+XP = 3  # Position de la colonne xp dans SELECT * FROM users
+
+@pytest.fixture
+def cache(app_db):
+    run_query("INSERT INTO users (user_id, name, xp) VALUES ('u1', 'Ada', 10)", commit=False)
+    cache = get_user_cache()
+    assert cache.user("u1")[XP] == 10
+    return cache
+
+def test_cached_row_is_served_without_query(cache):
+    misses = cache.metrics["misses"]
+    assert cache.user("u1")[XP] == 10
+    assert cache.metrics["misses"] == misses
+
+def test_write_without_sync_invalidates(cache):
+    run_query("UPDATE users SET xp=? WHERE user_id=?", (25, "u1"), commit=False)
+    assert cache.user("u1")[XP] == 25
+
+def test_pull_from_cloud_refreshes_cache(cache, fake_supabase, monkeypatch):
+    fake_supabase.tables["users"] = [{"user_id": "u1", "name": "Ada", "xp": 500, "email": "ada@test.local"}]
+    fake_supabase.tables["glossary"] = []
+    monkeypatch.setattr(DatabaseManager, "get_supabase", staticmethod(lambda: fake_supabase))
+    assert pull_user_data_from_supabase("u1")
+    assert cache.user("u1")[XP] == 500
@@ -4,6 +4,8 @@ import json
 import urllib.parse
 from core.config import MENTOR_AVATARS, COLORS, LOTTIE_URLS, t, SIGNATURE
 from core.database import get_leaderboard, run_query, DatabaseManager, purge_user_data
+from core.leaderboard import get_leaderboard_index
+from services.ai_engine import get_ai_service
 
 def render_mentor_footer():
     msg = st.session_state.get('mentor_message')
@@ -40,12 +42,17 @@ def render_sidebar():
     status = check_sb()
     cloud_color = "#10b981" if status == "Connecté" else "#ef4444"
 
+    # --- ÉTAT DES PROVIDERS IA (DISJONCTEURS) ---
+    breaker_icons = {"closed": "🟢", "half_open": "🟠", "open": "🔴"}
+    ai_health = " ".join(f"{breaker_icons[p['state']]} {p['name']}" for p in get_ai_service().health()) or "🔴 Hors ligne"
+
     st.markdown(f'''
         <div style="text-align:center;">
             <a href="/" target="_self" style="text-decoration: none;"><h1 style="color: #00dfd8; margin-bottom: 0px; font-weight: 800;">📦 Mentor SC</h1></a>
             <div style="font-size: 1rem; color: #f1f5f9; margin-bottom: 15px; opacity: 0.8;">👤 {st.session_state.user}</div>
             <div style="background:rgba(30, 41, 59, 0.5); padding:8px; border-radius:12px; display: flex; align-items: center; justify-content: center; gap: 10px;">
                 <div style="font-size:0.6rem; color:{cloud_color}; font-weight: bold; letter-spacing: 1px;">CLOUD: {status}</div>
+                <div style="font-size:0.6rem; color:#94a3b8; font-weight: bold; letter-spacing: 1px;">IA: {ai_health}</div>
             </div>
         </div>
     ''', unsafe_allow_html=True)
@@ -98,6 +105,8 @@ def render_sidebar():
     with st.expander("🏆 Top 5 Experts"):
         for i, (n, s, l) in enumerate(get_leaderboard(sync=False)[:5]):
             st.caption(f"{n} ({s} pts)")
+        my_rank = get_leaderboard_index().rank(st.session_state.user_id)
+        if my_rank: st.caption(f"📍 Vous : #{my_rank}")
 
     st.markdown("---")    
     with st.expander("⚙️ Paramètres"):
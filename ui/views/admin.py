@@ -1,7 +1,8 @@
 # ui/views/admin.py
 import streamlit as st
 import pandas as pd
-from core.database import run_query
+from core.config import SEARCH_POLICY
+from core.database import run_query, DatabaseManager, get_sync_service, get_user_cache, leaderboard_refresh_stats
 from utils.export_utils import create_excel_export
 
 def render_admin_dashboard():
@@ -55,13 +56,68 @@ def render_admin_dashboard():
             df_stats = pd.DataFrame(stats, columns=["Niveau", "Nombre de Questions"])
             st.bar_chart(df_stats.set_index("Niveau"))
             st.table(df_stats)
+
+        q_search = st.text_input("🔍 Rechercher dans la banque de questions", placeholder="Ex: Bullwhip, stock de sécurité...")
+        if q_search.strip():
+            from core.search import search
+            hits = search(q_search, sources=["question_bank"], limit=SEARCH_POLICY["page_size"])
+            for hit in hits:
+                st.markdown(f"**#{hit.key}** · Niv {hit.fields['level']} · {hit.fields['category']} — {hit.title}")
+                st.caption(hit.snippet)
+            if not hits:
+                st.info("Aucune question trouvée.")
         
+        with st.expander("🗄️ Pool de connexions SQLite"):
+            st.json(DatabaseManager.pool_stats())
+        with st.expander("👤 Cache utilisateur (profil, stats, glossaire, badges)"):
+            st.json(get_user_cache().stats())
+        with st.expander("☁️ File de synchronisation Cloud"):
+            sync_stats = get_sync_service().stats()
+            if sync_stats["warning"]: st.warning(sync_stats["warning"])
+            st.json(sync_stats)
+            dead = get_sync_service().dead_letters()
+            if dead:
+                st.caption(f"Lettres mortes : {sync_stats['dead']} ligne(s) rejetée(s) par le Cloud, plus renvoyées")
+                st.dataframe(pd.DataFrame(dead, columns=["Table", "Op", "Clé", "Tentatives", "Échec", "Erreur"]), use_container_width=True)
+        with st.expander("🧹 Éviction de la banque de questions"):
+            from core.eviction import eviction_stats
+            st.json(eviction_stats())
+        with st.expander("🏆 Rafraîchissement du classement Cloud"):
+            st.json(leaderboard_refresh_stats())
+        with st.expander("⚡ Prefetch des questions"):
+            from services.prefetch import get_prefetcher
+            st.json(get_prefetcher().stats())
+        with st.expander("🧠 Latences et disjoncteurs des providers IA"):
+            from services.ai_engine import get_ai_service
+            st.json(get_ai_service().latency_report())
+            st.json(get_ai_service().health())
+            if get_ai_service().cache:
+                st.caption("Cache des réponses IA")
+                st.json(get_ai_service().cache.stats())
+
+        st.markdown("---")
+        st.markdown("##### 📚 Corpus de formation")
+        from services.ingest import get_corpus_store
+        st.caption(f"Texte pré-extrait : {get_corpus_store().stats()}")
+        if st.button("🔄 Mettre à jour le corpus (fichiers modifiés uniquement)", use_container_width=True):
+            from services.ingest import ingest_corpus
+            with st.status("Extraction des documents..."):
+                totals = ingest_corpus(log=st.write)
+                from services.ingest import build_retrieval_index
+                build_retrieval_index(log=st.write)
+                from services.document_parser import build_master_class
+                build_master_class(log=st.write)
+            st.success(f"Corpus à jour : {totals}")
+
         st.markdown("---")
         st.markdown("##### 🚀 Remplissage Manuel (X3)")
         st.write("Cette opération va générer 5 nouvelles triades (15 questions) pour chaque module du curriculum via l'IA.")
         if st.button("🔥 Lancer le Stockage Massif", use_container_width=True):
             from services.stocker import stock_database
-            with st.status("Génération en cours (cela peut prendre 2-3 minutes)..."):
-                stock_database()
-            st.success("Banque de questions enrichie avec succès !")
+            with st.status("Génération en cours (modules en parallèle)..."):
+                totals = stock_database()
+            if totals and totals["triads"]:
+                st.success(f"Banque de questions enrichie : {totals['triads'] * 3} questions ajoutées !")
+            else:
+                st.warning("Aucune triade générée (providers IA indisponibles ?).")
             st.rerun()
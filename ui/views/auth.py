@@ -4,6 +4,7 @@ import uuid
 import time
 from datetime import datetime, timedelta
 from core.database import run_query
+from core.leaderboard import get_leaderboard_index
 from core.config import t, SIGNATURE
 
 def render_login():
@@ -107,6 +108,7 @@ def render_login():
                         # Initialisation : 3 Vies, 3 Jokers 50/50, 3 Jokers Indices
                         run_query('INSERT INTO users (user_id, name, email, city, hearts, joker_5050, joker_hint) VALUES (?,?,?,?,3,3,3)', 
                                  (uid, name, st.session_state.temp_email, city), commit=True)
+                        get_leaderboard_index().update(uid, 1, 0, name, city)
                         
                         st.query_params["uid"] = uid # Persistance URL
 
@@ -2,12 +2,12 @@
 import streamlit as st
 import uuid
 import datetime
-import time
 import json
 from services.ai_engine import get_ai_service
 from services.news_service import get_supply_chain_news
 from core.database import run_query
 from core.config import SYSTEM_PROMPT
+from core.retrieval import course_context
 
 def render_coach():
     uid = st.session_state.user_id
@@ -78,6 +78,8 @@ def render_coach():
             with st.spinner("Le Mentor analyse..."):
                 current_persona = tone_prompts.get(tone, tone_prompts["🎩 Stratège"])
                 actus = get_supply_chain_news()
+                # Passages du cours les plus proches de la question (index BM25 local)
+                cours = course_context(final_prompt)
                 
                 # Construction de la mémoire conversationnelle (5 derniers échanges)
                 memory_block = ""
@@ -95,6 +97,9 @@ def render_coach():
                 - Actualités SC: {actus}
                 - Doc Analysé: {doc_context}
                 
+                EXTRAITS DU COURS (appuie-toi dessus en priorité) :
+                {cours}
+                
                 HISTORIQUE RÉCENT :
                 {memory_block}
                 
@@ -102,28 +107,18 @@ def render_coach():
                 {final_prompt}
                 """
                 
-                response, engine_name = ai_service.get_response(full_prompt, preferred="groq")
-                if not response: response = "Désolé, je suis en réunion codir. Réessaie plus tard."
-                
-                # Mise à jour du statut IA pour la sidebar
-                st.session_state.current_engine = engine_name
-                
-                # Effet Machine à écrire
-                resp_box = st.empty()
-                displayed_text = ""
-                for char in response:
-                    displayed_text += char
-                    resp_box.markdown(displayed_text + "▌")
-                    time.sleep(0.01) # Vitesse de frappe accélérée pour perf
-                resp_box.markdown(displayed_text)
-                
-                # Mise à jour de l'historique (Limitation à 10 messages pour perf mémoire)
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
-                if len(st.session_state.chat_history) > 10:
-                    st.session_state.chat_history = st.session_state.chat_history[-10:]
-                
-                time.sleep(1) 
-                st.rerun()
+            # Les fragments s'affichent dès leur arrivée : la latence perçue est celle du premier token
+            response = st.write_stream(ai_service.stream_response(full_prompt, preferred="groq"))
+            if not response:
+                response = "Désolé, je suis en réunion codir. Réessaie plus tard."
+                st.write(response)
+
+            # Mise à jour de l'historique (Limitation à 10 messages pour perf mémoire)
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
+            if len(st.session_state.chat_history) > 10:
+                st.session_state.chat_history = st.session_state.chat_history[-10:]
+
+            st.rerun()
 
     # 6. CHAT HISTORY DISPLAY (Reversed)
     # We use reversed list to show newest on top
@@ -3,36 +3,49 @@ import streamlit as st
 import pandas as pd
 import json
 import time
-from core.database import run_query
+from core.config import SEARCH_POLICY
+from core.database import run_query, get_user_cache
+from core.search import search
 from services.ai_engine import get_ai_service
 from utils.assets import play_sfx
 
+GLOSSARY_COLUMNS = 'term, definition, category, use_case, business_impact, short_definition'
+
+def _export_csv(uid: str) -> bytes:
+    rows = run_query(f'SELECT {GLOSSARY_COLUMNS} FROM glossary WHERE user_id = ? ORDER BY term ASC', (uid,), fetch_all=True) or []
+    df_gl = pd.DataFrame(rows, columns=['Terme', 'Définition', 'Domaine', 'Cas Usage', 'Impact', 'Résumé'])
+    return df_gl.to_csv(index=False, sep=';').encode('utf-8')
+
 def render_glossary(uid: str):
     st.markdown("### 📖 Glossaire Visionnaire")
     
-    # 1. Fetch data
-    all_terms = run_query('SELECT term, definition, category, use_case, business_impact, short_definition FROM glossary WHERE user_id = ? ORDER BY term ASC', (uid,), fetch_all=True)
-    
-    if not all_terms:
+    if not get_user_cache().glossary_count(uid):
         st.info("Validez des concepts en répondant aux questions pour bâtir votre glossaire.")
         return
 
-    # Export
+    # Export (généré au clic seulement)
     col_t, col_ex = st.columns([0.7, 0.3])
-    df_gl = pd.DataFrame(all_terms, columns=['Terme', 'Définition', 'Domaine', 'Cas Usage', 'Impact', 'Résumé'])
-    csv = df_gl.to_csv(index=False, sep=';').encode('utf-8')
-    col_ex.download_button("📥 Export CSV", data=csv, file_name="glossaire_sc.csv", mime="text/csv", use_container_width=True)
+    col_ex.download_button("📥 Export CSV", data=lambda: _export_csv(uid), file_name="glossaire_sc.csv", mime="text/csv", use_container_width=True)
 
     # 2. Filters
     c1, c2 = st.columns([0.6, 0.4])
-    cats = sorted(list(set([row[2] for row in all_terms if row[2]])))
+    cats = [row[0] for row in run_query("SELECT DISTINCT category FROM glossary WHERE user_id = ? AND category IS NOT NULL AND category != '' ORDER BY category", (uid,), fetch_all=True) or []]
     sel_cat = c1.selectbox("📁 Filtrer par Domaine", ["Tous"] + cats)
     search_term = c2.text_input("🔍 Rechercher", placeholder="Ex: Bullwhip...")
 
-    # Filter logic
-    filtered = [row for row in all_terms if (sel_cat == "Tous" or row[2] == sel_cat)]
-    if search_term:
-        filtered = [row for row in filtered if search_term.lower() in row[0].lower() or search_term.lower() in row[1].lower()]
+    # Filter logic : recherche plein texte (FTS5, classée BM25) ou liste filtrée en SQL
+    snippets = {}
+    if search_term.strip():
+        hits = search(search_term, uid, ["glossary"], limit=SEARCH_POLICY["page_size"],
+                      filters=None if sel_cat == "Tous" else {"category": sel_cat})
+        snippets = {h.key: h.snippet for h in hits}
+        rows = {r[0]: r for r in run_query(f"SELECT {GLOSSARY_COLUMNS} FROM glossary WHERE user_id = ? AND term IN ({','.join('?' * len(hits))})",
+                                            (uid, *snippets), fetch_all=True) or []} if hits else {}
+        filtered = [rows[h.key] for h in hits if h.key in rows]
+    elif sel_cat == "Tous":
+        filtered = run_query(f'SELECT {GLOSSARY_COLUMNS} FROM glossary WHERE user_id = ? ORDER BY term ASC', (uid,), fetch_all=True) or []
+    else:
+        filtered = run_query(f'SELECT {GLOSSARY_COLUMNS} FROM glossary WHERE user_id = ? AND category = ? ORDER BY term ASC', (uid, sel_cat), fetch_all=True) or []
 
     st.markdown(f"<small>{len(filtered)} concepts experts répertoriés</small>", unsafe_allow_html=True)
     st.markdown("---")
@@ -49,6 +62,7 @@ def render_glossary(uid: str):
                         <b style="color: #00dfd8; font-size: 1.1rem; margin-left: 8px;">{term}</b>
                     </div>
                 """, unsafe_allow_html=True)
+                if term in snippets: st.caption(f"🔎 {snippets[term]}")
                 
                 with st.expander(short_def if short_def else "Voir les détails"):
                     st.write(definition)
@@ -93,7 +107,7 @@ def render_glossary(uid: str):
                 for i, (m_term,) in enumerate(missing):
                     with st.spinner(f"Analyse IA : {m_term}..."):
                         prompt = f"Rédige une définition technique, un résumé de 5 mots, un cas d'usage et l'impact business pour le terme SC : {m_term}. Répond au format JSON: {{\"short_def\": \"...\", \"def\": \"...\", \"use_case\": \"...\", \"impact\": \"...\"}}"
-                        res, _ = get_ai_service().get_response(prompt)
+                        res, _ = get_ai_service().get_response(prompt, cache_class="glossary")
                         if res:
                             try:
                                 clean_res = res.strip()
@@ -101,7 +115,7 @@ def render_glossary(uid: str):
                                 d = json.loads(clean_res)
                                 run_query('UPDATE glossary SET definition=?, use_case=?, business_impact=?, short_definition=? WHERE term=? AND user_id=?', 
                                          (d.get('def', ''), d.get('use_case', ''), d.get('impact', ''), d.get('short_def', ''), m_term, uid), commit=True)
-                            except: pass
+                            except: get_ai_service().forget(prompt, "glossary")
                     progress_bar.progress((i + 1) / count)
                 st.success("Batch terminé !")
                 st.rerun()
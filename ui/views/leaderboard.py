@@ -1,19 +1,44 @@
 # ui/views/leaderboard.py
 import streamlit as st
 import pandas as pd
-from core.database import run_query
+from core.leaderboard import get_leaderboard_index
+
+# Mapping des noms de niveaux (Grades)
+GRADE_MAP = {
+    1: "🔰 Opérateur",
+    2: "📦 Coordinateur",
+    3: "⚙️ Ingénieur SC",
+    4: "🏭 Directeur (COO)",
+    5: "👑 Visionnaire"
+}
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _leaderboard_frame(version, limit):
+    """Tableau du classement, reconstruit seulement quand la version du classement change."""
+    users = [(name, level, score, city, seen) for _, _, name, level, score, city, seen in get_leaderboard_index().top(limit)]
+    if not users: return None
+
+    # Transformation en DataFrame pour un bel affichage
+    df = pd.DataFrame(users, columns=["Expert", "Niveau", "Score Prestige", "Ville", "Dernière Activité"])
+    df['Grade'] = df['Niveau'].map(GRADE_MAP)
+    
+    # Réorganisation des colonnes pour mettre le Grade en avant
+    df = df[["Expert", "Grade", "Niveau", "Score Prestige", "Ville", "Dernière Activité"]]
+    
+    # Ajout du rang
+    df.index = range(1, len(df) + 1)
+    df.index.name = "Rang"
+    return df
 
 def render_leaderboard():
     st.markdown("### 🏆 Classement Mondial des Experts")
     
-    # Synchronisation préalable avec le Cloud pour voir tout le monde
-    from core.database import sync_leaderboard_from_supabase
+    # Le classement Cloud est rafraîchi en tâche de fond (une fois par intervalle pour tout le process)
+    from core.database import start_leaderboard_refresher
+    start_leaderboard_refresher()
     
     show_all = st.toggle("Afficher tout le monde (au-delà du Top 100)", value=False)
     limit = 1000 if show_all else 100
-
-    with st.spinner("Mise à jour du classement..."):
-        sync_leaderboard_from_supabase(limit=limit)
     
     # Explication de la règle de gestion (Transparence)
     st.info("""
@@ -21,37 +46,24 @@ def render_leaderboard():
     À niveau égal, les experts sont départagés par leur **Score Prestige** (XP cumulée).
     """)
     
-    # Récupération des utilisateurs triés par Niveau puis Score
-    users = run_query(f'''
-        SELECT name, level, total_score, city, last_seen 
-        FROM users 
-        ORDER BY level DESC, total_score DESC 
-        LIMIT {limit}
-    ''', fetch_all=True)
+    # Classement matérialisé en mémoire (trié par Niveau puis Score)
+    board = get_leaderboard_index()
+    df = _leaderboard_frame(board.current_version(), limit)
     
-    if not users:
+    if df is None:
         st.info("Le classement est vide pour le moment.")
         return
 
-    # Transformation en DataFrame pour un bel affichage
-    df = pd.DataFrame(users, columns=["Expert", "Niveau", "Score Prestige", "Ville", "Dernière Activité"])
-    
-    # Mapping des noms de niveaux (Grades)
-    grade_map = {
-        1: "🔰 Opérateur",
-        2: "📦 Coordinateur",
-        3: "⚙️ Ingénieur SC",
-        4: "🏭 Directeur (COO)",
-        5: "👑 Visionnaire"
-    }
-    df['Grade'] = df['Niveau'].map(grade_map)
-    
-    # Réorganisation des colonnes pour mettre le Grade en avant
-    df = df[["Expert", "Grade", "Niveau", "Score Prestige", "Ville", "Dernière Activité"]]
-    
-    # Ajout du rang
-    df.index = range(1, len(df) + 1)
-    df.index.name = "Rang"
+    # Position de l'utilisateur courant et ses voisins directs
+    uid = st.session_state.get('user_id')
+    my_rank = board.rank(uid) if uid else None
+    if my_rank:
+        st.metric("📍 Votre rang", f"#{my_rank}", help=f"Sur {len(board)} experts")
+        if my_rank > limit:
+            with st.expander("👥 Autour de vous"):
+                for rank, other, name, level, score, _, _ in board.around(uid, radius=2):
+                    label = f"**#{rank} {name}** (Niv. {level}, {score} pts)"
+                    st.markdown(f"👉 {label}" if other == uid else label)
 
     # Style pour le podium
     def color_rows(row):
@@ -1,20 +1,87 @@
+import re
 import streamlit as st
-from core.masterclass_content import MASTERCLASS_DATA
+from services.document_parser import get_masterclass_library
+
+PAGE_CHARS = 6000  # Au-delà, un chapitre est découpé en pages (sur ses intertitres)
+
+_HEADING = re.compile(r"^#{2,4}\s+(.+)$", re.MULTILINE)
+
+def paginate_markdown(markdown: str, page_chars: int = PAGE_CHARS):
+    """Découpe un chapitre en pages sur ses intertitres ; renvoie [(intertitres de la page, markdown)]."""
+    starts = [m.start() for m in _HEADING.finditer(markdown)]
+    bounds = [0] + [s for s in starts if s > 0] + [len(markdown)]
+    sections = [markdown[a:b] for a, b in zip(bounds, bounds[1:]) if markdown[a:b].strip()]
+    pages, current = [], ""
+    for section in sections:
+        if current and len(current) + len(section) > page_chars:
+            pages.append(current)
+            current = ""
+        current += section
+    if current: pages.append(current)
+    return [([h.strip("* ") for h in _HEADING.findall(page)], page.strip()) for page in pages] or [([], "")]
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _chapter_pages(version, chap_id):
+    """Pages prêtes à afficher d'un chapitre, calculées une fois par build et par chapitre pour tout le process."""
+    return paginate_markdown(get_masterclass_library().chapter(chap_id) or "")
+
+def _select_chapter(chap_id, session_id):
+    st.session_state.mc_chapter = chap_id
+    st.session_state.mc_session = session_id
+    st.session_state.mc_page = 0
+
+def _select_session(sessions):
+    session = next(s for s in sessions if s["id"] == st.session_state.mc_session)
+    _select_chapter(session["chapters"][0]["id"], session["id"])
 
 def render_masterclass():
     st.markdown("### 📚 Master Class Supply Chain")
     st.markdown("Le manuel de référence du Directeur. Contenu statique pour consultation rapide.")
-    
-    # Navigation par Session
-    session_names = list(MASTERCLASS_DATA.keys())
-    # On utilise des tabs pour les sessions principales
-    tabs = st.tabs([MASTERCLASS_DATA[s]["title"] for s in session_names])
-    
-    for i, session_key in enumerate(session_names):
-        with tabs[i]:
-            data = MASTERCLASS_DATA[session_key]
-            
-            # Sous-navigation (Modules)
-            for module_title, content in data["modules"].items():
-                with st.expander(f"📘 {module_title}", expanded=True):
-                    st.markdown(content)
\ No newline at end of file
+
+    # Arbre compilé (services/ingest.py) : seule la table des matières est lue à chaque rerun
+    library = get_masterclass_library()
+    sessions = library.toc()["sessions"]
+    if not sessions:
+        st.info("La MasterClass n'est pas encore disponible.")
+        return
+    chapters = {c["id"]: (s, c) for s in sessions for c in s["chapters"]}
+    order = list(chapters)
+    if st.session_state.get("mc_chapter") not in chapters:
+        _select_chapter(order[0], chapters[order[0]][0]["id"])
+
+    col_toc, col_content = st.columns([0.3, 0.7])
+
+    # Table des matières : sessions puis chapitres, un seul chapitre rendu à la fois
+    with col_toc:
+        titles = {s["id"]: s["title"] for s in sessions}
+        st.selectbox("Session", list(titles), key="mc_session", format_func=titles.get,
+                     on_change=_select_session, args=(sessions,))
+        session, _ = chapters[st.session_state.mc_chapter]
+        for chapter in session["chapters"]:
+            current = chapter["id"] == st.session_state.mc_chapter
+            st.button(f"{'👉 ' if current else '📘 '}{chapter['title']}", key=f"mc_{chapter['id']}", use_container_width=True,
+                      type="primary" if current else "secondary", on_click=_select_chapter, args=(chapter["id"], session["id"]))
+
+    with col_content:
+        session, chapter = chapters[st.session_state.mc_chapter]
+        pages = _chapter_pages(library.version(), chapter["id"])
+        page = min(st.session_state.get("mc_page", 0), len(pages) - 1)
+        headings, markdown = pages[page]
+
+        st.caption(f"{session['title']} › {chapter['title']}" + (f" · page {page + 1}/{len(pages)}" if len(pages) > 1 else ""))
+        if len(pages) > 1 and headings:
+            st.caption("Dans cette page : " + " · ".join(headings[:6]))
+        with st.container(border=True):
+            st.markdown(markdown)
+
+        # Pagination, puis passage au chapitre voisin
+        c_prev, c_next = st.columns(2)
+        idx = order.index(chapter["id"])
+        if page > 0:
+            c_prev.button("◀ Page précédente", use_container_width=True, on_click=lambda: st.session_state.update(mc_page=page - 1))
+        elif idx > 0:
+            c_prev.button("◀ Chapitre précédent", use_container_width=True, on_click=_select_chapter, args=(order[idx - 1], chapters[order[idx - 1]][0]["id"]))
+        if page < len(pages) - 1:
+            c_next.button("Page suivante ▶", use_container_width=True, on_click=lambda: st.session_state.update(mc_page=page + 1))
+        elif idx < len(order) - 1:
+            c_next.button("Chapitre suivant ▶", use_container_width=True, on_click=_select_chapter, args=(order[idx + 1], chapters[order[idx + 1]][0]["id"]))
@@ -7,9 +7,11 @@ import json
 from streamlit_lottie import st_lottie
 from services.quiz_engine import get_quiz_engine
 from core.config import COLORS, t, CURRICULUM, LOTTIE_URLS
+from core.curriculum import module_info
 from ui.components import render_mentor_footer
 from core.database import run_query
 from services.ai_engine import get_ai_service
+from core.badges import check_new_badge
 
 @st.dialog("⌛ TEMPS ÉCOULÉ !")
 def show_crisis_failure_dialog():
@@ -101,6 +103,8 @@ def render_stock_out():
             st.session_state.redemptions = st.session_state.get('redemptions', 0) + 1
             uid = st.session_state.user_id
             run_query('UPDATE users SET hearts=1, redemptions=redemptions+1 WHERE user_id=?', (uid,), commit=True)
+            new_badge = check_new_badge(uid, {"redemptions": st.session_state.redemptions})
+            if new_badge: st.session_state.pending_badge = new_badge
             st.warning("Le Mentor vous accorde une dernière vie... Ne la gâchez pas.")
             time.sleep(1)
             st.rerun()
@@ -199,7 +203,7 @@ def render_mission():
         """, height=80)
 
     # --- 4. UI HEADER (Module + Jokers) ---
-    mn, mp, mt, lvl = engine.get_current_module_info(qc)
+    mn, mp, mt, lvl = module_info(qc)
     c_head, c_jokers = st.columns([0.55, 0.45])
     with c_head: st.markdown(f"#### 📦 {mn} ({mp}/{mt})")
     with c_jokers:
@@ -214,11 +218,11 @@ def render_mission():
                 st.session_state.joker_hint -= 1; st.session_state.active_joker_hint = True
                 with st.spinner("Recherche d'un indice..."):
                     p = f"Indice court pour : {q['question']}"
-                    hint, en = get_ai_service().get_response(p)
+                    hint, _ = get_ai_service().get_response(p, cache_class="hint")
                     # Fallback si l'IA échoue
                     if not hint:
                         hint = f"Concentrez-vous sur le concept clé : {q.get('concept', 'Logistique')}."
-                    st.session_state.current_hint, st.session_state.current_engine = hint, en
+                    st.session_state.current_hint = hint
                 run_query("UPDATE users SET joker_hint=joker_hint-1 WHERE user_id=?", (uid,), commit=True); st.rerun()
 
     # --- 5. AFFICHAGE QUESTION ---
@@ -282,7 +286,7 @@ def render_mission():
                 ctx = opts_val.get(ck, "")
                 p_map = {"theory": "Fiche Réflexe 4-5 phrases.", "example": "Scénario 4-5 lignes.", "tip": "Règle d'Or."}
                 p = f"Q: {qd['question']} T: {p_map[ct]}"
-                res, en = get_ai_service().get_response(p); st.session_state.current_engine = en
+                res, _ = get_ai_service().get_response(p, cache_class="enrichment")
                 if res:
                     res = res.replace("```", "").strip()
                     if qd.get('id'):
@@ -3,7 +3,9 @@ import streamlit as st
 import uuid
 import datetime
 import pandas as pd
+from core.config import SEARCH_POLICY
 from core.database import run_query
+from core.search import search
 
 def render_notes(uid: str):
     st.markdown("### 📝 Mes Notes Personnalisées")
@@ -38,12 +40,23 @@ def render_notes(uid: str):
         st.info("Utilisez le formulaire ci-dessus pour créer votre première note.")
         return
 
+    # Recherche plein texte (titre + contenu), résultats classés par pertinence
+    query = st.text_input("🔍 Rechercher dans mes notes", placeholder="Ex: S&OP, prévision...")
+    snippets = {}
+    if query.strip():
+        hits = search(query, uid, ["notes"], limit=SEARCH_POLICY["page_size"])
+        snippets = {h.key: h.snippet for h in hits}
+        by_id = {n[0]: n for n in user_notes}
+        user_notes = [by_id[h.key] for h in hits if h.key in by_id]
+        st.caption(f"{len(user_notes)} note(s) trouvée(s)")
+
     for nid, title, content, ts in user_notes:
         with st.container():
             c_main, c_actions = st.columns([0.8, 0.2])
             with c_main:
                 st.markdown(f"#### {title}")
                 st.caption(f"📅 {ts}")
+                if nid in snippets: st.caption(f"🔎 {snippets[nid]}")
                 with st.expander("📄 Lire la note"):
                     st.write(content)
             
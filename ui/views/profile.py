@@ -3,7 +3,7 @@ import streamlit as st
 import json
 import plotly.graph_objects as go
 import datetime
-from core.database import run_query
+from core.database import run_query, get_user_cache
 from services.ai_engine import get_ai_service
 from services.certificate_factory import generate_certificate_pdf, get_base64_image, get_certificate_html
 from core.config import t, ADMIN_EMAILS
@@ -19,7 +19,7 @@ def render_profile(uid: str):
     st.markdown("### 📊 Analyse des Compétences")
     
     # 1. Stats Data Retrieval
-    stats_dict = dict(run_query('SELECT category, correct_count FROM stats WHERE user_id = ?', (uid,), fetch_all=True))
+    stats_dict = get_user_cache().stats_by_category(uid)
 
     # 2. Radar
     # Mapping modules to core categories for the radar
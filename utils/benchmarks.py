@@ -0,0 +1,290 @@
+# utils/benchmarks.py
+"""Micro-benchmarks de la couche données, exécutables hors Streamlit.
+
+Usage : python -m utils.benchmarks [nom ...]   (sans argument : tous)
+Chaque benchmark travaille sur une base temporaire, jamais sur mentor_sc_v8.db.
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+root_path = str(Path(__file__).parent.parent)
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from streamlit import logger as st_logger
+st_logger.set_log_level("error")  # Mode "bare" : pas d'avertissements ScriptRunContext à chaque accès
+
+from core import database
+from core.database import ConnectionPool, DatabaseManager, question_digest, question_key
+from core.config import CURRICULUM
+from services.ai_engine import CircuitBreaker
+
+@contextmanager
+def temp_database():
+    """Bascule le pool sur une base jetable initialisée avec le schéma de l'app."""
+    previous = DatabaseManager._pool
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseManager._pool = ConnectionPool(os.path.join(tmp, "bench.db"))
+        try:
+            database.init_db.clear()
+            database.get_user_cache().clear()
+            database.init_db()
+            yield DatabaseManager._pool
+        finally:
+            DatabaseManager._pool.close_all()
+            DatabaseManager._pool = previous
+            database.init_db.clear()
+
+def timed(fn, rounds):
+    """Exécute fn `rounds` fois et renvoie (médiane, p95) en millisecondes."""
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def report(title, rows):
+    print(f"\n== {title}")
+    for label, (med, p95) in rows:
+        print(f"  {label:<40} median={med:8.3f} ms   p95={p95:8.3f} ms")
+
+def fill_question_bank(n_questions):
+    modules = [(lvl, m) for lvl, mods in CURRICULUM.items() for m, _ in mods]
+    rows = []
+    for i in range(n_questions):
+        lvl, mod = modules[i % len(modules)]
+        rows.append((mod, f"concept {i}", lvl, f"Question de benchmark n°{i} ?",
+                     json.dumps({"A": "a", "B": "b", "C": "c", "D": "d"}), "A", "..."))
+    with DatabaseManager.session() as cursor:
+        cursor.execute("DELETE FROM question_bank")
+        cursor.executemany("INSERT INTO question_bank (category, concept, level, question, options, correct, explanation) VALUES (?,?,?,?,?,?,?)", rows)
+
+def bench_question_picker(n_questions=100_000, n_history=50_000, rounds=30):
+    """Sélection d'une question non vue : ORDER BY RANDOM() vs tirage indexé."""
+    from services.quiz_engine import QuizEngine
+
+    uid, lvl, module = "bench-user", 1, CURRICULUM[1][0][0]
+    with temp_database():
+        fill_question_bank(n_questions)
+        with DatabaseManager.session() as cursor:
+            cursor.execute("SELECT question FROM question_bank ORDER BY RANDOM() LIMIT ?", (n_history,))
+            seen = cursor.fetchall()
+            cursor.executemany("INSERT OR IGNORE INTO history (user_id, question_hash, qhash) VALUES (?, ?, ?)",
+                               [(uid, question_key(q), question_digest(q)) for (q,) in seen])
+
+        # Requête historique : tri complet + comparaison de textes
+        legacy = """
+            SELECT id, question, options, correct, explanation, theory, example, tip, category, concept
+            FROM question_bank
+            WHERE level=? AND category=? AND question NOT IN (SELECT question_hash FROM history WHERE user_id=?)
+            ORDER BY RANDOM() LIMIT 1
+        """
+        engine = QuizEngine()
+        report(f"Question picker ({n_questions} questions, {n_history} vues)", [
+            ("ORDER BY RANDOM() (legacy)", timed(lambda: database.run_query(legacy, (lvl, module, uid), fetch_one=True), rounds)),
+            ("pick_unseen_question", timed(lambda: engine.pick_unseen_question(uid, lvl, module), rounds)),
+        ])
+
+def _legacy_validate_answer(uid, q_data):
+    """Chemin d'écriture d'une bonne réponse avant l'unité de travail (une transaction par requête)."""
+    run_query = database.run_query
+    run_query('INSERT OR IGNORE INTO history (user_id, question_hash, qhash) VALUES (?, ?, ?)',
+              (uid, question_key(q_data['question']), question_digest(q_data['question'])))
+    run_query('INSERT INTO stats (user_id, category, correct_count) VALUES (?, ?, 1) ON CONFLICT(user_id, category) DO UPDATE SET correct_count=correct_count+1', (uid, q_data['category']))
+    run_query("INSERT OR REPLACE INTO glossary (user_id, term, definition, category, use_case, business_impact, short_definition) VALUES (?, ?, ?, ?, ?, ?, ?)",
+              (uid, q_data['concept'], q_data['explanation'], q_data['category'], "", "", q_data['concept']))
+    run_query('UPDATE users SET xp=xp+20, total_score=total_score+20, q_count=q_count+1 WHERE user_id=?', (uid,))
+    # calculate_badges legacy : toutes les stats et un COUNT(*) du glossaire à chaque réponse
+    run_query('SELECT category, correct_count FROM stats WHERE user_id = ?', (uid,), fetch_all=True)
+    run_query('SELECT COUNT(*) FROM glossary WHERE user_id = ?', (uid,), fetch_one=True)
+
+def bench_answer_commits(n_answers=200):
+    """Bonne réponse : commits et latence, requêtes unitaires vs unité de travail."""
+    import streamlit as st
+    from services.quiz_engine import QuizEngine
+
+    uid = "bench-user"
+    questions = [{"question": f"Question {i} ?", "correct": "A", "explanation": "...", "category": "Achats", "concept": f"Concept {i}"}
+                 for i in range(n_answers * 2)]
+    with temp_database() as pool:
+        database.run_query("INSERT INTO users (user_id, name) VALUES (?, ?)", (uid, "Bench"), commit=False)
+        st.session_state.update({'user_id': uid, 'xp': 0, 'total_score': 0, 'q_count': 0, 'level': 1, 'hearts': 5})
+        engine = QuizEngine()
+        rows, commits = [], []
+        for label, answer in (("requêtes unitaires (legacy)", lambda q: _legacy_validate_answer(uid, q)),
+                              ("unit_of_work", lambda q: engine.validate_answer("A", q))):
+            batch = iter(questions[:n_answers] if not rows else questions[n_answers:])
+            before = pool.stats()["commits"]
+            rows.append((label, timed(lambda: answer(next(batch)), n_answers)))
+            commits.append((label, (pool.stats()["commits"] - before) / n_answers))
+        report(f"validate_answer ({n_answers} bonnes réponses)", rows)
+        for label, per_answer in commits:
+            print(f"  {label:<40} {per_answer:.1f} commit(s) par réponse")
+
+def _legacy_prefetch(uid):
+    """Remplissage legacy de ai_queue : COUNT, tirage ORDER BY RANDOM() sur toute la banque, INSERT."""
+    run_query = database.run_query
+    if run_query("SELECT COUNT(*) FROM ai_queue WHERE user_id=?", (uid,), fetch_one=True)[0] >= 2: return
+    res = run_query("SELECT id, question, options, correct, explanation FROM question_bank ORDER BY RANDOM() LIMIT 1", fetch_one=True)
+    q_data = {"id": res[0], "question": res[1], "options": json.loads(res[2]), "correct": res[3], "explanation": res[4]}
+    run_query("INSERT INTO ai_queue (user_id, question_json) VALUES (?, ?)", (uid, json.dumps(q_data)), commit=True)
+
+def _legacy_manage_queue(engine, uid, lvl):
+    """manage_queue legacy : SELECT + DELETE sur ai_queue et un thread de prefetch par question."""
+    run_query = database.run_query
+    buffered = run_query("SELECT id, question_json FROM ai_queue WHERE user_id=? LIMIT 1", (uid,), fetch_one=True)
+    threading.Thread(target=_legacy_prefetch, args=(uid,), daemon=True).start()
+    if buffered:
+        run_query("DELETE FROM ai_queue WHERE id=?", (buffered[0],), commit=True)
+        return json.loads(buffered[1])
+    return engine.get_question_from_db(lvl)
+
+def bench_next_question(n_questions=20_000, n_next=300, think=0.01):
+    """Latence du bouton « Next » : ai_queue SQLite (legacy) vs tampon circulaire en mémoire."""
+    import streamlit as st
+    from services.prefetch import QuestionPrefetcher, ReadyBuffer
+    from services.quiz_engine import QuizEngine
+
+    uid, lvl = "bench-user", 1
+    module = CURRICULUM[lvl][0][0]
+    with temp_database():
+        fill_question_bank(n_questions)
+        st.session_state.update({'user_id': uid, 'level': lvl, 'q_count': 0})
+        engine = QuizEngine()
+        buffer = ReadyBuffer(session_factory=DatabaseManager.session, idle_after=0.0)
+        prefetcher = QuestionPrefetcher(buffer)
+        loader = lambda exclude: engine.load_question(uid, lvl, module, exclude)
+
+        rows = []
+        for label, serve in (("ai_queue SQLite (legacy)", lambda: _legacy_manage_queue(engine, uid, lvl)),
+                             ("ReadyBuffer mémoire", lambda: prefetcher.next_question(uid, lvl, module, loader))):
+            samples = []
+            for _ in range(n_next):
+                t0 = time.perf_counter()
+                serve()
+                samples.append((time.perf_counter() - t0) * 1000)
+                time.sleep(think)  # Temps de lecture : laisse le remplissage se faire
+            samples.sort()
+            rows.append((label, (statistics.median(samples), samples[int(len(samples) * 0.95) - 1])))
+        report(f"« Next » : {n_next} questions servies (banque de {n_questions})", rows)
+
+        # Délestage d'une session inactive puis retour de l'utilisateur
+        ready_before = buffer.stats()["ready"]
+        t0 = time.perf_counter(); buffer.spill_idle(); spill = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter(); buffer.restore(uid); restore = (time.perf_counter() - t0) * 1000
+        print(f"  délestage de {ready_before} question(s) : {spill:.3f} ms   rechargement : {restore:.3f} ms")
+        print(f"  prefetch : {prefetcher.stats()}")
+
+def _legacy_module_info(qc):
+    """get_current_module_info legacy : tri des seuils et parcours linéaire des modules à chaque appel."""
+    from core.config import LEVEL_THRESHOLDS
+    lvl = 1
+    for l, thresh in sorted(LEVEL_THRESHOLDS.items(), reverse=True):
+        if qc >= thresh: lvl = l; break
+    local_q, cum = qc - LEVEL_THRESHOLDS.get(lvl, 0) + 1, 0
+    for m_n, m_c in CURRICULUM.get(lvl, CURRICULUM[1]):
+        if local_q <= cum + m_c: return m_n, local_q - cum, m_c, lvl
+        cum += m_c
+    return CURRICULUM.get(lvl, CURRICULUM[1])[-1][0], 1, 1, lvl
+
+def bench_curriculum_index(max_qc=600, rounds=200):
+    """Position dans le curriculum : parcours linéaire (legacy) vs index compilé (bisect)."""
+    from core.curriculum import module_info
+
+    assert all(_legacy_module_info(qc) == module_info(qc) for qc in range(max_qc))
+    per_call = lambda fn: timed(lambda: [fn(qc) for qc in range(max_qc)], rounds)
+    rows = [(label, tuple(v * 1000 / max_qc for v in per_call(fn)))
+            for label, fn in (("parcours linéaire (legacy)", _legacy_module_info), ("CurriculumIndex (bisect)", module_info))]
+    print(f"\n== Position curriculum, q_count 0..{max_qc - 1} (µs par appel, résultats identiques)")
+    for label, (med, p95) in rows:
+        print(f"  {label:<40} median={med:8.3f} µs   p95={p95:8.3f} µs")
+
+class FakeProvider:
+    """Provider LLM simulé : latence tirée d'une distribution, queue lente et échecs (timeout) paramétrables."""
+
+    def __init__(self, name, base, jitter=0.2, slow_rate=0.0, slow=1.0, fail_rate=0.0, timeout=0.5, seed=0):
+        self.name, self.base, self.jitter = name, base, jitter
+        self.slow_rate, self.slow, self.fail_rate, self.timeout = slow_rate, slow, fail_rate, timeout
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.breaker = CircuitBreaker(name)
+
+    def available(self):
+        return True
+
+    def draw(self):
+        r = self.rng.random()
+        if r < self.fail_rate: return self.timeout, None
+        if r < self.fail_rate + self.slow_rate: return self.slow, f"{self.name} (lent)"
+        return self.base * (1 + self.rng.uniform(-self.jitter, self.jitter)), self.name
+
+    async def complete(self, prompt):
+        import asyncio
+        self.calls += 1
+        delay, content = self.draw()
+        await asyncio.sleep(delay)
+        return content
+
+def _fake_providers():
+    return [FakeProvider("Groq", 0.05, slow_rate=0.08, slow=0.8, fail_rate=0.05, timeout=0.5, seed=1),
+            FakeProvider("Gemini", 0.12, slow_rate=0.03, slow=0.6, fail_rate=0.05, timeout=0.5, seed=2),
+            FakeProvider("Mistral", 0.20, fail_rate=0.02, timeout=0.5, seed=3)]
+
+def bench_ai_hedging(n_requests=200):
+    """Latence de get_response : fallback séquentiel (legacy) vs requêtes hedgées, sur providers simulés."""
+    import asyncio
+    from services.ai_engine import AIService
+
+    async def sequential(providers):
+        for p in providers:
+            content = await p.complete("prompt")
+            if content: return content
+        return None
+
+    def percentiles(samples):
+        samples = sorted(samples)
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+        return pick(0.5), pick(0.95), pick(0.99)
+
+    legacy_providers, legacy = _fake_providers(), []
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        asyncio.run(sequential(legacy_providers))
+        legacy.append(time.perf_counter() - t0)
+
+    hedged_providers = _fake_providers()
+    service, hedged = AIService(providers=hedged_providers, default_budget=0.15, min_budget=0.02), []
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        service.get_response("prompt")
+        hedged.append(time.perf_counter() - t0)
+
+    print(f"\n== get_response sur providers simulés ({n_requests} requêtes)")
+    for label, samples, providers in (("séquentiel (legacy)", legacy, legacy_providers), ("hedged", hedged, hedged_providers)):
+        p50, p95, p99 = percentiles(samples)
+        calls = sum(p.calls for p in providers) / n_requests
+        print(f"  {label:<40} p50={p50:7.1f} ms  p95={p95:7.1f} ms  p99={p99:7.1f} ms  appels/requête={calls:.2f}")
+    print(f"  stats apprises : {service.latency_report()}")
+
+BENCHMARKS = {
+    "picker": bench_question_picker,
+    "answer": bench_answer_commits,
+    "ai": bench_ai_hedging,
+    "next": bench_next_question,
+    "curriculum": bench_curriculum_index,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()